@@ -3,17 +3,15 @@
 # comparison in Tetrad. It may not be the best example yet, but it does make
 # clear how the script can be written. JR 2023-02-27
 
-import jpype.imports
-
-import importlib.resources as importlib_resources
-jar_path = importlib_resources.files('pytetrad').joinpath('resources','tetrad-current.jar')
-jar_path = str(jar_path)
-if not jpype.isJVMStarted():
-    try:
-        jpype.startJVM(jpype.getDefaultJVMPath(), classpath=[jar_path])
-    except OSError:
-        print("can't load jvm")
-        pass
+# Searches at this size need far more than the JVM's default heap; the "large-p" preset
+# gives it 75% of physical memory, deeper thread stacks and the throughput collector.
+# Settings from the PYTETRAD_JVM_* environment variables (e.g. PYTETRAD_JVM_MAX_HEAP=32g)
+# override the preset.
+import pytetrad.tools.jvm as jvm
+
+if not jvm.is_started():
+    jvm.configure(preset="large-p")
+jvm.start()
 
 from edu.cmu.tetrad.util import Params, Parameters
 
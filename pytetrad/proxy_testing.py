@@ -1,5 +1,5 @@
 
-from jpype import JImplements, JOverride
+import jpype
 import jpype.imports
 
 import importlib.resources as importlib_resources
@@ -15,94 +15,62 @@ if not jpype.isJVMStarted():
 import pandas as pd
 import numpy as np
 
+import pytetrad.tools.score as ps
 import pytetrad.tools.translate as tr
 
-import java.util as util
-import edu.cmu.tetrad.data as td
 import edu.cmu.tetrad.search as ts
 import edu.cmu.tetrad.search.score as score
 
 # Can use this as a template for defining scores in Python for use with
-# Java Tetrad algorithms.
-@JImplements(score.Score)
-class Bsls:
-    def __init__(self, df):
-        self.df = df
-        self.n, self.p = df.shape
+# Java Tetrad algorithms. PythonScore does the Java plumbing (localScore,
+# localScoreDiff, variables) and caches local scores in a bounded, thread-safe
+# cache, so a score only has to implement local_score.
+class Bsls(ps.PythonScore):
+    name = "Bryan's Super Lame Score"
+
+    def __init__(self, df, **kwargs):
+        super().__init__(df, **kwargs)
         self.corr = df.corr().values
         self.penalty = 2 * np.log(self.n) / self.n
-        self.variables = util.ArrayList()
-        self.variable_map = {}
-        for col in df.columns:
-            col = str(col)
-            variable = td.ContinuousVariable(col)
-            self.variables.add(variable)
-            self.variable_map[col] = variable
-
-
-    @JOverride
-    def localScore(self, *args):
-        if len(args) == 1: return 0
-        elif isinstance(args[1], int): S = [args[1]]
-        else: S = list(args[1])
 
+    def local_score(self, node, parents):
+        S = list(parents)
         score = -len(S) * self.penalty
         score += np.linalg.slogdet(self.corr[np.ix_(S, S)])[1]
-        S.append(args[0])
+        S.append(node)
         score -= np.linalg.slogdet(self.corr[np.ix_(S, S)])[1]
 
         return score
 
-    @JOverride
-    def localScoreDiff(self, *args):
-        node = args[0]
-        if len(args) == 2: parents = []
-        else: parents = list(args[2])
-
-        diff = -self.localScore(node, parents)
-        parents.append(args[1])
-        diff += self.localScore(node, parents)
-
-        return diff 
-    
-    @JOverride
-    def getVariables(self):
-        return self.variables
-    
-    @JOverride
-    def getSampleSize(self):
-        return self.n
-
-    @JOverride
-    def toString(self):
-        return "Bryan's Super Lame Score"
-
-    @JOverride
-    def getVariable(self, targetName):
-        if targetName in self.variable_map: 
-            return self.variable_map[targetName]
-        return None
-
-    @JOverride
-    def isEffectEdge(self, bump):
-        return False
-
-    @JOverride
-    def getMaxDegree(self):
-        return 1000
-
-    @JOverride
-    def defaultScore(self):
-        return self
+    # Optional batched versions of the first-step scores, used by prefill(): with one
+    # parent x, the score of y is -penalty - log(1 - r_xy^2).
+    def empty_scores(self):
+        return np.zeros(self.p)
+
+    def pair_scores(self):
+        with np.errstate(divide="ignore"):
+            scores = -self.penalty - np.log(1 - self.corr ** 2)
+        np.fill_diagonal(scores, np.nan)
+        return scores
 
 
 df = pd.read_csv("resources/airfoil-self-noise.continuous.txt", sep="\t")
 df = df.astype({col: "float64" for col in df.columns})
 
 score_ = Bsls(df)
+score_.prefill()
 
 graph = ts.Fges(score_).search()
 print('FGES w/ BSLS', graph)
+print('BSLS score cache', score_.stats())
+
+# The same linear Gaussian BIC as SEM-BIC below, in Python, with incremental Cholesky
+# factors per parent set.
+score_ = ps.LinearGaussianBicScore(df, penalty_discount=1)
+score_.prefill()
+
+graph = ts.Fges(score_).search()
+print('FGES w/ Python linear Gaussian BIC', graph)
 
 data = tr.pandas_data_to_tetrad(df)
 score = score.SemBicScore(data, True)
@@ -0,0 +1,33 @@
+## This script assumes that the user has pip-installed the pytetrad package. Here is how:
+## pip install git+https://github.com/cmu-phil/py-tetrad
+
+# Runs the benchmark suite in pytetrad.tools.bench: data conversion, search overhead,
+# Markov checking, graph export and the Python-implemented tests, on the bundled data sets
+# and on simulated data at the chosen scales. Results (time and peak Python/Java memory per
+# case) are written as JSON, so that runs can be compared over time:
+#
+#   python run_benchmarks.py --scales small medium --output bench-new.json
+#   python run_benchmarks.py --scales small --output bench-new.json --baseline bench-old.json
+
+import argparse
+
+import pytetrad.tools.bench as bench
+
+parser = argparse.ArgumentParser(description="Benchmarks for the py-tetrad Python <-> Java boundary.")
+parser.add_argument("--scales", nargs="+", default=["small"], choices=list(bench.SCALES),
+                    help="sizes of the simulated data sets")
+parser.add_argument("--groups", nargs="+", default=None, choices=bench.GROUPS,
+                    help="run only these groups of cases (default: all)")
+parser.add_argument("--repeat", type=int, default=5, help="timed repeats per case")
+parser.add_argument("--output", default="bench.json", help="where to write the JSON results")
+parser.add_argument("--baseline", default=None, help="earlier JSON results to compare against")
+args = parser.parse_args()
+
+results = bench.run_suite(scales=args.scales, groups=args.groups, repeat=args.repeat)
+bench.save(results, args.output)
+print(f"\nWrote {len(results)} results to {args.output}")
+
+if args.baseline is not None:
+    comparison = bench.compare(bench.load(args.baseline), results)
+    print(comparison[["group", "name", "dataset", "seconds_median_baseline",
+                      "seconds_median_current", "time_ratio"]].to_string(index=False))
@@ -0,0 +1,87 @@
+## This script assumes that the user has pip-installed the pytetrad package. Here is how:
+## pip install git+https://github.com/cmu-phil/py-tetrad
+
+# Measures the throughput, in tests per second, of the CIT server (pytetrad.tools.cit_server,
+# behind kci_server.py and rcit_server.py) under its two protocols:
+#
+#   json          protocol 1, one pvalue request per line in lockstep (the original protocol)
+#   json-batch    protocol 1, pvalues requests of --batch facts
+#   binary        protocol 2, one fact per frame, all frames pipelined before reading replies
+#   binary-batch  protocol 2, frames of --batch facts, pipelined
+#
+# The default engine is Fisher Z, which is cheap enough that the protocol overhead dominates;
+# use --engine kci (or causal-learn-kci, rcit) to see it in proportion to a real test.
+#
+#   python run_cit_server_benchmark.py --facts 20000 --batch 500
+#   python run_cit_server_benchmark.py --engine kci --n 500 --facts 500 --workers 8
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import pytetrad.tools.parallel as parallel
+from pytetrad.tools.cit_server import CitClient
+
+parser = argparse.ArgumentParser(description="Throughput of the CIT server protocols.")
+parser.add_argument("--engine", default="fisherz", choices=parallel.ENGINES)
+parser.add_argument("--n", type=int, default=1000, help="rows of the simulated data")
+parser.add_argument("--p", type=int, default=20, help="columns of the simulated data")
+parser.add_argument("--facts", type=int, default=10000, help="tests per mode")
+parser.add_argument("--batch", type=int, default=1000, help="facts per batch request")
+parser.add_argument("--max-depth", type=int, default=3, help="largest conditioning set")
+parser.add_argument("--workers", type=int, default=0,
+                    help="run the server as a dispatcher over this many worker processes")
+args = parser.parse_args()
+
+rng = np.random.default_rng(0)
+data = rng.normal(size=(args.n, args.p))
+facts = []
+for _ in range(args.facts):
+    x, y, *z = rng.choice(args.p, size=2 + args.max_depth, replace=False).tolist()
+    facts.append((x, y, z[:rng.integers(0, args.max_depth + 1)]))
+
+with tempfile.TemporaryDirectory() as directory:
+    csv_path = os.path.join(directory, "data.csv")
+    np.savetxt(csv_path, data, delimiter=",", header=",".join(f"X{k}" for k in range(args.p)),
+               comments="")
+
+    def json_single(client):
+        return [client.pvalue(x, y, z) for x, y, z in facts]
+
+    def batched(client):
+        futures_or_lists = [client.pvalues(facts[k:k + args.batch])
+                            for k in range(0, len(facts), args.batch)]
+        return [p for ps in futures_or_lists for p in ps]
+
+    def binary_single(client):
+        futures = [client.submit([fact]) for fact in facts]
+        return [future.result()[0] for future in futures]
+
+    def binary_batch(client):
+        futures = [client.submit(facts[k:k + args.batch]) for k in range(0, len(facts), args.batch)]
+        return [p for future in futures for p in future.result()]
+
+    modes = [("json", 1, json_single), ("json-batch", 1, batched),
+             ("binary", 2, binary_single), ("binary-batch", 2, binary_batch)]
+    reference = None
+
+    print(f"{'mode':<14} {'seconds':>10} {'tests/sec':>12}")
+    for name, protocol, run in modes:
+        with CitClient(engine=args.engine, protocol=protocol, workers=args.workers) as client:
+            client.init(csv_path)
+            start = time.perf_counter()
+            pvalues = run(client)
+            seconds = time.perf_counter() - start
+            workers = client.stats().get("workers", [])
+
+        if reference is None:
+            reference = pvalues
+        elif not np.allclose(pvalues, reference, equal_nan=True):
+            print(f"Warning: {name} p-values differ from those of json.")
+        print(f"{name:<14} {seconds:>10.3f} {len(facts) / seconds:>12.0f}")
+        for worker in workers:
+            print(f"    worker {worker['pid']}: {worker['facts']} facts, "
+                  f"utilisation {worker['utilisation']:.0%}")
@@ -0,0 +1,73 @@
+## This script assumes that the user has pip-installed the pytetrad package. Here is how:
+## pip install git+https://github.com/cmu-phil/py-tetrad
+
+# Compares the throughput (cells/sec) of the bulk pandas -> Tetrad conversion in
+# translate.pandas_data_to_tetrad with the original cell-by-cell fill, for continuous,
+# discrete and mixed frames, and checks that both produce the same data set. The
+# cell-by-cell path is slow, so it is timed on the smaller shapes only. The reverse
+# direction (translate.tetrad_data_to_pandas) is timed the same way.
+
+import time
+
+import numpy as np
+import pandas as pd
+
+import pytetrad.tools.translate as tr
+
+
+def make_frame(n, p, kind, seed=42):
+    rng = np.random.default_rng(seed)
+    columns = {}
+
+    for j in range(p):
+        discrete = kind == "discrete" or (kind == "mixed" and j % 2 == 1)
+        if discrete:
+            columns[f"X{j + 1}"] = rng.integers(0, 4, size=n)
+        else:
+            columns[f"X{j + 1}"] = rng.normal(size=n)
+
+    return pd.DataFrame(columns)
+
+
+def cells_per_sec(df, bulk):
+    start = time.perf_counter()
+    data = tr.pandas_data_to_tetrad(df, bulk=bulk)
+    elapsed = time.perf_counter() - start
+    return data, df.size / elapsed, elapsed
+
+
+def cells_per_sec_back(data, bulk):
+    start = time.perf_counter()
+    df = tr.tetrad_data_to_pandas(data, bulk=bulk)
+    elapsed = time.perf_counter() - start
+    return df, df.size / elapsed, elapsed
+
+
+print(f"{'kind':>10} {'n':>8} {'p':>5} {'cell-by-cell':>15} {'bulk':>15} {'speedup':>9}  same")
+
+for kind in ["continuous", "discrete", "mixed"]:
+    for n, p in [(1000, 20), (10000, 50), (100000, 100)]:
+        df = make_frame(n, p, kind)
+        bulk_data, bulk_rate, _ = cells_per_sec(df, bulk=True)
+
+        if n * p <= 500000:
+            cell_data, cell_rate, _ = cells_per_sec(df, bulk=False)
+            same = bool(bulk_data.equals(cell_data))
+            print(f"{kind:>10} {n:>8} {p:>5} {cell_rate:>15,.0f} {bulk_rate:>15,.0f} "
+                  f"{bulk_rate / cell_rate:>8.1f}x  {same}")
+        else:
+            print(f"{kind:>10} {n:>8} {p:>5} {'(skipped)':>15} {bulk_rate:>15,.0f} {'':>9}  -")
+
+print(f"\n{'kind':>10} {'n':>8} {'p':>5} {'cell-by-cell':>15} {'bulk':>15} {'speedup':>9}  (Tetrad -> pandas)")
+
+for kind in ["continuous", "discrete", "mixed"]:
+    for n, p in [(1000, 20), (10000, 50), (100000, 100)]:
+        data = tr.pandas_data_to_tetrad(make_frame(n, p, kind))
+        _, bulk_rate, _ = cells_per_sec_back(data, bulk=True)
+
+        if n * p <= 500000:
+            _, cell_rate, _ = cells_per_sec_back(data, bulk=False)
+            print(f"{kind:>10} {n:>8} {p:>5} {cell_rate:>15,.0f} {bulk_rate:>15,.0f} "
+                  f"{bulk_rate / cell_rate:>8.1f}x")
+        else:
+            print(f"{kind:>10} {n:>8} {p:>5} {'(skipped)':>15} {bulk_rate:>15,.0f}")
@@ -0,0 +1,50 @@
+## This script assumes that the user has pip-installed the pytetrad package. Here is how:
+## pip install git+https://github.com/cmu-phil/py-tetrad
+
+# Calibrates the large-sample approximate KCI (pytetrad.tools.kci.ApproxKCI, used by
+# TetradSearch.use_approx_kci and by KciWrapper(engine="approx")) against exact KCI on the
+# bundled data sets: for each data set with enough continuous columns and each
+# (method, number of features), how far the approximate p-values are from the exact ones,
+# how often the two tests decide alike at alpha, and how long each took.
+#
+#   python run_kci_calibration.py --num-facts 100 --max-rows 1500
+#   python run_kci_calibration.py --settings rff:20 nystrom:100 --output calibration.csv
+
+import argparse
+
+import pandas as pd
+
+import pytetrad.tools.bench as bench
+
+
+def setting(text):
+    method, num_features = text.split(":")
+    return method, int(num_features)
+
+
+parser = argparse.ArgumentParser(description="Approximate KCI against exact KCI on the bundled data.")
+parser.add_argument("--settings", nargs="+", type=setting, default=bench.KCI_SETTINGS,
+                    help="method:num_features pairs, e.g. rff:50 nystrom:50")
+parser.add_argument("--num-facts", type=int, default=100, help="random facts per data set")
+parser.add_argument("--max-depth", type=int, default=2, help="largest conditioning set")
+parser.add_argument("--max-rows", type=int, default=2000, help="rows used (exact KCI is O(n^3))")
+parser.add_argument("--alpha", type=float, default=0.05, help="significance level for agreement")
+parser.add_argument("--output", default=None, help="CSV file for the results")
+args = parser.parse_args()
+
+rows = []
+for label in bench.RESOURCES:
+    try:
+        results = bench.calibrate_kci(bench.load_resource(label), settings=args.settings,
+                                      num_facts=args.num_facts, max_depth=args.max_depth,
+                                      alpha=args.alpha, max_rows=args.max_rows)
+    except ValueError as e:
+        print(f"Skipping {label}: {e}")
+        continue
+    rows += [dict(result, dataset=label) for result in results]
+
+table = pd.DataFrame(rows)
+print(table.to_string(index=False))
+
+if args.output is not None:
+    table.to_csv(args.output, index=False)
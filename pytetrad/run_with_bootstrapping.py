@@ -5,15 +5,26 @@
 # through JPype to do bootstrapping.
 import pandas as pd
 
-data = pd.read_csv("resources/airfoil-self-noise.continuous.txt", sep="\t")
-data = data.astype({col: "float64" for col in data.columns})
-
 import pytetrad.tools.TetradSearch as search
 
-search = search.TetradSearch(data)
-search.use_sem_bic(penalty_discount=2)
-search.set_bootstrapping(numberResampling=10, percent_resample_size=100, with_replacement=True,
-                         add_original=True, resampling_ensemble=1, seed=4130213)
-search.run_fges()
+# run_bootstrap's workers are spawned and re-import this script, so everything it does
+# is under the guard; otherwise each worker would repeat it before its own resamples.
+if __name__ == "__main__":
+    data = pd.read_csv("resources/airfoil-self-noise.continuous.txt", sep="\t")
+    data = data.astype({col: "float64" for col in data.columns})
+
+    search = search.TetradSearch(data)
+    search.use_sem_bic(penalty_discount=2)
+    search.set_bootstrapping(numberResampling=10, percent_resample_size=100,
+                             with_replacement=True, add_original=True, resampling_ensemble=1,
+                             seed=4130213)
+    search.run_fges()
+
+    print(search.get_java())
+
+    # The same bootstrap, with the resamples spread over worker processes (each with its
+    # own JVM) rather than run inside this one. This matters most when the test or score
+    # is implemented in Python, e.g. WrappedClKci.
+    search.run_bootstrap("fges", num_resamples=10, n_jobs=4, seed=4130213)
 
-print(search.get_java())
+    print(search.get_java())
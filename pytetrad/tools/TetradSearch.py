@@ -2,38 +2,39 @@
 ## either from Python or from R. The inputs are all pandas data frames
 ## and the outputs are endpoint-matrix-formatted graphs, also data frames. (In a
 ## future version, we may allow the outputs to be given other formats.)
-from networkx.algorithms.structuralholes import effective_size
-
-# import importlib.resources as importlib_resources
-# import jpype.imports
-# print('cwd = ', os.getcwd())
-# jar_path = importlib_resources.files('pytetrad').joinpath('resources', 'tetrad-current.jar')
-# jar_path = str(jar_path)
-# if not jpype.isJVMStarted():
-#     try:
-#         jpype.startJVM(jpype.getDefaultJVMPath(), classpath=[jar_path])
-#     except OSError:
-#         print("can't load jvm")
-#         pass
-
+##
+## Importing this module does not start the JVM; that happens (via pytetrad.tools.jvm)
+## when the first TetradSearch is constructed. Call pytetrad.tools.jvm.configure(...)
+## beforehand to set JVM options.
+##
+## A search may also be made from a covariance matrix and sample size alone, with
+## TetradSearch.from_covariance(cov_df, n), for data too large to pass as a DataFrame
+## (pytetrad.tools.streaming computes one from files in chunks); scores and tests that
+## need the data themselves then raise an error saying so.
+
+import pytetrad.tools.batching as bt
+import pytetrad.tools.bootstrap as bs
+import pytetrad.tools.datacache as dc
+import pytetrad.tools.jvm as jvm
 import pytetrad.tools.translate as tr
-import edu.cmu.tetrad.search as ts
-import edu.cmu.tetrad.data as td
-import edu.cmu.tetrad.graph as gr
-import edu.cmu.tetrad.graph.GraphSaveLoadUtils as gp
-import java.lang as lang
-import java.util as util
-import edu.cmu.tetrad.algcomparison.algorithm.oracle.cpdag as cpdag
-import edu.cmu.tetrad.algcomparison.algorithm.oracle.pag as pag
-import edu.cmu.tetrad.algcomparison.algorithm.continuous.dag as dag
-import edu.cmu.tetrad.algcomparison.score as score_
-import edu.cmu.tetrad.algcomparison.independence as ind_
-import edu.cmu.tetrad.search.utils as search_utils
-import edu.cmu.tetrad.algcomparison.algorithm.other as alg_other
-
-import java.io as io
 
-from edu.cmu.tetrad.util import Params, Parameters
+ts = jvm.java_import("edu.cmu.tetrad.search")
+td = jvm.java_import("edu.cmu.tetrad.data")
+gr = jvm.java_import("edu.cmu.tetrad.graph")
+gp = jvm.java_import("edu.cmu.tetrad.graph.GraphSaveLoadUtils")
+lang = jvm.java_import("java.lang")
+util = jvm.java_import("java.util")
+cpdag = jvm.java_import("edu.cmu.tetrad.algcomparison.algorithm.oracle.cpdag")
+pag = jvm.java_import("edu.cmu.tetrad.algcomparison.algorithm.oracle.pag")
+dag = jvm.java_import("edu.cmu.tetrad.algcomparison.algorithm.continuous.dag")
+score_ = jvm.java_import("edu.cmu.tetrad.algcomparison.score")
+ind_ = jvm.java_import("edu.cmu.tetrad.algcomparison.independence")
+search_utils = jvm.java_import("edu.cmu.tetrad.search.utils")
+alg_other = jvm.java_import("edu.cmu.tetrad.algcomparison.algorithm.other")
+io = jvm.java_import("java.io")
+
+Params = jvm.java_import("edu.cmu.tetrad.util.Params")
+Parameters = jvm.java_import("edu.cmu.tetrad.util.Parameters")
 
 
 class TetradSearch:
@@ -46,7 +47,13 @@ class TetradSearch:
     interacting with the attributes and methods to configure the scoring or testing criteria for causal discovery
     and structure learning.
 
-    :ivar data: Data used for analysis, converted to Tetrad-compatible format.
+    :ivar df: The pandas DataFrame the search was given, or None for a search made from a
+        covariance matrix (from_covariance).
+    :type df: DataFrame or None
+    :ivar covariance: The covariance matrix the search was given by from_covariance, or None.
+    :type covariance: DataFrame or None
+    :ivar data: Data used for analysis, converted to Tetrad-compatible format (a
+        CovarianceMatrix for a search made from a covariance matrix).
     :type data: object
     :ivar score: The current scoring function in use.
     :type score: object or None
@@ -60,9 +67,32 @@ class TetradSearch:
     :type params: Parameters
     :ivar bootstrap_graphs: Stores results of any bootstrapped graph estimation run.
     :type bootstrap_graphs: object or None
+    :ivar jvm_usage: JVM heap/GC usage of the last run_* call, if diagnostics are on (see
+        set_jvm_diagnostics).
+    :type jvm_usage: dict or None
     """
     def __init__(self, df):
-        self.data = tr.pandas_data_to_tetrad(df)
+        self.df = df
+        self.covariance = None
+        self.data = dc.pandas_data_to_tetrad(df)
+        self._init_settings()
+
+    @classmethod
+    def from_covariance(cls, cov_df, n):
+        """A search over the covariance matrix cov_df (a square DataFrame whose columns name
+        the variables) of n samples, without the data themselves. Scores and tests that
+        need only a covariance matrix can be used: use_sem_bic, use_ebic,
+        use_poisson_prior_score, use_zhang_shen_bound, use_gic_score and use_fisher_z (also
+        for the Markov check); the others raise an error, as do algorithms that need the
+        data (LiNGAM and its relatives, FASK, DAGMA, CStaR, bootstrapping, ...)."""
+        search = cls.__new__(cls)
+        search.df = None
+        search.covariance = cov_df
+        search.data = tr.pandas_covariance_to_tetrad(cov_df, n)
+        search._init_settings()
+        return search
+
+    def _init_settings(self):
         self.SCORE = None
         self.TEST = None
         self.MC_TEST = None
@@ -71,6 +101,8 @@ class TetradSearch:
         self.mc_knowledge = None
         self.params = Parameters()
         self.bootstrap_graphs = None
+        self.jvm_diagnostics = False
+        self.jvm_usage = None
 
     def __str__(self):
         display = [self.SCORE, self.TEST, self.knowledge, self.java]
@@ -112,6 +144,7 @@ class TetradSearch:
         self.SCORE = score_.KimEtAlScores()
 
     def use_mixed_variable_polynomial(self, structure_prior=0, f_degree=0, discretize=False):
+        self._require_raw_data("use_mixed_variable_polynomial")
         self.params.set(Params.STRUCTURE_PRIOR, structure_prior)
         self.params.set("fDegree", f_degree)
         self.params.set(Params.DISCRETIZE), discretize
@@ -131,12 +164,14 @@ class TetradSearch:
         self.SCORE = score_.ZhangShenBoundScore()
 
     def use_bdeu(self, sample_prior=10, structure_prior=0):
+        self._require_raw_data("use_bdeu")
         self.params.set(Params.PRIOR_EQUIVALENT_SAMPLE_SIZE, sample_prior)
         self.params.set(Params.STRUCTURE_PRIOR, structure_prior)
         self.SCORE = score_.BdeuScore()
 
     def use_conditional_gaussian_score(self, penalty_discount=1, discretize=True, num_categories_to_discretize=3,
                                        structure_prior=0):
+        self._require_raw_data("use_conditional_gaussian_score")
         self.params.set(Params.PENALTY_DISCOUNT, penalty_discount)
         self.params.set(Params.STRUCTURE_PRIOR, structure_prior)
         self.params.set(Params.DISCRETIZE, discretize)
@@ -145,6 +180,7 @@ class TetradSearch:
 
     # singularity_lambda: >= 0 Add lambda to matrix diagonals, < 0 Use pseudoinverse
     def use_degenerate_gaussian_score(self, penalty_discount=1, structure_prior=0, singularity_lambda=0.0):
+        self._require_raw_data("use_degenerate_gaussian_score")
         self.params.set(Params.PENALTY_DISCOUNT, penalty_discount)
         self.params.set(Params.STRUCTURE_PRIOR, structure_prior)
         self.params.set(Params.SINGULARITY_LAMBDA, singularity_lambda)
@@ -156,6 +192,7 @@ class TetradSearch:
     # includes the 2026-8 wrapper wiring fix; older jars silently ignored both.
     def use_basis_function_bic(self, truncation_limit=3, penalty_discount=2, singularity_lambda=0.0,
                                do_one_equation_only=False):
+        self._require_raw_data("use_basis_function_bic")
         self.params.set(Params.TRUNCATION_LIMIT, truncation_limit)
         self.params.set(Params.PENALTY_DISCOUNT, penalty_discount)
         self.params.set(Params.SINGULARITY_LAMBDA, singularity_lambda)
@@ -168,6 +205,7 @@ class TetradSearch:
     # wrapper; the wrapper had been removed from Tetrad, which broke this hook.
     def use_basis_function_bic_fs(self, truncation_limit=3, penalty_discount=2, singularity_lambda=0.0,
                                   do_one_equation_only=False):
+        self._require_raw_data("use_basis_function_bic_fs")
         self.params.set(Params.TRUNCATION_LIMIT, truncation_limit)
         self.params.set(Params.PENALTY_DISCOUNT, penalty_discount)
         self.params.set(Params.SINGULARITY_LAMBDA, singularity_lambda)
@@ -175,6 +213,7 @@ class TetradSearch:
         self.SCORE = score_.BasisFunctionBicScoreTabular()
 
     def use_ffml(self, ffml_ridge=1.0, bw_max_rows=100, ffml_ff_features=50, cat_rho=0.5, effective_sample_size=-1):
+        self._require_raw_data("use_ffml")
         self.params.set(Params.FFML_RIDGE, ffml_ridge)
         self.params.set(Params.BW_MAX_ROWS, bw_max_rows)
         self.params.set(Params.FFML_FF_FEATURES, ffml_ff_features)
@@ -183,6 +222,7 @@ class TetradSearch:
         self.SCORE = score_.FfMl()
 
     def use_trff_bic(self, trff_ridge=0.001, ffml_ff_features=100, penalty_discount=1, trff_nu=5.0):
+        self._require_raw_data("use_trff_bic")
         self.params.set(Params.TRFF_RIDGE, trff_ridge)
         self.params.set(Params.NUM_FF_FEATURES, ffml_ff_features)
         self.params.set(Params.PENALTY_DISCOUNT_DEFAULT_1, penalty_discount)
@@ -198,6 +238,7 @@ class TetradSearch:
     def use_basis_function_lrt(self, truncation_limit=3, alpha=0.01, effective_sample_size=-1,
                                singularity_lambda=None, do_one_equation_only=None,
                                use_for_mc=False):
+        self._require_raw_data("use_basis_function_lrt")
         import warnings
         if singularity_lambda is not None:
             warnings.warn("singularity_lambda is ignored by the Wilks-based BF-LRT "
@@ -217,6 +258,7 @@ class TetradSearch:
 
     def use_ffci(self, alpha=0.01, permutations=500, num_features_xy=10, num_features_z=100, lambda_=1, bandwidth_multiplier=1
                  , approx=1, use_for_mc=False):
+        self._require_raw_data("use_ffci")
         self.params.set(Params.ALPHA, alpha)
         self.params.set(Params.RCIT_PERMUTATIONS, permutations)
         self.params.set(Params.RCIT_NUM_FEATURES_XY, num_features_xy)
@@ -231,6 +273,7 @@ class TetradSearch:
             self.TEST = ind_.FfCi()
 
     def use_rcit(self, seed=-1, alpha=0.01, lambda_=0.0011, mode=True, approx=1, num_features_xy=10, num_features_z=100, use_for_mc=False):
+        self._require_raw_data("use_rcit")
         self.params.set(Params.SEED, seed)
         self.params.set(Params.ALPHA, alpha)
         self.params.set(Params.RCIT_LAMBDA, lambda_)
@@ -276,6 +319,7 @@ class TetradSearch:
 
     # cell table type is 1 = AD Tree, 2 = Count Sample. (Optimization.)
     def use_chi_square(self, min_count=1, alpha=0.01, cell_table_type=1, use_for_mc=False):
+        self._require_raw_data("use_chi_square")
         self.params.set(Params.ALPHA, alpha)
         self.params.set(Params.MIN_COUNT_PER_CELL, min_count)
         self.params.set(Params.CELL_TABLE_TYPE, cell_table_type)
@@ -287,6 +331,7 @@ class TetradSearch:
 
     # cell table type is 1 = AD Tree, 2 = Count Sample. (Optimization)
     def use_g_square(self, min_count=1, alpha=0.01, cell_table_type=1, use_for_mc=False):
+        self._require_raw_data("use_g_square")
         self.params.set(Params.ALPHA, alpha)
         self.params.set(Params.MIN_COUNT_PER_CELL, min_count)
         self.params.set(Params.CELL_TABLE_TYPE, cell_table_type)
@@ -298,6 +343,7 @@ class TetradSearch:
 
     def use_conditional_gaussian_test(self, alpha=0.01, discretize=True,
                                       num_categories_to_discretize=3, use_for_mc=False):
+        self._require_raw_data("use_conditional_gaussian_test")
         self.params.set(Params.ALPHA, alpha)
         self.params.set(Params.DISCRETIZE, discretize)
         self.params.set(Params.NUM_CATEGORIES_TO_DISCRETIZE, num_categories_to_discretize)
@@ -310,6 +356,7 @@ class TetradSearch:
 
     # singularity_lambda: >= 0 Add lambda to matrix diagonals, < 0 Use pseudoinverse
     def use_degenerate_gaussian_test(self, alpha=0.01, use_for_mc=False, singularity_lambda=0.0):
+        self._require_raw_data("use_degenerate_gaussian_test")
         self.params.set(Params.ALPHA, alpha)
         self.params.set(Params.SINGULARITY_LAMBDA, singularity_lambda)
 
@@ -319,6 +366,7 @@ class TetradSearch:
             self.TEST = ind_.DegenerateGaussianLrt()
 
     def use_probabilistic_test(self, threshold=False, cutoff=0.5, prior_ess=10, use_for_mc=False):
+        self._require_raw_data("use_probabilistic_test")
         self.params.set(Params.NO_RANDOMLY_DETERMINED_INDEPENDENCE, threshold)
         self.params.set(Params.CUTOFF_IND_TEST, cutoff)
         self.params.set(Params.PRIOR_EQUIVALENT_SAMPLE_SIZE, prior_ess)
@@ -330,6 +378,7 @@ class TetradSearch:
 
     def use_kci(self, alpha=0.01, approximate=True, scaling_factor=1, num_bootstraps=5000, threshold=1e-3,
                 epsilon=1e-3, kernel_type=1, polyd=5, polyc=1, use_for_mc=False):
+        self._require_raw_data("use_kci")
         self.params.set(Params.KCI_USE_APPROXIMATION, approximate)
         self.params.set(Params.ALPHA, alpha)
         self.params.set(Params.SCALING_FACTOR, scaling_factor)
@@ -345,6 +394,25 @@ class TetradSearch:
         else:
             self.TEST = ind_.Kci()
 
+    def use_approx_kci(self, alpha=0.01, method="rff", num_features=10, num_features_z=100, seed=0,
+                       est_width="empirical", approx=True, epsilon=1e-3, prefetch=None,
+                       workers=None, use_for_mc=False):
+        """Uses a large-sample approximation of KCI computed in Python (pytetrad.tools.kci.
+        ApproxKCI): kernel matrices are replaced by num_features random Fourier features
+        (method="rff") or Nystrom features (method="nystrom") of x and y and num_features_z
+        of the conditioning set, drawn under seed. Unlike use_kci, this scales to samples of
+        hundreds of thousands of rows. With workers=N, tests are computed by N worker
+        processes (pytetrad.tools.parallel). prefetch="fas" batches the tests of PC-style
+        adjacency searches (see pytetrad.tools.batching)."""
+        self._require_raw_data("use_approx_kci")
+        import pytetrad.tools.WrappedClKci as wc
+
+        test = wc.WrappedClKci(self.df, alpha=alpha, prefetch=None if use_for_mc else prefetch,
+                               engine="approx", method=method, num_features=num_features,
+                               num_features_z=num_features_z, seed=seed, est_width=est_width,
+                               approx=approx, epsilon=epsilon, workers=workers)
+        self.use_test(test, use_for_mc=use_for_mc)
+
     def use_test(self, test, use_for_mc=False):
         if use_for_mc:
             self.MC_TEST = test
@@ -353,6 +421,7 @@ class TetradSearch:
 
     def use_cci(self, alpha=0.01, scaling_factor=2, num_basis_functions=3, basis_type=4,
                 basis_scale=0.0, use_for_mc=False):
+        self._require_raw_data("use_cci")
         self.params.set(Params.ALPHA, alpha)
         self.params.set(Params.SCALING_FACTOR, scaling_factor)
         self.params.set(Params.NUM_BASIS_FUNCTIONS, num_basis_functions)
@@ -429,6 +498,37 @@ class TetradSearch:
                             "test and the Markov-check test, call the use_* test method twice, once "
                             "without use_for_mc and once with use_for_mc=True.")
 
+    def _require_raw_data(self, method):
+        """Raises a friendly error if this search was made from a covariance matrix and
+        method needs the data themselves."""
+        if self.df is None:
+            raise Exception(f"{method} needs the data themselves, but this search was made from "
+                            "a covariance matrix (TetradSearch.from_covariance). With only a "
+                            "covariance matrix, use use_sem_bic, use_ebic, "
+                            "use_poisson_prior_score, use_zhang_shen_bound or use_gic_score for "
+                            "the score and use_fisher_z for the test, or make the search from a "
+                            "DataFrame.")
+
+    def set_jvm_diagnostics(self, enabled=True):
+        """If enabled, each run_* method records the JVM's heap and GC usage over the search
+        in self.jvm_usage (see pytetrad.tools.jvm.memory_usage; GC counts and times are for
+        the search only, heap_peak is the peak during it) and prints a one-line summary.
+        Useful for sizing max_heap and choosing a preset with pytetrad.tools.jvm.configure."""
+        self.jvm_diagnostics = enabled
+
+    def _search(self, alg):
+        """Runs an algcomparison algorithm on self.data and self.params, recording JVM usage
+        if diagnostics are on."""
+        if not self.jvm_diagnostics:
+            return alg.search(self.data, self.params)
+
+        jvm.reset_peak_memory()
+        before = jvm.memory_usage()
+        graph = alg.search(self.data, self.params)
+        self.jvm_usage = jvm.usage_delta(before, jvm.memory_usage())
+        print(f"{alg.getClass().getSimpleName()}: {jvm.format_usage(self.jvm_usage)}")
+        return graph
+
     def _require_score(self, method):
         """Raises a friendly error if no score has been set; see _require_test."""
         if self.SCORE is None:
@@ -446,7 +546,7 @@ class TetradSearch:
         self.params.set(Params.PARALLELIZED, parallelized)
         self.params.set(Params.FAITHFULNESS_ASSUMED, faithfulness_assumed)
 
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
 
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
@@ -462,7 +562,7 @@ class TetradSearch:
         self.params.set(Params.TRIMMING_STYLE, trimming_style)
         self.params.set(Params.NUMBER_OF_EXPANSIONS, number_of_expansions)
 
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_boss(self, num_starts=1, use_bes=False, time_lag=0, use_data_order=True,
@@ -476,7 +576,7 @@ class TetradSearch:
         alg = cpdag.Boss(self.SCORE)
         alg.setKnowledge(self.knowledge)
 
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_restricted_boss(self, targets="", use_bes=False, num_starts=1,
@@ -488,7 +588,7 @@ class TetradSearch:
 
         self._require_score("run_restricted_boss")
         alg = cpdag.RestrictedBoss(self.SCORE)
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     # Algorithm. This is the algorithm to use to calculate bootstrapped CPDAGs.
@@ -515,6 +615,7 @@ class TetradSearch:
     def run_cstar(self, targets="", file_out_path="cstar-out", selection_min_effect=0.0,
                   num_subsamples=50, top_bracket=10, parallelized=False, cpdag_algorithm=4,
                   remove_effect_nodes=True, sample_style=1):
+        self._require_raw_data("run_cstar")
         self.params.set(Params.SELECTION_MIN_EFFECT, selection_min_effect)
         self.params.set(Params.NUM_SUBSAMPLES, num_subsamples)
         self.params.set(Params.TARGETS, targets)
@@ -528,13 +629,13 @@ class TetradSearch:
         self._require_test("run_cstar")
         self._require_score("run_cstar")
         alg = cpdag.Cstar(self.TEST, self.SCORE)
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
 
     def run_sp(self):
         self._require_score("run_sp")
         alg = cpdag.Sp(self.SCORE)
         alg.setKnowledge(self.knowledge)
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         alg.setKnowledge(self.knowledge)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
@@ -555,7 +656,7 @@ class TetradSearch:
         alg = cpdag.Grasp(self.TEST, self.SCORE)
         alg.setKnowledge(self.knowledge)
 
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_pc(self, depth=-1, stable_fas=True, allow_bidirected=False, collider_orientation_style=3):
@@ -568,7 +669,7 @@ class TetradSearch:
         alg = cpdag.Pc(self.TEST)
         alg.setKnowledge(self.knowledge)
 
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_pc_max(self, depth=-1, stable_fas=True, allow_bidirected=False):
@@ -581,7 +682,7 @@ class TetradSearch:
         alg = cpdag.Pc(self.TEST)
         alg.setKnowledge(self.knowledge)
 
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_cpc(self, depth=-1, stable_fas=True, allow_bidirected=False):
@@ -594,7 +695,7 @@ class TetradSearch:
         alg = cpdag.Pc(self.TEST)
         alg.setKnowledge(self.knowledge)
 
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_fci(self, depth=-1, stable_fas=True, max_disc_path_length=-1, complete_rule_set_used=True,
@@ -609,7 +710,7 @@ class TetradSearch:
         alg = pag.Fci(self.TEST)
         alg.setKnowledge(self.knowledge)
 
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_rfci(self, depth=-1, stable_fas=True, max_disc_path_length=-1, complete_rule_set_used=True, ):
@@ -622,7 +723,7 @@ class TetradSearch:
         alg = pag.Rfci(self.TEST)
         alg.setKnowledge(self.knowledge)
 
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     # This is GFCI with the possible d-sep step.
@@ -639,7 +740,7 @@ class TetradSearch:
         alg = pag.Gfci(self.TEST, self.SCORE)
         alg.setKnowledge(self.knowledge)
 
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     # This is GFCI without the possible d-sep step
@@ -656,7 +757,7 @@ class TetradSearch:
         alg = pag.Gfci(self.TEST, self.SCORE)
         alg.setKnowledge(self.knowledge)
 
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_bfci(self, depth=-1, max_disc_path_length=-1, complete_rule_set_used=True,
@@ -671,7 +772,7 @@ class TetradSearch:
         alg = pag.Bfci(self.TEST, self.SCORE)
         alg.setKnowledge(self.knowledge)
 
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_lv_heuristic(self, num_starts=1, use_bes=False, time_lag=0, use_data_order=True,
@@ -688,7 +789,7 @@ class TetradSearch:
 
         alg.setKnowledge(self.knowledge)
 
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_fcit(self, num_starts=1, max_blocking_path_length=5, depth=5, max_disc_path_length=5,
@@ -707,7 +808,7 @@ class TetradSearch:
         alg = pag.Fcit(self.TEST, self.SCORE)
         alg.setKnowledge(self.knowledge)
 
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_grasp_fci(self, depth=-1, stable_fas=True,
@@ -739,7 +840,7 @@ class TetradSearch:
         alg = pag.GraspFci(self.TEST, self.SCORE)
         alg.setKnowledge(self.knowledge)
 
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_sp_fci(self, max_disc_path_length=-1, complete_rule_set_used=True, depth=-1,
@@ -754,17 +855,18 @@ class TetradSearch:
         alg = pag.SpFci(self.TEST, self.SCORE)
         alg.setKnowledge(self.knowledge)
 
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_lingam(self, ica_a=1.1, ica_max_iter=5000, ica_tolerance=1e-8, threshold_b=0.1):
+        self._require_raw_data("run_lingam")
         self.params.set(Params.FAST_ICA_A, ica_a)
         self.params.set(Params.FAST_ICA_MAX_ITER, ica_max_iter)
         self.params.set(Params.FAST_ICA_TOLERANCE, ica_tolerance)
         self.params.set(Params.THRESHOLD_B, threshold_b)
 
         alg = dag.Lingam()
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bhat = alg.getBHat()
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
@@ -773,6 +875,7 @@ class TetradSearch:
         return tr.tetrad_matrix_to_pandas(self.bhat, self.data.getVariableNames())
 
     def run_lingd(self, ica_a=1.1, ica_max_iter=5000, ica_tolerance=1e-8, threshold_b=0.1, threshold_w=0.1):
+        self._require_raw_data("run_lingd")
         self.params.set(Params.FAST_ICA_A, ica_a)
         self.params.set(Params.FAST_ICA_MAX_ITER, ica_max_iter)
         self.params.set(Params.FAST_ICA_TOLERANCE, ica_tolerance)
@@ -780,12 +883,13 @@ class TetradSearch:
         self.params.set(Params.THRESHOLD_W, threshold_w)
 
         alg = dag.LingD()
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.unstable_bhats = alg.getUnstableBHats()
         self.stable_bhats = alg.getStableBHats()
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_fask(self, alpha=0.05, depth=-1, fask_delta=-0.3, left_right_rule=1, skew_edge_threshold=0.3):
+        self._require_raw_data("run_fask")
         self.params.set(Params.ALPHA, alpha)
         self.params.set(Params.DEPTH, depth)
         self.params.set(Params.FASK_DELTA, fask_delta)
@@ -795,7 +899,7 @@ class TetradSearch:
         self._require_score("run_fask")
         alg = dag.Fask(self.SCORE)
         alg.setKnowledge(self.knowledge)
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_factor_analysis(self, fa_threshold=0.001, num_factors=2.0, use_varimax=True,
@@ -815,6 +919,7 @@ class TetradSearch:
         :param convergence_threshold: Minimum threshold for algorithm convergence.
         :return: None
         """
+        self._require_raw_data("run_factor_analysis")
         # Set algorithm parameters in the Params object
         self.params.set("fa_threshold", fa_threshold)
         self.params.set("numFactors", num_factors)
@@ -825,7 +930,7 @@ class TetradSearch:
         alg = alg_other.FactorAnalysis()
 
         # Run the search algorithm using the data and specified parameters
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
 
     ## Returns the unstable b-hats from the ICA-LiNG-D algorithm as a list of numpy arrays.
     def get_unstable_bhats(self):
@@ -860,10 +965,11 @@ class TetradSearch:
         self._require_test("run_ccd")
         alg = pag.Ccd(self.TEST)
         alg.setKnowledge(self.knowledge)
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_svar_fci(self, penalty_discount=2):
+        self._require_raw_data("run_svar_fci")
         num_lags = 2
         lagged_data = ts.TimeSeriesUtils.createLagData(self.data, num_lags)
         ts_test = ts.IndTestFisherZ(lagged_data, 0.01)
@@ -875,25 +981,28 @@ class TetradSearch:
         # self.bootstrap_graphs = svar_fci.getBootstrapGraphs()
 
     def run_direct_lingam(self):
+        self._require_raw_data("run_direct_lingam")
         self._require_score("run_direct_lingam")
         alg = dag.DirectLingam(self.SCORE)
 
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_dagma(self, dagma_lambda=0.05, w_threshold=0.1, cpdag=True):
+        self._require_raw_data("run_dagma")
         alg = dag.Dagma()
 
         self.params.set(Params.LAMBDA1, dagma_lambda)
         self.params.set(Params.W_THRESHOLD, w_threshold)
         self.params.set(Params.CPDAG, cpdag)
 
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_pc_lingam(self):
+        self._require_raw_data("run_pc_lingam")
         alg = dag.PcLingam()
-        self.java = alg.search(self.data, self.params)
+        self.java = self._search(alg)
         self.bootstrap_graphs = alg.getBootstrapGraphs()
 
     def run_gango(self, score, data):
@@ -916,6 +1025,8 @@ class TetradSearch:
     # with the highest frequency.
     def set_bootstrapping(self, numberResampling=0, percent_resample_size=100, add_original=True,
                           with_replacement=True, resampling_ensemble=1, seed=-1):
+        if numberResampling > 0:
+            self._require_raw_data("set_bootstrapping")
         self.params.set(Params.NUMBER_RESAMPLING, numberResampling)
         self.params.set(Params.PERCENT_RESAMPLE_SIZE, percent_resample_size)
         self.params.set(Params.ADD_ORIGINAL_DATASET, add_original)
@@ -923,8 +1034,35 @@ class TetradSearch:
         self.params.set(Params.RESAMPLING_ENSEMBLE, resampling_ensemble)
         self.params.set(Params.SEED, seed)
 
+    def run_bootstrap(self, algorithm, num_resamples=100, n_jobs=None, seed=None,
+                      percent_resample_size=100, with_replacement=True, add_original=True,
+                      resampling_ensemble=1, **kwargs):
+        """Bootstraps a search over a pool of worker processes, each with its own JVM, instead
+        of inside this JVM as set_bootstrapping does; this pays off when resamples are many or
+        the test or score is implemented in Python (e.g. WrappedClKci), which would otherwise
+        serialize on the GIL.
+
+        algorithm names a run_* method ("pc" or "run_pc"), which is called with kwargs on
+        each resample using this search's score, test, knowledge and parameters. Resample k
+        is drawn with a generator seeded from child k of numpy.random.SeedSequence(seed), so
+        results do not depend on n_jobs (default: one worker per core; 1 runs everything in
+        this process). percent_resample_size, with_replacement, add_original and
+        resampling_ensemble (1 = preserved, 2 = highest, 3 = majority) are as in
+        set_bootstrapping.
+
+        Afterwards get_java() is the ensemble graph, whose edges carry edge-type
+        probabilities, and bootstrap_graphs the per-resample graphs (the graph of the
+        original data first, if add_original). See pytetrad.tools.bootstrap."""
+        self._require_raw_data("run_bootstrap")
+        self.java, self.bootstrap_graphs = bs.run(
+            self, algorithm, num_resamples=num_resamples, n_jobs=n_jobs, seed=seed,
+            percent_resample_size=percent_resample_size, with_replacement=with_replacement,
+            add_original=add_original, resampling_ensemble=resampling_ensemble, **kwargs)
+
     def set_data(self, data):
-        self.data = tr.pandas_data_to_tetrad(data)
+        self.df = data
+        self.covariance = None
+        self.data = dc.pandas_data_to_tetrad(data)
 
     def set_verbose(self, verbose):
         self.params.set(Params.VERBOSE, verbose)
@@ -976,7 +1114,7 @@ class TetradSearch:
         if (java == None):
             return tr.graph_to_matrix(self.java, nullEpt, circleEpt, arrowEpt, tailEpt)
         else:
-            tr.graph_to_matrix(java)
+            return tr.graph_to_matrix(java, nullEpt, circleEpt, arrowEpt, tailEpt)
 
     def get_dot(self, java=None):
         if (java == None):
@@ -1069,12 +1207,34 @@ class TetradSearch:
 
         return facts
 
-    def markov_check(self, graph, fraction_resample=1, condition_set_type=ts.ConditioningSetType.ORDERED_LOCAL_MARKOV_PROPERTY,
+    # condition_set_type defaults to ts.ConditioningSetType.ORDERED_LOCAL_MARKOV_PROPERTY.
+    def markov_check(self, graph, fraction_resample=1, condition_set_type=None,
                      removeExtraneous=False, parallelized=True, effective_sample_size=-1):
         if self.MC_TEST == None:
             raise Exception("A test for the Markov Checker has not been set. Please call as use_{test name} method setting the parmaeter 'use_for_mc' to True")
 
-        mc = ts.MarkovCheck(graph, self.MC_TEST.getTest(self.data, self.params), condition_set_type)
+        if fraction_resample != 1:
+            self._require_raw_data("markov_check with fraction_resample < 1")
+
+        if condition_set_type is None:
+            condition_set_type = ts.ConditioningSetType.ORDERED_LOCAL_MARKOV_PROPERTY
+
+        test = self.MC_TEST.getTest(self.data, self.params)
+
+        # The Markov check's queries do not follow an adjacency search, so prefetch="fas"
+        # would only compute facts it never asks for.
+        if getattr(test, "mode", None) == "fas":
+            test.mode = None
+
+        # Python tests behind a batching adapter can evaluate a local Markov check's facts
+        # in one batch up front. Other conditioning-set types, including the default
+        # ORDERED_LOCAL_MARKOV_PROPERTY (whose facts depend on the causal order Tetrad picks
+        # for the graph), are not prefetched; their facts are asked one at a time.
+        if (hasattr(test, "prefetch") and fraction_resample == 1
+                and condition_set_type == ts.ConditioningSetType.LOCAL_MARKOV):
+            test.prefetch(bt.local_markov_facts(graph))
+
+        mc = ts.MarkovCheck(graph, test, condition_set_type)
         mc.setFractionResample(fraction_resample)
         mc.setFindSmallestSubset(removeExtraneous)
         mc.setParallelized(parallelized)
@@ -1,9 +1,10 @@
-# This module wraps the Fisher Z test from causal-learn in a JPype object so that Tetrad can use it.
-# We are not assuming in this repository that causal-learn is installed, as we don't want to
-# have the dependency in our code (since some people can't have it there--it has dependencies
-# that are unhelpful in certain circumstances). So if you want to use the Fisher Z test from causal-learn,
-# you will need to install causal-learn yourself. (See the docs for causal-learn for installation
-# instructions.)
+# This module wraps a Fisher Z test in a JPype object so that Tetrad can use it. It began as a
+# wrapper around the Fisher Z test from causal-learn; the test itself is now computed by
+# pytetrad.tools.fisherz, a NumPy implementation giving the same p-values, which computes the
+# correlation matrix once and reuses factorizations of conditioning sets across queries. So
+# causal-learn is no longer needed for this test, and the keyword arguments that were passed on
+# to causal-learn's CIT (cache_path) are no longer accepted; p-values are cached through cache=
+# instead (see pytetrad.tools.cicache).
 #
 # To use WrappedClFisherZ as a test in py-tetrad, you can do the following:
 # import pytetrad.tools.WrappedClFisherZ as wc
@@ -17,42 +18,32 @@
 
 import time as tm
 
-import jpype.imports
-from jpype import JImplements, JOverride
+from jpype import JOverride
 
-import importlib.resources as importlib_resources
+import pytetrad.tools.batching as bt
+import pytetrad.tools.cicache as cc
+import pytetrad.tools.datacache as dc
+import pytetrad.tools.fisherz as fz
+import pytetrad.tools.jvm as jvm
 
-jar_path = importlib_resources.files('pytetrad').joinpath('resources', 'tetrad-current.jar')
-jar_path = str(jar_path)
-if not jpype.isJVMStarted():
-    try:
-        jpype.startJVM(jpype.getDefaultJVMPath(), classpath=[jar_path])
-    except OSError:
-        print("can't load jvm")
-        pass
-
-try:
-    from causallearn.utils.cit import CIT
-except ImportError as e:
-    print('Could not import a causal-learn module: ', e)
+td = jvm.java_import("edu.cmu.tetrad.data")
+tg = jvm.java_import("edu.cmu.tetrad.graph")
+tt = jvm.java_import("edu.cmu.tetrad.search.test")
+util = jvm.java_import("edu.cmu.tetrad.util")
+ju = jvm.java_import("java.util")
 
-import pytetrad.tools.translate as tr
-import edu.cmu.tetrad.data as td
-import edu.cmu.tetrad.graph as tg
-import edu.cmu.tetrad.search as ts
-import edu.cmu.tetrad.search.test as tt
-import edu.cmu.tetrad.util as util
-import edu.cmu.tetrad.algcomparison.independence as agind
-import java.util as ju
 
-
-@JImplements(ts.test.IndependenceTest)
+@jvm.implements("edu.cmu.tetrad.search.test.IndependenceTest")
 class FisherZWrapper:
-    def __init__(self, df, alpha=0.01, start_time=-1, timeout=-1, **kwargs):
+    # p-values depend on x and y only through their partial correlation (see batching).
+    symmetric = True
+
+    def __init__(self, df, alpha=0.01, start_time=-1, timeout=-1, cache=True):
         self.df = df
         self.data = df.values
         self.alpha = alpha
-        self.fisherz_obj = CIT(self.data, "fisherz", **kwargs)
+        self.fisherz_obj = fz.FisherZ(self.data)
+        self.cached = cc.CachedTest(cache, "fisherz", {}, df)
 
         self.start_time = start_time
         self.timeout = timeout
@@ -69,24 +60,40 @@ class FisherZWrapper:
 
     @JOverride
     def checkIndependence(self, *args):
+        return self.checkIndependenceBatch([(args[0], args[1], args[2])])[0]
+
+    def checkIndependenceBatch(self, facts):
+        """Evaluates several facts (x, y, s) - Tetrad nodes and a collection of nodes - in
+        one call, returning their IndependenceResults in order. Facts already in the result
+        cache are not recomputed; see pytetrad.tools.batching for the adapter that collects
+        a search's queries into batches."""
         if self.start_time != -1 and self.timeout != -1 and tm.time() > self.start_time + self.timeout:
             raise Exception("Timeout")
 
-        x = args[0]
-        y = args[1]
-        s = args[2]
-        fact = tg.IndependenceFact(x, y, s)
-
-        X = self.reverse_variable_map[x]
-        Y = self.reverse_variable_map[y]
-        S = [self.reverse_variable_map[si] for si in s]
-
-        pValue = float(self.fisherz_obj(X, Y, S))
-        indep = bool(pValue > self.alpha)
-        delta = float(self.alpha - pValue)
-
-        result = tt.IndependenceResult(fact, indep, pValue, delta)
-        return result
+        # Convert x, y, s to indices using the reverse map
+        index = [(self.reverse_variable_map[x], self.reverse_variable_map[y],
+                  [self.reverse_variable_map[si] for si in s]) for x, y, s in facts]
+        pvalues = self.cached.pvalues(index, self._pvalues)
+
+        results = []
+        for (x, y, s), pValue in zip(facts, pvalues):
+            fact = tg.IndependenceFact(x, y, s)
+            indep = bool(pValue > self.alpha)
+            delta = float(self.alpha - pValue)
+            results.append(tt.IndependenceResult(fact, indep, pValue, delta))
+        return results
+
+    def _pvalues(self, facts):
+        # Facts sharing a conditioning set are evaluated in one vectorized call.
+        groups = {}
+        for k, (X, Y, S) in enumerate(facts):
+            groups.setdefault(frozenset(S), []).append(k)
+
+        pvalues = [None] * len(facts)
+        for S, ks in groups.items():
+            for k, p in zip(ks, self.fisherz_obj.pvalues([facts[k][:2] for k in ks], sorted(S))):
+                pvalues[k] = p
+        return pvalues
 
     @JOverride
     def getVariables(self, *arg):
@@ -94,7 +101,7 @@ class FisherZWrapper:
 
     @JOverride
     def getData(self, *arg):
-        return tr.pandas_data_to_tetrad(self.df)
+        return dc.pandas_data_to_tetrad(self.df)
 
     @JOverride
     def isVerbose(self, *arg):
@@ -113,16 +120,18 @@ class FisherZWrapper:
         return self.alpha
 
 
-@JImplements(agind.IndependenceWrapper)
+@jvm.implements("edu.cmu.tetrad.algcomparison.independence.IndependenceWrapper")
 class WrappedClFisherZ:
-    def __init__(self, df, alpha=0.01, **kwargs):
+    def __init__(self, df, alpha=0.01, cache=True, prefetch=None):
         self.df = df
         self.alpha = alpha
-        self.kwargs = kwargs
+        self.cache = cache
+        self.prefetch = prefetch
 
     @JOverride
     def getTest(self, *args):
-        return FisherZWrapper(self.df, alpha=self.alpha, **self.kwargs)
+        return bt.batching(FisherZWrapper(self.df, alpha=self.alpha, cache=self.cache),
+                           self.prefetch)
 
     @JOverride
     def getDescription(self):
@@ -17,19 +17,9 @@
 
 import time as tm
 
-import jpype.imports
-from jpype import JImplements, JOverride
-
-import importlib.resources as importlib_resources
-
-jar_path = importlib_resources.files('pytetrad').joinpath('resources','tetrad-current.jar')
-jar_path = str(jar_path)
-if not jpype.isJVMStarted():
-    try:
-        jpype.startJVM(jpype.getDefaultJVMPath(), classpath=[jar_path])
-    except OSError:
-        print("can't load jvm")
-        pass
+from jpype import JOverride
+
+import pytetrad.tools.jvm as jvm
 
 try:
     from causallearn.utils.cit import CIT
@@ -38,17 +28,32 @@ try:
 except ImportError as e:
     print('Could not import a causal-learn module: ', e)
 
-import pytetrad.tools.translate as tr
-import edu.cmu.tetrad.data as td
-import edu.cmu.tetrad.graph as tg
-import edu.cmu.tetrad.search as ts
-import edu.cmu.tetrad.search.test as tt
-import edu.cmu.tetrad.util as util
-import edu.cmu.tetrad.algcomparison.independence as agind
-import java.util as ju
-
-# This is the wrapper for the KCI test from causal-learn. It implements the IndependenceTest interface in Tetrad.
-# The KCI test is a kernel-based independence test that can be used in Tetrad.
+import pytetrad.tools.batching as bt
+import pytetrad.tools.cicache as cc
+import pytetrad.tools.datacache as dc
+import pytetrad.tools.kci as native_kci
+import pytetrad.tools.parallel as parallel
+
+td = jvm.java_import("edu.cmu.tetrad.data")
+tg = jvm.java_import("edu.cmu.tetrad.graph")
+tt = jvm.java_import("edu.cmu.tetrad.search.test")
+util = jvm.java_import("edu.cmu.tetrad.util")
+ju = jvm.java_import("java.util")
+
+# KciWrapper engines, with the names of their pytetrad.tools.parallel engines.
+ENGINES = {"native": "kci", "approx": "approx-kci", "causal-learn": "causal-learn-kci"}
+
+# This is the wrapper for the KCI test. It implements the IndependenceTest interface in Tetrad.
+# The KCI test is a kernel-based independence test that can be used in Tetrad. By default
+# (engine="causal-learn") the test is computed by causal-learn's own implementation. With
+# engine="native" it is computed by pytetrad.tools.kci, which gives causal-learn's p-values
+# but caches kernel matrices and their decompositions across tests, so the many tests of a
+# PC run that share variables are much faster. engine="approx" uses
+# pytetrad.tools.kci.ApproxKCI, which approximates the kernel matrices by random Fourier
+# (method="rff") or Nystrom (method="nystrom") features and scales to large samples; it takes
+# num_features, num_features_z and seed in addition.
+# With workers=N, tests are computed by N worker processes (pytetrad.tools.parallel), so that
+# the Java threads of a parallel search or Markov check are not serialized on the GIL.
 #
 # The following parameters can be passed to the KCI test:
 #
@@ -67,13 +72,25 @@ import java.util as ju
 #         kwidthx: kernel width for data x (standard deviation sigma)
 #         kwidthy: kernel width for data y (standard deviation sigma)
 #
-@JImplements(ts.test.IndependenceTest)
+@jvm.implements("edu.cmu.tetrad.search.test.IndependenceTest")
 class KciWrapper:
-    def __init__(self, df, alpha=0.01, start_time=-1, timeout=-1, **kwargs):
+    def __init__(self, df, alpha=0.01, start_time=-1, timeout=-1, cache=True,
+                 engine="causal-learn", workers=None, **kwargs):
         self.df = df
         self.data = df.values
         self.alpha = alpha
-        self.kci_obj = CIT(self.data, "kci", **kwargs)
+        self.pool = None
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}'; expected one of {tuple(ENGINES)}.")
+        if workers:
+            self.pool = parallel.get_pool(ENGINES[engine], self.data, workers, **kwargs)
+        elif engine == "native":
+            self.kci_obj = native_kci.KCI(self.data, **kwargs)
+        elif engine == "approx":
+            self.kci_obj = native_kci.ApproxKCI(self.data, **kwargs)
+        else:
+            self.kci_obj = CIT(self.data, "kci", **kwargs)
+        self.cached = cc.CachedTest(cache, "kci", dict(kwargs, engine=engine), df)
 
         self.start_time = start_time
         self.timeout = timeout
@@ -90,35 +107,33 @@ class KciWrapper:
 
     @JOverride
     def checkIndependence(self, *args):
+        return self.checkIndependenceBatch([(args[0], args[1], args[2])])[0]
+
+    def checkIndependenceBatch(self, facts):
+        """Evaluates several facts (x, y, s) - Tetrad nodes and a collection of nodes - in
+        one call, returning their IndependenceResults in order. Facts already in the result
+        cache are not recomputed; see pytetrad.tools.batching for the adapter that collects
+        a search's queries into batches."""
         if self.start_time != -1 and self.timeout != -1 and tm.time() > self.start_time + self.timeout:
             raise Exception("Timeout")
 
-        x = args[0]
-        y = args[1]
-        s = args[2]
-        fact = tg.IndependenceFact(x, y, s)
-
         # Convert x, y, s to indices using the reverse map
-        X = self.reverse_variable_map[x]
-        Y = self.reverse_variable_map[y]
-        S = [self.reverse_variable_map[si] for si in s]
-
-        pValue = self.kci_obj(X, Y, S)
-
-        # print("p = " + pValue)
-        print("Found " + str(pValue) + " for " + str(x) + " and " + str(y) + " given " + str(s))
-
-        # indep = pValue > self.alpha
-
-        pValue = float(self.kci_obj(X, Y, S))
-        indep = bool(pValue > self.alpha)
-        delta = float(self.alpha - pValue)
-
-        result = tt.IndependenceResult(fact, indep, pValue, delta)
-        return result
-
-        # result = tt.IndependenceResult(fact, indep, pValue, self.alpha - pValue)
-        # return result
+        index = [(self.reverse_variable_map[x], self.reverse_variable_map[y],
+                  [self.reverse_variable_map[si] for si in s]) for x, y, s in facts]
+        pvalues = self.cached.pvalues(index, self._pvalues)
+
+        results = []
+        for (x, y, s), pValue in zip(facts, pvalues):
+            fact = tg.IndependenceFact(x, y, s)
+            indep = bool(pValue > self.alpha)
+            delta = float(self.alpha - pValue)
+            results.append(tt.IndependenceResult(fact, indep, pValue, delta))
+        return results
+
+    def _pvalues(self, facts):
+        if self.pool is not None:
+            return self.pool.pvalues(facts)
+        return [self.kci_obj(X, Y, S) for X, Y, S in facts]
 
     @JOverride
     def getVariables(self, *arg):
@@ -126,7 +141,7 @@ class KciWrapper:
 
     @JOverride
     def getData(self, *arg):
-        return tr.pandas_data_to_tetrad(self.df)
+        return dc.pandas_data_to_tetrad(self.df)
 
     @JOverride
     def isVerbose(self, *arg):
@@ -145,16 +160,19 @@ class KciWrapper:
         return self.alpha
 
 
-@JImplements(agind.IndependenceWrapper)
+@jvm.implements("edu.cmu.tetrad.algcomparison.independence.IndependenceWrapper")
 class WrappedClKci:
-    def __init__(self, df, alpha=0.01, **kwargs):
+    def __init__(self, df, alpha=0.01, cache=True, prefetch=None, **kwargs):
         self.df = df
         self.alpha = alpha
+        self.cache = cache
+        self.prefetch = prefetch
         self.kwargs = kwargs
 
     @JOverride
     def getTest(self, *args):
-        return KciWrapper(self.df, **self.kwargs)
+        return bt.batching(KciWrapper(self.df, alpha=self.alpha, cache=self.cache, **self.kwargs),
+                           self.prefetch)
 
     @JOverride
     def getDescription(self):
@@ -17,42 +17,38 @@
 
 import time as tm
 
-import jpype.imports
-from jpype import JImplements, JOverride
-
-import importlib.resources as importlib_resources
-
-jar_path = importlib_resources.files('pytetrad').joinpath('resources', 'tetrad-current.jar')
-jar_path = str(jar_path)
-if not jpype.isJVMStarted():
-    try:
-        jpype.startJVM(jpype.getDefaultJVMPath(), classpath=[jar_path])
-    except OSError:
-        print("can't load jvm")
-        pass
+from jpype import JOverride
+
+import pytetrad.tools.jvm as jvm
 
 try:
     from causallearn.utils.cit import CIT
 except ImportError as e:
     print('Could not import a causal-learn module: ', e)
 
-import pytetrad.tools.translate as tr
-import edu.cmu.tetrad.data as td
-import edu.cmu.tetrad.graph as tg
-import edu.cmu.tetrad.search as ts
-import edu.cmu.tetrad.search.test as tt
-import edu.cmu.tetrad.util as util
-import edu.cmu.tetrad.algcomparison.independence as agind
-import java.util as ju
+import pytetrad.tools.batching as bt
+import pytetrad.tools.cicache as cc
+import pytetrad.tools.datacache as dc
+import pytetrad.tools.parallel as parallel
+
+td = jvm.java_import("edu.cmu.tetrad.data")
+tg = jvm.java_import("edu.cmu.tetrad.graph")
+tt = jvm.java_import("edu.cmu.tetrad.search.test")
+util = jvm.java_import("edu.cmu.tetrad.util")
+ju = jvm.java_import("java.util")
 
 
-@JImplements(ts.test.IndependenceTest)
+@jvm.implements("edu.cmu.tetrad.search.test.IndependenceTest")
 class RcitWrapper:
-    def __init__(self, df, alpha=0.01, start_time=-1, timeout=-1, **kwargs):
+    def __init__(self, df, alpha=0.01, start_time=-1, timeout=-1, cache=True, workers=None, **kwargs):
         self.df = df
         self.data = df.values
         self.alpha = alpha
-        self.rcit_obj = CIT(self.data, "rcit", **kwargs)
+        # With workers=N, tests are computed by N worker processes (pytetrad.tools.parallel).
+        self.pool = parallel.get_pool("rcit", self.data, workers, **kwargs) if workers else None
+        if self.pool is None:
+            self.rcit_obj = CIT(self.data, "rcit", **kwargs)
+        self.cached = cc.CachedTest(cache, "rcit", kwargs, df)
 
         self.start_time = start_time
         self.timeout = timeout
@@ -69,24 +65,33 @@ class RcitWrapper:
 
     @JOverride
     def checkIndependence(self, *args):
+        return self.checkIndependenceBatch([(args[0], args[1], args[2])])[0]
+
+    def checkIndependenceBatch(self, facts):
+        """Evaluates several facts (x, y, s) - Tetrad nodes and a collection of nodes - in
+        one call, returning their IndependenceResults in order. Facts already in the result
+        cache are not recomputed; see pytetrad.tools.batching for the adapter that collects
+        a search's queries into batches."""
         if self.start_time != -1 and self.timeout != -1 and tm.time() > self.start_time + self.timeout:
             raise Exception("Timeout")
 
-        x = args[0]
-        y = args[1]
-        s = args[2]
-        fact = tg.IndependenceFact(x, y, s)
-
-        X = self.reverse_variable_map[x]
-        Y = self.reverse_variable_map[y]
-        S = [self.reverse_variable_map[si] for si in s]
+        # Convert x, y, s to indices using the reverse map
+        index = [(self.reverse_variable_map[x], self.reverse_variable_map[y],
+                  [self.reverse_variable_map[si] for si in s]) for x, y, s in facts]
+        pvalues = self.cached.pvalues(index, self._pvalues)
 
-        pValue = float(self.rcit_obj(X, Y, S))
-        indep = bool(pValue > self.alpha)
-        delta = float(self.alpha - pValue)
+        results = []
+        for (x, y, s), pValue in zip(facts, pvalues):
+            fact = tg.IndependenceFact(x, y, s)
+            indep = bool(pValue > self.alpha)
+            delta = float(self.alpha - pValue)
+            results.append(tt.IndependenceResult(fact, indep, pValue, delta))
+        return results
 
-        result = tt.IndependenceResult(fact, indep, pValue, delta)
-        return result
+    def _pvalues(self, facts):
+        if self.pool is not None:
+            return self.pool.pvalues(facts)
+        return [self.rcit_obj(X, Y, S) for X, Y, S in facts]
 
     @JOverride
     def getVariables(self, *arg):
@@ -94,7 +99,7 @@ class RcitWrapper:
 
     @JOverride
     def getData(self, *arg):
-        return tr.pandas_data_to_tetrad(self.df)
+        return dc.pandas_data_to_tetrad(self.df)
 
     @JOverride
     def isVerbose(self, *arg):
@@ -113,16 +118,19 @@ class RcitWrapper:
         return self.alpha
 
 
-@JImplements(agind.IndependenceWrapper)
+@jvm.implements("edu.cmu.tetrad.algcomparison.independence.IndependenceWrapper")
 class WrappedClRcit:
-    def __init__(self, df, alpha=0.01, **kwargs):
+    def __init__(self, df, alpha=0.01, cache=True, prefetch=None, **kwargs):
         self.df = df
         self.alpha = alpha
+        self.cache = cache
+        self.prefetch = prefetch
         self.kwargs = kwargs
 
     @JOverride
     def getTest(self, *args):
-        return RcitWrapper(self.df, alpha=self.alpha, **self.kwargs)
+        return bt.batching(RcitWrapper(self.df, alpha=self.alpha, cache=self.cache, **self.kwargs),
+                           self.prefetch)
 
     @JOverride
     def getDescription(self):
@@ -23,17 +23,12 @@ measurements should be cast to float before auditing (or pass int_as_cont=True),
 audit itself will flag suspicious typing via CONTINUOUS_FEW_VALUES and DISCRETE_MANY_LEVELS.
 """
 
-import jpype.imports
-
-try:
-    jpype.startJVM(classpath=["resources/tetrad-current.jar"])
-except OSError:
-    pass
-
 import pandas as pd
 
-import edu.cmu.tetrad.data.audit as ta
-import pytetrad.tools.translate as tr
+import pytetrad.tools.datacache as dc
+import pytetrad.tools.jvm as jvm
+
+ta = jvm.java_import("edu.cmu.tetrad.data.audit")
 
 
 def _require():
@@ -133,7 +128,7 @@ class AuditResult:
 def audit(df, int_as_cont=False, **thresholds):
     """Audits a pandas DataFrame and returns an AuditResult.
 
-    int_as_cont is forwarded to translate.pandas_data_to_tetrad: if True, integer columns
+    int_as_cont is forwarded to translate.pandas_data_to_tetrad (via tools.datacache): if True, integer columns
     are treated as continuous rather than discrete.
 
     Thresholds may be overridden by keyword; the accepted names and defaults are:
@@ -158,7 +153,7 @@ def audit(df, int_as_cont=False, **thresholds):
         raise TypeError(f"Unknown threshold(s): {sorted(unknown)}; "
                         f"accepted: {[name for name, _ in _CONFIG_DEFAULTS]}")
 
-    data = tr.pandas_data_to_tetrad(df, int_as_cont=int_as_cont)
+    data = dc.pandas_data_to_tetrad(df, int_as_cont=int_as_cont)
 
     if thresholds:
         args = [thresholds.get(name, default) for name, default in _CONFIG_DEFAULTS]
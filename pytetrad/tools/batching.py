@@ -0,0 +1,242 @@
+"""Batched independence queries between Tetrad searches and the Python-implemented tests.
+
+Tetrad's searches ask an IndependenceTest one fact at a time, so a Python test pays a
+Python <-> Java crossing, and forgoes any chance to vectorize, per fact. The Python tests
+(FisherZWrapper, KciWrapper, RcitWrapper) therefore also take whole batches through
+checkIndependenceBatch(facts), and BatchingTest is the Java-facing adapter that gathers a
+search's queries into such batches:
+
+- prefetch="fas": the adapter follows the adjacency search of PC-style algorithms (PC,
+  CPC, FCI, ...), which starts from the complete graph, removes x - y whenever it answers
+  x _||_ y | S, and at depth d tries the d-subsets S of the other neighbours of x in turn
+  until one makes x and y independent. When a query for a still-adjacent pair x, y at
+  depth d misses, the adapter asks the test, in one batch, for that fact and the next
+  batch_size - 1 of the pair's subsets (taken in node order, from the neighbours x had at
+  the pair's first query at depth d), so each miss computes at most batch_size - 1 facts
+  the search may not ask for. Pairs already removed are never prefetched.
+  TetradSearch.markov_check turns this mode off for its test.
+- prefetch(facts) asks a known set of facts at once - e.g. the facts of a Markov check,
+  which TetradSearch.markov_check prefetches for local-Markov checks.
+
+Batches are computed outside the adapter's lock, so concurrent queries from a parallel
+search are not held up by them. Queries not prefetched are passed through one at a time,
+so results never depend on the prefetching, only the number of round trips does. Tests
+whose p-values are symmetric in x and y (those with a true symmetric attribute, such as
+FisherZWrapper; or symmetric=True) answer x _||_ y | S and y _||_ x | S from one
+computation; KCI and RCIT are not symmetric.
+
+Typical use, through the IndependenceWrapper classes:
+
+    search.TEST = wc.WrappedClKci(df, prefetch="fas")
+    search.run_pc()
+"""
+
+import threading
+from itertools import combinations
+
+from jpype import JOverride
+
+import pytetrad.tools.jvm as jvm
+
+tg = jvm.java_import("edu.cmu.tetrad.graph")
+tt = jvm.java_import("edu.cmu.tetrad.search.test")
+ju = jvm.java_import("java.util")
+
+
+def check_batch(test, facts):
+    """The IndependenceResults of facts (x, y, s) from test, in one batch if the test
+    supports it."""
+    if hasattr(test, "checkIndependenceBatch"):
+        return test.checkIndependenceBatch(facts)
+    return [test.checkIndependence(x, y, s) for x, y, s in facts]
+
+
+def batching(test, prefetch=None, **kwargs):
+    """test wrapped in a BatchingTest if prefetch is given, else test itself."""
+    return test if prefetch is None else BatchingTest(test, prefetch=prefetch, **kwargs)
+
+
+@jvm.implements("edu.cmu.tetrad.search.test.IndependenceTest")
+class BatchingTest:
+    def __init__(self, test, prefetch="fas", batch_size=16, symmetric=None):
+        if prefetch not in ("fas", None):
+            raise ValueError(f"Unknown prefetch mode '{prefetch}'; expected 'fas' or None.")
+
+        self.test = test
+        self.mode = prefetch
+        self.batch_size = batch_size
+        self.symmetric = getattr(test, "symmetric", False) if symmetric is None else symmetric
+        self.batches = 0
+        self.prefetched = 0
+        self.hits = 0
+
+        self._variables = list(test.getVariables())
+        self._names = [str(v.getName()) for v in self._variables]
+        self._by_name = dict(zip(self._names, self._variables))
+        self._order = {name: k for k, name in enumerate(self._names)}
+        self._adjacent = {name: set(self._names) - {name} for name in self._names}
+        # The subsets not yet asked for each (x, y, depth) the adjacency search has reached.
+        self._subsets = {}
+        self._results = {}
+        self._lock = threading.RLock()
+
+    def _key(self, x, y, s):
+        if self.symmetric and y < x:
+            x, y = y, x
+        return x, y, frozenset(s)
+
+    @JOverride
+    def checkIndependence(self, *args):
+        x, y, s = args[0], args[1], list(args[2])
+        names = str(x.getName()), str(y.getName()), [str(z.getName()) for z in s]
+        key = self._key(*names)
+
+        with self._lock:
+            cached = self._results.get(key)
+            batch = self._next_batch(*names) if cached is None and self.mode == "fas" else []
+
+        if batch:
+            self._evaluate(batch)
+            with self._lock:
+                cached = self._results.get(key)
+
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            result = tt.IndependenceResult(tg.IndependenceFact(x, y, args[2]),
+                                           bool(cached[0]), float(cached[1]), float(cached[2]))
+        else:
+            result = check_batch(self.test, [(x, y, args[2])])[0]
+            self._remember(key, result)
+
+        if self.mode == "fas" and result.isIndependent():
+            with self._lock:
+                self._adjacent[names[0]].discard(names[1])
+                self._adjacent[names[1]].discard(names[0])
+
+        return result
+
+    def prefetch(self, facts):
+        """Evaluates facts, given as (x, y, s) with Tetrad nodes or node names, in one batch,
+        so that later queries for them are answered without calling the test."""
+        by_name = self._by_name
+        nodes = []
+
+        for x, y, s in facts:
+            x, y = by_name.get(str(x), x), by_name.get(str(y), y)
+            s = [by_name.get(str(z), z) for z in s]
+            if self._key(str(x), str(y), [str(z) for z in s]) not in self._results:
+                nodes.append((x, y, s))
+
+        self._evaluate(nodes)
+
+    def _next_batch(self, x, y, s):
+        # Called with the lock held: x _||_ y | s with up to batch_size - 1 more of the
+        # subsets the adjacency search may ask for x, y at depth len(s), or nothing if x and
+        # y are no longer adjacent.
+        if y not in self._adjacent[x]:
+            return []
+
+        depth = len(s)
+        subsets = self._subsets.get((x, y, depth))
+        if subsets is None:
+            others = sorted(self._adjacent[x] - {y}, key=self._order.get)
+            subsets = self._subsets[(x, y, depth)] = combinations(others, depth)
+
+        by_name = self._by_name
+        keys = {self._key(x, y, s)}
+        batch = [(by_name[x], by_name[y], [by_name[z] for z in s])]
+        for subset in subsets:
+            if len(batch) == self.batch_size:
+                break
+            key = self._key(x, y, subset)
+            if key not in self._results and key not in keys:
+                keys.add(key)
+                batch.append((by_name[x], by_name[y], [by_name[z] for z in subset]))
+        return batch
+
+    def _evaluate(self, facts):
+        # Called without the lock held.
+        if not facts:
+            return
+
+        java_facts = []
+        for x, y, s in facts:
+            nodes = ju.ArrayList()
+            for z in s:
+                nodes.add(z)
+            java_facts.append((x, y, nodes))
+
+        results = check_batch(self.test, java_facts)
+
+        with self._lock:
+            self.batches += 1
+            self.prefetched += len(facts)
+            for (x, y, s), result in zip(facts, results):
+                self._remember(self._key(str(x.getName()), str(y.getName()),
+                                         [str(z.getName()) for z in s]), result)
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._results[key] = (result.isIndependent(), result.getPValue(), result.getScore())
+
+    def stats(self):
+        with self._lock:
+            return {"batches": self.batches, "prefetched": self.prefetched, "hits": self.hits,
+                    "results": len(self._results)}
+
+    @JOverride
+    def getVariables(self, *arg):
+        return self.test.getVariables()
+
+    @JOverride
+    def getData(self, *arg):
+        return self.test.getData()
+
+    @JOverride
+    def isVerbose(self, *arg):
+        return False
+
+    @JOverride
+    def setVerbose(self, *arg):
+        pass
+
+    @JOverride
+    def toString(self, *arg):
+        return f"Batching({self.test.toString()})"
+
+    @JOverride
+    def getAlpha(self, *args):
+        return self.test.getAlpha()
+
+
+def local_markov_facts(graph):
+    """The facts x _||_ y | pa(x) a local Markov check of a DAG asks, for y neither x, a
+    parent of x nor a descendant of x, as (x, y, parents) node names."""
+    import pytetrad.tools.translate as tr
+
+    names, i, j, e1, e2 = tr.graph_to_endpoints(graph)
+    directed = (e1 == 3) & (e2 == 2)
+    children = {k: set() for k in range(len(names))}
+    parents = {k: set() for k in range(len(names))}
+
+    for a, b in zip(i[directed].tolist(), j[directed].tolist()):
+        children[a].add(b)
+        parents[b].add(a)
+
+    facts = []
+    for x in range(len(names)):
+        descendants = set()
+        stack = [x]
+        while stack:
+            for child in children[stack.pop()]:
+                if child not in descendants:
+                    descendants.add(child)
+                    stack.append(child)
+
+        conditioning = [names[z] for z in sorted(parents[x])]
+        for y in range(len(names)):
+            if y != x and y not in parents[x] and y not in descendants:
+                facts.append((names[x], names[y], conditioning))
+
+    return facts
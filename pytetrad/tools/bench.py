@@ -0,0 +1,290 @@
+"""Benchmarks for the Python <-> Java boundary: data conversion (translate), search
+overhead (TetradSearch.run_*), Markov checking and result extraction, graph export, and
+the Python-implemented independence tests. run_benchmarks.py in the package directory
+runs the standard suite from the command line; this module holds the harness and the
+cases, so that single cases can also be timed interactively.
+
+Each case is timed over a number of repeats after a warm-up call, and reports the
+minimum and median wall time, the peak of Python allocations (tracemalloc, which sees
+NumPy and pandas buffers) and the peak Java heap during the timed calls. Data come from
+the bundled resources/*.txt files and from tools.simulate at the scales in SCALES,
+simulated under a fixed seed so that runs are comparable. Results are plain dicts; save()
+writes them with environment metadata as JSON, and compare() lines two such files up to
+spot regressions.
+
+Typical use:
+
+    import pytetrad.tools.bench as bench
+
+    results = bench.run_suite(scales=["small"], groups=["conversion", "export"])
+    bench.save(results, "bench.json")
+    print(bench.table(results))
+
+calibrate_kci() checks the large-sample approximate KCI (kci.ApproxKCI) against exact KCI;
+run_kci_calibration.py runs it on the bundled data sets.
+"""
+
+import datetime
+import importlib.resources as importlib_resources
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import pytetrad.tools.jvm as jvm
+import pytetrad.tools.translate as tr
+
+rutil = jvm.java_import("edu.cmu.tetrad.util.RandomUtil")
+
+# (sample size, number of variables) of the simulated data sets.
+SCALES = {"small": (500, 20), "medium": (2000, 100), "large": (10000, 500)}
+
+# Bundled data sets, by label: (file name, kind).
+RESOURCES = {"airfoil": ("airfoil-self-noise.continuous.txt", "continuous"),
+             "sample-discrete": ("sample_discrete.txt", "discrete"),
+             "auto-mpg": ("auto-mpg.data.mixed.max.3.categories.txt", "mixed")}
+
+GROUPS = ["conversion", "search", "markov", "export", "tests"]
+
+
+def measure(fn, repeat=5, warmup=1):
+    """Times fn() repeat times after warmup untimed calls. Returns a dict of seconds_min,
+    seconds_median, python_peak_bytes (over the timed calls), java_heap_peak_bytes and
+    gc_time_ms (JVM, over the timed calls)."""
+    for _ in range(warmup):
+        fn()
+
+    jvm.reset_peak_memory()
+    before = jvm.memory_usage()
+    tracemalloc.start()
+    times = []
+
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        _, python_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    usage = jvm.usage_delta(before, jvm.memory_usage())
+    return {"seconds_min": min(times), "seconds_median": statistics.median(times),
+            "python_peak_bytes": python_peak, "java_heap_peak_bytes": usage["heap_peak"],
+            "gc_time_ms": usage["gc_time_ms"]}
+
+
+def load_resource(label):
+    """A bundled data set as a DataFrame: continuous columns as float64, discrete ones as
+    int64 (mixed files hold both)."""
+    name, kind = RESOURCES[label]
+    path = importlib_resources.files("pytetrad").joinpath("resources", name)
+    df = pd.read_csv(str(path), sep="\t")
+
+    if kind == "continuous":
+        df = df.astype("float64")
+    elif kind == "discrete":
+        df = df.astype("int64")
+    return df
+
+
+def simulate(scale, seed=42):
+    """A linear Gaussian data set (as a DataFrame) and its true graph at the given scale."""
+    import pytetrad.tools.simulate as sim
+
+    n, p = SCALES[scale]
+    rutil.getInstance().setSeed(seed)
+    data, graph = sim.simulateLinearFisher(num_meas=p, samp_size=n)
+    return tr.tetrad_data_to_pandas(data, typed=True), graph
+
+
+def _case(results, group, name, dataset, shape, fn, repeat):
+    result = {"group": group, "name": name, "dataset": dataset, "n": shape[0], "p": shape[1]}
+    result.update(measure(fn, repeat=repeat))
+    results.append(result)
+    print(f"{group:>10} {name:<32} {dataset:<16} {result['seconds_median']:>10.4f} s")
+
+
+def _datasets(scales):
+    for label in RESOURCES:
+        yield label, load_resource(label), None
+    for scale in scales:
+        df, graph = simulate(scale)
+        yield f"sim-{scale}", df, graph
+
+
+def run_suite(scales=("small",), groups=None, repeat=5):
+    """Runs the standard cases at the given scales (keys of SCALES) and returns the list
+    of results. groups limits the run to some of GROUPS."""
+    import pytetrad.tools.TetradSearch as ts
+
+    groups = GROUPS if groups is None else list(groups)
+    results = []
+
+    for dataset, df, true_graph in _datasets(scales):
+        shape = df.shape
+        continuous = all(dtype.kind == "f" for dtype in df.dtypes)
+
+        if "conversion" in groups:
+            data = tr.pandas_data_to_tetrad(df)
+            _case(results, "conversion", "pandas_data_to_tetrad", dataset, shape,
+                  lambda: tr.pandas_data_to_tetrad(df), repeat)
+            _case(results, "conversion", "tetrad_data_to_pandas", dataset, shape,
+                  lambda: tr.tetrad_data_to_pandas(data), repeat)
+
+        if not continuous:
+            continue
+
+        search = ts.TetradSearch(df)
+        search.use_sem_bic()
+        search.use_fisher_z(use_for_mc=True)
+
+        if "search" in groups:
+            _case(results, "search", "run_fges", dataset, shape, search.run_fges, repeat)
+            _case(results, "search", "run_pc", dataset, shape, search.run_pc, repeat)
+
+        search.run_fges()
+        graph = search.get_java()
+
+        if "markov" in groups:
+            _case(results, "markov", "markov_check", dataset, shape,
+                  lambda: search.markov_check(graph), repeat)
+            _case(results, "markov", "get_mc_ind_pvalues", dataset, shape,
+                  search.get_mc_ind_pvalues, repeat)
+
+        if "export" in groups:
+            for label, g in [("estimated", graph), ("true", true_graph)]:
+                if g is None:
+                    continue
+                _case(results, "export", f"graph_to_endpoints[{label}]", dataset, shape,
+                      lambda: tr.graph_to_endpoints(g), repeat)
+                _case(results, "export", f"graph_to_matrix[{label}]", dataset, shape,
+                      lambda: tr.graph_to_matrix(g), repeat)
+
+        if "tests" in groups:
+            _test_cases(results, dataset, df, repeat)
+
+    return results
+
+
+def _test_cases(results, dataset, df, repeat, num_facts=200):
+    """Times checkIndependence on the Python-implemented tests over num_facts random
+    facts. KCI needs causal-learn, and is run on the smaller data sets only."""
+    import pytetrad.tools.WrappedClFisherZ as fz
+
+    ju = jvm.java_import("java.util")
+    rng = np.random.default_rng(0)
+    tests = [("FisherZWrapper", fz.FisherZWrapper(df, cache=False))]
+
+    try:
+        import causallearn  # noqa: F401
+        if len(df) <= 500:
+            import pytetrad.tools.WrappedClKci as kci
+            tests.append(("KciWrapper", kci.KciWrapper(df, cache=False)))
+    except ImportError:
+        print("causal-learn is not installed; skipping KciWrapper.")
+
+    for name, test in tests:
+        variables = test.getVariables()
+        facts = []
+
+        for _ in range(num_facts if name == "FisherZWrapper" else 20):
+            x, y, *z = rng.choice(variables.size(), size=min(4, variables.size()), replace=False)
+            s = ju.ArrayList()
+            for k in z[:rng.integers(0, len(z) + 1)]:
+                s.add(variables.get(int(k)))
+            facts.append((variables.get(int(x)), variables.get(int(y)), s))
+
+        _case(results, "tests", f"{name}.checkIndependence", dataset, df.shape,
+              lambda: [test.checkIndependence(x, y, s) for x, y, s in facts], repeat)
+
+
+# (method, number of features) of ApproxKCI compared with KCI by calibrate_kci.
+KCI_SETTINGS = [("rff", 10), ("rff", 50), ("nystrom", 10), ("nystrom", 50)]
+
+
+def calibrate_kci(df, settings=None, num_facts=100, max_depth=2, alpha=0.05, max_rows=2000,
+                  seed=0):
+    """Compares the p-values of ApproxKCI with those of exact KCI on the continuous columns
+    of df, over num_facts random facts with conditioning sets of up to max_depth variables
+    (fewer if df has too few columns). Rows are subsampled to max_rows, since exact KCI is
+    O(n^3). Returns one dict per (method, num_features) in settings (default KCI_SETTINGS)
+    with the mean and maximum absolute p-value difference, their correlation, the fraction
+    of facts decided the same way at alpha, and the seconds taken by each test."""
+    import pytetrad.tools.kci as kci
+
+    values = df.loc[:, [dtype.kind == "f" for dtype in df.dtypes]].to_numpy(dtype=np.float64)
+    if values.shape[1] < 2:
+        raise ValueError(f"Need at least 2 continuous columns; found {values.shape[1]}.")
+    max_depth = min(max_depth, values.shape[1] - 2)
+
+    rng = np.random.default_rng(seed)
+    if len(values) > max_rows:
+        values = values[np.sort(rng.choice(len(values), size=max_rows, replace=False))]
+
+    facts = []
+    for _ in range(num_facts):
+        x, y, *z = rng.choice(values.shape[1], size=2 + max_depth, replace=False)
+        facts.append((int(x), int(y), [int(k) for k in z[:rng.integers(0, max_depth + 1)]]))
+
+    def pvalues(test):
+        start = time.perf_counter()
+        p = np.array([test(x, y, s) for x, y, s in facts])
+        return p, time.perf_counter() - start
+
+    exact, exact_seconds = pvalues(kci.KCI(values, cache=kci.GramCache()))
+    results = []
+
+    for method, num_features in settings or KCI_SETTINGS:
+        test = kci.ApproxKCI(values, method=method, num_features=num_features, seed=seed,
+                             cache=kci.GramCache())
+        approx, seconds = pvalues(test)
+        difference = np.abs(approx - exact)
+        results.append({"method": method, "num_features": num_features, "n": len(values),
+                        "facts": len(facts), "mean_abs_diff": float(difference.mean()),
+                        "max_abs_diff": float(difference.max()),
+                        "correlation": float(np.corrcoef(approx, exact)[0, 1]),
+                        "agreement": float(np.mean((approx > alpha) == (exact > alpha))),
+                        "exact_seconds": exact_seconds, "approx_seconds": seconds})
+
+    return results
+
+
+def metadata():
+    """Environment details saved alongside results."""
+    return {"timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "platform": platform.platform(),
+            "numpy": np.__version__, "pandas": pd.__version__,
+            "jvm_arguments": jvm.jvm_arguments()}
+
+
+def save(results, path):
+    """Writes results and metadata() to path as JSON."""
+    with open(path, "w") as f:
+        json.dump({"metadata": metadata(), "results": results}, f, indent=2)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def table(results):
+    """The results as a DataFrame, one row per case."""
+    return pd.DataFrame(results)
+
+
+def compare(baseline, current):
+    """Lines up two lists of results (e.g. load()ed from earlier and current runs) by
+    group, name and dataset, with the ratio of median times (current / baseline; above 1
+    is slower)."""
+    keys = ["group", "name", "dataset", "n", "p"]
+    columns = keys + ["seconds_median", "python_peak_bytes", "java_heap_peak_bytes"]
+    merged = pd.DataFrame(baseline)[columns].merge(pd.DataFrame(current)[columns], on=keys,
+                                                   suffixes=("_baseline", "_current"))
+    merged["time_ratio"] = merged["seconds_median_current"] / merged["seconds_median_baseline"]
+    return merged
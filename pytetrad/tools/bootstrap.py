@@ -0,0 +1,312 @@
+"""Bootstrap resampling for TetradSearch with the resamples spread over worker processes,
+each with its own JVM. Tetrad's own bootstrapping (TetradSearch.set_bootstrapping) runs
+every resample inside the one JVM of the calling process, so searches that call back into
+Python - e.g. with the KciWrapper tests of WrappedClKci - serialize on the GIL; here each
+worker runs whole searches independently.
+
+Each resample k draws its rows with a NumPy generator seeded from child k of
+SeedSequence(seed), so a given seed gives the same resamples, and the same graphs for
+deterministic algorithms, whatever the number of workers. Workers rebuild the search from
+the caller's DataFrame and its score, test, knowledge and parameters, run the named run_*
+method, and send back the graph as endpoint arrays (translate.graph_to_endpoints). Java
+objects travel Java-serialized. Python implementations of Java interfaces (WrappedClKci,
+PythonScore, ...), which JPype cannot pickle, travel as their class and constructor
+arguments (jvm.recipe) and are rebuilt once the worker's JVM is up, over the resample in
+place of the caller's DataFrame; their classes must be importable at module level.
+
+The parent rebuilds the graphs and combines them into an ensemble graph whose edges carry
+edge-type probabilities, as the ensemble graph of Tetrad's bootstrapping does.
+
+Use it through TetradSearch.run_bootstrap:
+
+    search = ts.TetradSearch(df)
+    search.use_kci()
+    search.run_bootstrap("pc", num_resamples=100, n_jobs=8, seed=42, depth=3)
+    print(search.get_java())                  # ensemble graph with edge probabilities
+    print(search.bootstrap_graph(0))          # graph of the first resample
+"""
+
+import importlib
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import jpype
+import numpy as np
+import pandas as pd
+
+import pytetrad.tools.jvm as jvm
+import pytetrad.tools.translate as tr
+
+tg = jvm.java_import("edu.cmu.tetrad.graph")
+util = jvm.java_import("java.util")
+io = jvm.java_import("java.io")
+
+# Edge types of EdgeTypeProbability.EdgeType, by the (first, second) endpoint codes of
+# graph_to_endpoints, the first node being the one earlier in node order. Edges with
+# other endpoint pairs (e.g. o--) count towards adjacency only.
+_EDGE_TYPES = {(3, 2): "ta", (2, 3): "at", (1, 2): "ca", (2, 1): "ac",
+               (1, 1): "cc", (2, 2): "aa", (3, 3): "tt"}
+
+ENSEMBLES = {1: "preserved", 2: "highest", 3: "majority"}
+
+
+class _Resample:
+    """Stands for the resampled DataFrame among the arguments of a _Recipe."""
+
+
+class _Recipe:
+    """How to rebuild a Python implementation of a Java interface (an instance of a class
+    decorated with jvm.implements) in a worker: its class, by module and qualified name,
+    and its constructor arguments, with those that are the search's DataFrame (or
+    recipes themselves) encoded so that the rebuilt object uses the worker's resample."""
+
+    def __init__(self, obj, df):
+        cls, args, kwargs = jvm.recipe(obj)
+        if "<locals>" in cls.__qualname__:
+            raise RuntimeError(f"Cannot send {cls.__qualname__} to bootstrap workers; it must "
+                               "be defined at the top level of a module.")
+        self.module = cls.__module__
+        self.qualname = cls.__qualname__
+        self.args = [_encode(arg, df) for arg in args]
+        self.kwargs = {name: _encode(arg, df) for name, arg in kwargs.items()}
+
+    def build(self, df):
+        cls = importlib.import_module(self.module)
+        for name in self.qualname.split("."):
+            cls = getattr(cls, name)
+        return cls(*[_decode(arg, df) for arg in self.args],
+                   **{name: _decode(arg, df) for name, arg in self.kwargs.items()})
+
+
+def _encode(value, df):
+    if isinstance(value, pd.DataFrame) and list(value.columns) == list(df.columns):
+        return _Resample()
+    if jvm.recipe(value) is not None:
+        return _Recipe(value, df)
+    return value
+
+
+def _decode(value, df):
+    if isinstance(value, _Resample):
+        return df
+    if isinstance(value, _Recipe):
+        return value.build(df)
+    return value
+
+
+def _dumps(obj, df):
+    """obj in picklable form: Java objects Java-serialized, Python implementations of Java
+    interfaces as a _Recipe over the DataFrame df."""
+    if obj is None:
+        return None
+
+    if jvm.recipe(obj) is not None:
+        recipe = _Recipe(obj, df)
+        try:
+            return "recipe", pickle.dumps(recipe)
+        except Exception as e:
+            raise RuntimeError(f"Cannot send {recipe.qualname} to bootstrap workers; its "
+                               f"constructor arguments cannot be pickled ({e}).") from None
+
+    if not isinstance(obj, jpype.JObject):
+        raise RuntimeError(f"Cannot send {obj!r} to bootstrap workers; it is neither a Java "
+                           "object nor an instance of a class decorated with "
+                           "pytetrad.tools.jvm.implements.")
+
+    buffer = io.ByteArrayOutputStream()
+    stream = io.ObjectOutputStream(buffer)
+    try:
+        stream.writeObject(obj)
+    except Exception as e:
+        raise RuntimeError(f"Cannot send {obj} to bootstrap workers; it is not "
+                           f"Java-serializable ({e}).") from None
+    finally:
+        stream.close()
+    return "java", bytes(buffer.toByteArray())
+
+
+def _loads(payload, df):
+    """The object _dumps encoded, Python ones rebuilt over the DataFrame df."""
+    if payload is None:
+        return None
+    kind, data = payload
+    if kind == "recipe":
+        return pickle.loads(data).build(df)
+
+    stream = io.ObjectInputStream(io.ByteArrayInputStream(data))
+    try:
+        return stream.readObject()
+    finally:
+        stream.close()
+
+
+def search_state(search):
+    """The parts of a TetradSearch a worker needs to repeat its searches, in picklable form."""
+    return {"df": search.df,
+            "jvm": jvm.settings(),
+            "params": _dumps(search.params, search.df),
+            "knowledge": _dumps(search.knowledge, search.df),
+            "score": _dumps(search.SCORE, search.df),
+            "test": _dumps(search.TEST, search.df)}
+
+
+_worker_state = None
+
+
+def _init_worker(state):
+    global _worker_state
+    if not jvm.is_started():
+        jvm.configure(**{name: value for name, value in state["jvm"].items() if value is not None})
+    _worker_state = state
+
+
+def _run_resample(algorithm, kwargs, seed, sample_size, with_replacement):
+    """Runs one resample in a worker; seed None means the original data."""
+    import pytetrad.tools.TetradSearch as ts
+
+    state = _worker_state
+    df = state["df"]
+
+    if seed is not None:
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(len(df), size=sample_size, replace=with_replacement)
+        df = df.iloc[rows].reset_index(drop=True)
+
+    search = ts.TetradSearch(df)
+    search.params = _loads(state["params"], df)
+    search.knowledge = _loads(state["knowledge"], df)
+    search.SCORE = _loads(state["score"], df)
+    search.TEST = _loads(state["test"], df)
+
+    # Resampling is done here, not again inside Tetrad.
+    search.set_bootstrapping(numberResampling=0)
+
+    getattr(search, "run_" + algorithm)(**kwargs)
+    return tr.graph_to_endpoints(search.java)
+
+
+def run(search, algorithm, num_resamples=100, n_jobs=None, seed=None,
+        percent_resample_size=100, with_replacement=True, add_original=True,
+        resampling_ensemble=1, **kwargs):
+    """Runs search.run_<algorithm>(**kwargs) on num_resamples resamples of search.df over
+    n_jobs worker processes (default: one per core; 1 runs them in this process) and
+    returns (ensemble, graphs): the ensemble graph and a java.util.List of the per-resample
+    graphs (preceded by the graph of the original data if add_original). See
+    TetradSearch.run_bootstrap."""
+    algorithm = algorithm[len("run_"):] if algorithm.startswith("run_") else algorithm
+    if not hasattr(search, "run_" + algorithm) or algorithm == "bootstrap":
+        raise ValueError(f"Unknown algorithm '{algorithm}'; expected the name of a "
+                         "TetradSearch run_* method, e.g. 'pc' or 'boss'.")
+    if int(num_resamples) != num_resamples or num_resamples < 1:
+        raise ValueError(f"num_resamples must be a positive integer; got {num_resamples}.")
+    if resampling_ensemble not in ENSEMBLES:
+        raise ValueError(f"resampling_ensemble must be one of {sorted(ENSEMBLES)} "
+                         "(1 = preserved, 2 = highest, 3 = majority).")
+
+    sample_size = max(1, int(round(len(search.df) * percent_resample_size / 100)))
+    seeds = np.random.SeedSequence(seed).spawn(num_resamples)
+    tasks = ([None] if add_original else []) + seeds
+    state = search_state(search)
+
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+
+    if n_jobs == 1:
+        _init_worker(state)
+        results = [_run_resample(algorithm, kwargs, task, sample_size, with_replacement)
+                   for task in tasks]
+    else:
+        # Workers are spawned, not forked: a forked child would inherit a running JVM it
+        # cannot use.
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(tasks)),
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(state,)) as pool:
+            futures = [pool.submit(_run_resample, algorithm, kwargs, task, sample_size,
+                                   with_replacement) for task in tasks]
+            results = [future.result() for future in futures]
+
+    graphs = util.ArrayList()
+    for endpoints in results:
+        graphs.add(tr.endpoints_to_graph(*endpoints))
+
+    return ensemble_graph(results, resampling_ensemble), graphs
+
+
+def ensemble_graph(results, resampling_ensemble=1):
+    """Combines graphs, given as graph_to_endpoints tuples over the same nodes, into one
+    graph. For each adjacent pair of nodes, the edge's type probabilities (including "no
+    edge") are the frequencies over the graphs, and the edge drawn is the most frequent
+    type: always, if resampling_ensemble is 1 ("preserved"); only if it is more frequent
+    than no edge, if 2 ("highest"); only if the pair is adjacent in more than half of the
+    graphs, if 3 ("majority")."""
+    names = results[0][0]
+    p = len(names)
+    keys = []
+    types = []
+
+    for result_names, i, j, e1, e2 in results:
+        if list(result_names) != list(names):
+            raise ValueError("The graphs must have the same nodes, in the same order.")
+
+        # Order each edge's ends by node index.
+        swap = i > j
+        first, second = np.where(swap, j, i), np.where(swap, i, j)
+        mark1, mark2 = np.where(swap, e2, e1), np.where(swap, e1, e2)
+        keys.append(first.astype(np.int64) * p + second)
+        types.append(mark1.astype(np.int64) * 4 + mark2)
+
+    keys = np.concatenate(keys)
+    types = np.concatenate(types)
+    pairs, codes, counts = _count_pairs(keys, types)
+
+    nodes = [tg.GraphNode(str(name)) for name in names]
+    variables = util.ArrayList()
+    for node in nodes:
+        variables.add(node)
+    graph = tg.EdgeListGraph(variables)
+
+    endpoints = [None, tg.Endpoint.CIRCLE, tg.Endpoint.ARROW, tg.Endpoint.TAIL]
+    edge_type = tg.EdgeTypeProbability.EdgeType
+    total = float(len(results))
+
+    for key in np.unique(pairs).tolist():
+        selected = pairs == key
+        pair_codes, pair_probs = codes[selected], counts[selected] / total
+        adjacency = pair_probs.sum()
+        best = int(np.argmax(pair_probs))
+
+        if resampling_ensemble == 2 and pair_probs[best] <= 1.0 - adjacency:
+            continue
+        if resampling_ensemble == 3 and adjacency <= 0.5:
+            continue
+
+        a, b = divmod(key, p)
+        code = int(pair_codes[best])
+        edge = tg.Edge(nodes[a], nodes[b], endpoints[code // 4], endpoints[code % 4])
+
+        # Edge reverses edges that point left (a <-- b, a <-o b), and edge types are read
+        # relative to the edge's own first node.
+        flipped = edge.getNode1().equals(nodes[b])
+
+        for type_code, prob in zip(pair_codes.tolist(), pair_probs.tolist()):
+            mark1, mark2 = divmod(type_code, 4)
+            name = _EDGE_TYPES.get((mark2, mark1) if flipped else (mark1, mark2))
+            if name is not None:
+                edge.addEdgeTypeProbability(tg.EdgeTypeProbability(getattr(edge_type, name), prob))
+        edge.addEdgeTypeProbability(tg.EdgeTypeProbability(edge_type.nil, 1.0 - adjacency))
+
+        graph.addEdge(edge)
+
+    return graph
+
+
+def _count_pairs(keys, types):
+    """Counts each (pair key, edge type code) combination; returns the pairs, codes and
+    counts of the distinct combinations, ordered by pair and then by code."""
+    if len(keys) == 0:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.int64)
+
+    combined, counts = np.unique(keys * 16 + types, return_counts=True)
+    return combined // 16, combined % 16, counts
@@ -0,0 +1,197 @@
+"""A shared cache of conditional-independence test results for the Python-implemented
+tests (the FisherZWrapper, KciWrapper and RcitWrapper tests of the WrappedCl* modules), so
+that a fact asked more than once - PC asks many facts again in its orientation phase, and
+a Markov check after a search asks many of the search's facts - is computed once.
+
+Results are keyed by the test's name and canonical parameters, a fingerprint of the data
+(datacache.fingerprint) and the fact (x, y, sorted S), with variables given as column
+indices. The most recently used p-values are kept in memory (least recently used evicted
+first); optionally they are also kept in a persistent store in a directory (an SQLite file
+written behind, see pytetrad.tools.pvalue_store, which can also inspect and prune it), so
+that later runs of slow tests such as KCI over the same data reuse them. The cache is safe
+to use from the several Java threads a parallelized search or Markov check may call a test
+from.
+
+The shared default cache is used by the wrappers unless they are given cache=False (or a
+cache of their own). Its size and directory are read from the environment variables
+PYTETRAD_CI_CACHE_SIZE (number of in-memory entries, default 100000; 0 disables memory
+caching) and PYTETRAD_CI_CACHE_DIR (unset by default: no disk tier), and may be changed
+with configure().
+
+Typical use:
+
+    import pytetrad.tools.cicache as cc
+
+    cc.configure(cache_dir="~/.cache/pytetrad")
+    search.use_kci(...)                  # or a WrappedClKci test
+    search.run_pc()
+    search.markov_check(search.get_java())
+    print(cc.stats())
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import pytetrad.tools.datacache as dc
+import pytetrad.tools.pvalue_store as ps
+
+
+class CITestCache:
+    """An LRU cache of p-values with an optional persistent tier (a
+    pvalue_store.PValueStore) in cache_dir."""
+
+    def __init__(self, max_entries=100000, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = None if cache_dir is None else os.path.expanduser(cache_dir)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._store = None
+
+    @staticmethod
+    def key(test, params, data_key, x, y, s):
+        """The cache key of the fact x _||_ y | s (column indices) for the named test with
+        the given parameters (a dict) on the data with fingerprint data_key."""
+        return ps.fact_key(test, params, data_key, x, y, s)
+
+    def pvalue(self, test, params, data_key, x, y, s, compute):
+        """The cached p-value of the fact, or compute() (which is then cached)."""
+        return self.pvalues(test, params, data_key, [(x, y, s)],
+                            lambda facts: [compute()])[0]
+
+    def pvalues(self, test, params, data_key, facts, compute):
+        """The p-values of facts, a list of (x, y, s); those not cached are computed
+        together by compute(missing facts), which returns their p-values in order."""
+        keys = [self.key(test, params, data_key, x, y, s) for x, y, s in facts]
+        pvalues = self._lookup(keys)
+        missing = [k for k, p in enumerate(pvalues) if p is None]
+
+        if missing:
+            computed = compute([facts[k] for k in missing])
+            for k, p in zip(missing, computed):
+                pvalues[k] = float(p)
+            self._store_all([(keys[k], pvalues[k]) for k in missing])
+
+        return pvalues
+
+    def _lookup(self, keys):
+        pvalues = [None] * len(keys)
+        with self._lock:
+            for k, key in enumerate(keys):
+                p = self._entries.get(key)
+                if p is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    pvalues[k] = p
+
+        missing = [k for k, p in enumerate(pvalues) if p is None]
+        store = self._persistent()
+        if missing and store is not None:
+            for k, p in zip(missing, store.get_many([keys[k] for k in missing])):
+                if p is not None:
+                    pvalues[k] = p
+                    with self._lock:
+                        self.disk_hits += 1
+                    self._remember(keys[k], p)
+
+        return pvalues
+
+    def _store_all(self, items):
+        with self._lock:
+            self.misses += len(items)
+        store = self._persistent()
+        if store is not None:
+            store.put_many(items)
+        for key, p in items:
+            self._remember(key, p)
+
+    def clear(self, disk=False):
+        """Empties the in-memory tier and, if disk is True, the persistent store."""
+        with self._lock:
+            self._entries.clear()
+        store = self._persistent() if disk else None
+        if store is not None:
+            store.prune(vacuum=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries,
+                    "hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "cache_dir": self.cache_dir}
+
+    def _remember(self, key, p):
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = p
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _persistent(self):
+        # The store in cache_dir, reopened if cache_dir has been changed.
+        with self._lock:
+            if self.cache_dir is None:
+                return None
+            path = os.path.join(self.cache_dir, "ci-pvalues.sqlite")
+            if self._store is None or self._store.path != path:
+                if self._store is not None:
+                    self._store.close()
+                self._store = ps.PValueStore(path)
+            return self._store
+
+
+_default = CITestCache(max_entries=int(os.environ.get("PYTETRAD_CI_CACHE_SIZE", 100000)),
+                       cache_dir=os.environ.get("PYTETRAD_CI_CACHE_DIR"))
+
+
+def resolve(cache):
+    """The cache a wrapper given cache=... should use: the shared default for True, none
+    for False or None, or the given CITestCache."""
+    if cache is True:
+        return _default
+    if cache is False or cache is None:
+        return None
+    return cache
+
+
+class CachedTest:
+    """What the wrappers hold: the data fingerprint and test identity, bound to a cache."""
+
+    def __init__(self, cache, test, params, df):
+        self.cache = resolve(cache)
+        self.test = test
+        self.params = dict(params)
+        self.data_key = dc.fingerprint(df) if self.cache is not None else None
+
+    def pvalue(self, x, y, s, compute):
+        if self.cache is None:
+            return float(compute())
+        return self.cache.pvalue(self.test, self.params, self.data_key, x, y, s, compute)
+
+    def pvalues(self, facts, compute):
+        if self.cache is None:
+            return [float(p) for p in compute(facts)]
+        return self.cache.pvalues(self.test, self.params, self.data_key, facts, compute)
+
+
+def configure(max_entries=None, cache_dir=None):
+    """Changes the shared default cache's in-memory size and/or disk directory."""
+    if max_entries is not None:
+        _default.max_entries = max_entries
+    if cache_dir is not None:
+        _default.cache_dir = os.path.expanduser(cache_dir)
+
+
+def clear(disk=False):
+    """Empties the shared default cache (and its SQLite file, if disk is True)."""
+    _default.clear(disk=disk)
+
+
+def stats():
+    """Hit/miss counts and settings of the shared default cache, as a dict."""
+    return _default.stats()
@@ -0,0 +1,711 @@
+#!/usr/bin/env python3
+"""A conditional-independence test server on stdin/stdout, for Tetrad's Java client, and a
+Python client for it. kci_server.py and rcit_server.py run it with causal-learn's KCI and
+RCIT; any engine of pytetrad.tools.parallel can be chosen with --engine.
+
+The server greets with one JSON line, {"ok": true, "ready": true, "protocol": N}, and then
+speaks one of two protocols:
+
+Protocol 1 (the default) is one JSON object per line, each answered in order by one JSON
+line: {"op": "init", "csv_path": ..., "params": {...}}, {"op": "update_params",
+"params": {...}}, {"op": "pvalue", "x": 0, "y": 1, "z": [2]} -> {"ok": true, "p": ...},
+{"op": "pvalues", "facts": [[0, 1, [2]], ...]} -> {"ok": true, "p": [...]} and
+{"op": "close"}. {"op": "protocol", "version": 2} switches to protocol 2 after its reply.
+
+init takes the data from one of
+
+    "csv_path": a numeric CSV file with a header row (parsed; the original format)
+    "npy_path": a .npy file, memory-mapped read-only
+    "raw_path": a file of raw values with "shape" [n, p], "dtype" (a NumPy dtype string,
+                default "<f8") and "order" ("C", row-major, the default, or "F"),
+                memory-mapped read-only - the simplest binary format for a Java client
+    "shm_name": a POSIX shared-memory segment holding such raw values, with "shape",
+                "dtype" and "order" as for raw_path
+
+Memory-mapped files and shared memory are not read in, so several servers over the same
+data share one copy in the page cache and start at once; the server never unlinks a
+segment it is given. share_data() puts an array into a new segment for such an init.
+
+Protocol 2 (--protocol 2, or after the switch) is binary and pipelined. Every message is a
+frame: a little-endian uint32 length, then that many bytes of payload. A request payload is
+a uint32 request id, a uint8 op and a body; the response carries the same id, a uint8
+status (0 ok, 1 error) and a body, and responses may arrive in any order (with --threads
+above 1 requests are evaluated concurrently), so clients may send many requests before
+reading any reply. Ops:
+
+    OP_JSON     body and reply are a UTF-8 JSON message as in protocol 1 (init, close, ...)
+    OP_PVALUES  body is int32 values: count, then for each fact x, y, |z|, z...;
+                the reply is a uint32 count and that many float64 p-values
+
+Errors reply with status 1 and a UTF-8 message. Control messages (OP_JSON) wait for the
+p-value requests before them to finish, so e.g. an update_params never overlaps them.
+{"op": "stats"} reports the number of p-values computed.
+
+With --store PATH (or PYTETRAD_PVALUE_STORE set) p-values are looked up in, and written
+behind to, a persistent pytetrad.tools.pvalue_store keyed by the engine, its parameters,
+a hash of the data (or init's "data_key", to spare hashing a large data set) and the fact,
+so that later sessions over the same data reuse them.
+
+With --workers N the server is a Dispatcher: it starts N worker servers up front, shares
+the data with them through shared memory, broadcasts init and update_params, and spreads
+p-values over them, least loaded first; stats then also reports each worker's
+utilisation. Parallelism comes from batches (pvalues) and from pipelined protocol-2
+requests; a protocol-1 client asking one pvalue at a time keeps one worker busy.
+
+Typical use of the client:
+
+    from pytetrad.tools.cit_server import CitClient
+
+    with CitClient(engine="kci", protocol=2) as client:
+        client.init(csv_path="data.csv")
+        ps = client.pvalues([(0, 1, [2]), (0, 3, [])])
+"""
+
+import argparse
+import json
+import math
+import os
+import struct
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import pytetrad.tools.parallel as parallel
+import pytetrad.tools.pvalue_store as ps
+
+OP_JSON = 1
+OP_PVALUES = 2
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+_LENGTH = struct.Struct("<I")
+_HEADER = struct.Struct("<IB")
+
+
+# Frames
+
+def encode_facts(facts):
+    values = [len(facts)]
+    for x, y, z in facts:
+        values += [int(x), int(y), len(z)] + [int(k) for k in z]
+    return np.asarray(values, dtype="<i4").tobytes()
+
+
+def decode_facts(body):
+    values = np.frombuffer(body, dtype="<i4").tolist()
+    facts, k = [], 1
+    for _ in range(values[0]):
+        x, y, size = values[k:k + 3]
+        facts.append((x, y, values[k + 3:k + 3 + size]))
+        k += 3 + size
+    return facts
+
+
+def encode_pvalues(pvalues):
+    return _LENGTH.pack(len(pvalues)) + np.asarray(pvalues, dtype="<f8").tobytes()
+
+
+def decode_pvalues(body):
+    count = _LENGTH.unpack_from(body)[0]
+    return np.frombuffer(body, dtype="<f8", count=count, offset=_LENGTH.size).tolist()
+
+
+def write_frame(stream, request_id, code, body):
+    stream.write(_LENGTH.pack(_HEADER.size + len(body)) + _HEADER.pack(request_id, code) + body)
+    stream.flush()
+
+
+def _read_exactly(stream, size):
+    data = stream.read(size)
+    if len(data) < size:
+        raise EOFError("The stream ended inside a frame.")
+    return data
+
+
+def read_frame(stream):
+    """(request id, op or status, body) of the next frame, or None at the end of stream."""
+    head = stream.read(_LENGTH.size)
+    if not head:
+        return None
+    if len(head) < _LENGTH.size:
+        head += _read_exactly(stream, _LENGTH.size - len(head))
+    payload = _read_exactly(stream, _LENGTH.unpack(head)[0])
+    request_id, code = _HEADER.unpack_from(payload)
+    return request_id, code, payload[_HEADER.size:]
+
+
+# Server
+
+def load_csv(path):
+    # Assumes a numeric CSV file with a header row.
+    data = np.genfromtxt(path, delimiter=",", skip_header=1)
+    if data.ndim == 1:
+        data = data.reshape(-1, 1)
+    return data
+
+
+def attach_shared(name):
+    """Opens an existing shared-memory segment without taking ownership of it: Python
+    before 3.13 otherwise unlinks the segment when the attaching process exits."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        block = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(block._name, "shared_memory")
+        return block
+
+
+def load_data(msg):
+    """The data an init message names, and the shared-memory segment holding it (or None)."""
+    if msg.get("csv_path"):
+        return load_csv(msg["csv_path"]), None
+    if msg.get("npy_path"):
+        return np.load(msg["npy_path"], mmap_mode="r"), None
+
+    if not (msg.get("raw_path") or msg.get("shm_name")):
+        raise ValueError("init requires csv_path, npy_path, raw_path or shm_name")
+    if "shape" not in msg:
+        raise ValueError("init with raw_path or shm_name requires shape")
+
+    shape = tuple(int(k) for k in msg["shape"])
+    dtype = np.dtype(msg.get("dtype", "<f8"))
+    order = msg.get("order", "C")
+
+    if msg.get("raw_path"):
+        return np.memmap(msg["raw_path"], dtype=dtype, mode="r", shape=shape, order=order), None
+
+    block = attach_shared(msg["shm_name"])
+    if block.size < int(np.prod(shape)) * dtype.itemsize:
+        block.close()
+        raise ValueError(f"shared memory '{msg['shm_name']}' is smaller than {shape} {dtype}")
+    data = np.ndarray(shape, dtype=dtype, buffer=block.buf, order=order)
+    data.flags.writeable = False
+    return data, block
+
+
+def share_data(data):
+    """Copies data into a new shared-memory segment. Returns the segment (close() and
+    unlink() it when done) and the init fields naming it."""
+    values = np.ascontiguousarray(data)
+    block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[...] = values
+    return block, {"shm_name": block.name, "shape": list(values.shape),
+                   "dtype": values.dtype.str, "order": "C"}
+
+
+class CitServer:
+    """The state of a server: its data and the test engine (see parallel.ENGINES)."""
+
+    def __init__(self, engine="causal-learn-kci", store=None):
+        self.engine = engine
+        self.X = None
+        self.cit = None
+        self.params = {}
+        self.verbose = False
+        self.facts = 0
+        self.stored = 0
+        self.store = None if store is None else ps.PValueStore(store)
+        self.data_key = None
+        self._block = None
+        self._lock = threading.Lock()
+
+    def handle_init(self, msg):
+        X, block = load_data(msg)
+        self.params = msg.get("params", {}) or {}
+        self.verbose = bool(msg.get("verbose", False))
+        self.cit = None
+        self.X = X
+        self._release()
+        self._block = block
+        self.data_key = self._data_key(msg, X)
+        self.cit = parallel.make_engine(self.engine, self.X, self.params)
+        return {"ok": True, "n": int(self.X.shape[0]), "p": int(self.X.shape[1])}
+
+    def handle_update_params(self, msg):
+        self.params = msg.get("params", {}) or {}
+        if self.X is None:
+            return {"ok": True, "note": "params stored (no init yet)"}
+        self.cit = parallel.make_engine(self.engine, self.X, self.params)
+        return {"ok": True}
+
+    def _release(self):
+        # Unmaps the previous segment, unless arrays still view it (then it is unmapped
+        # when they are freed).
+        if self._block is not None:
+            try:
+                self._block.close()
+            except BufferError:
+                pass
+            self._block = None
+
+    def _data_key(self, msg, X):
+        # The data set's key in the store: given by the client (which may know it without
+        # hashing a large data set) or a hash of the data.
+        if self.store is None:
+            return None
+        return msg.get("data_key") or ps.array_fingerprint(X)
+
+    def pvalues(self, facts):
+        """The p-values of facts, from the store where it has them."""
+        facts = [(int(x), int(y), [int(i) for i in z]) for x, y, z in facts]
+        if self.store is None:
+            pvalues = self._compute(facts)
+        else:
+            keys = [ps.fact_key(self.engine, self.params, self.data_key, x, y, z)
+                    for x, y, z in facts]
+            pvalues = self.store.get_many(keys)
+            missing = [k for k, p in enumerate(pvalues) if p is None]
+            if missing:
+                computed = self._compute([facts[k] for k in missing])
+                for k, p in zip(missing, computed):
+                    pvalues[k] = p
+                self.store.put_many([(keys[k], pvalues[k]) for k in missing])
+            with self._lock:
+                self.stored += len(facts) - len(missing)
+
+        with self._lock:
+            self.facts += len(facts)
+        return pvalues
+
+    def _compute(self, facts):
+        if self.cit is None:
+            raise RuntimeError("not initialized")
+        return [float(self.cit(x, y, z)) for x, y, z in facts]
+
+    def stats(self):
+        with self._lock:
+            return {"facts": self.facts, "from_store": self.stored}
+
+    def close(self):
+        self._release()
+        if self.store is not None:
+            self.store.close()
+
+    def handle(self, msg):
+        """The reply to a JSON message."""
+        op = msg.get("op")
+        if op == "init":
+            out = self.handle_init(msg)
+        elif op == "update_params":
+            out = self.handle_update_params(msg)
+        elif op == "pvalue":
+            out = {"ok": True, "p": self.pvalues([(msg["x"], msg["y"], msg.get("z", []))])[0]}
+        elif op == "pvalues":
+            out = {"ok": True, "p": self.pvalues(msg["facts"])}
+        elif op == "stats":
+            out = dict(self.stats(), ok=True)
+        elif op == "close":
+            out = {"ok": True, "bye": True}
+        else:
+            out = {"ok": False, "error": f"unknown op: {op}"}
+
+        if "id" in msg:
+            out["id"] = msg["id"]
+        return out
+
+
+class _Worker:
+    """A worker server of a Dispatcher, with its load and the time it has been busy."""
+
+    def __init__(self, engine):
+        self.client = CitClient(engine=engine, protocol=2)
+        self.outstanding = 0
+        self.requests = 0
+        self.facts = 0
+        self.busy_seconds = 0.0
+        self._since = None
+        self._lock = threading.Lock()
+
+    def submit(self, facts):
+        with self._lock:
+            if self.outstanding == 0:
+                self._since = time.perf_counter()
+            self.outstanding += len(facts)
+            self.requests += 1
+
+        future = self.client.submit(facts)
+        future.add_done_callback(lambda _: self._done(len(facts)))
+        return future
+
+    def _done(self, count):
+        with self._lock:
+            self.outstanding -= count
+            self.facts += count
+            if self.outstanding == 0:
+                self.busy_seconds += time.perf_counter() - self._since
+
+    def stats(self, elapsed):
+        with self._lock:
+            busy = self.busy_seconds
+            if self.outstanding:
+                busy += time.perf_counter() - self._since
+            return {"pid": self.client.process.pid, "requests": self.requests, "facts": self.facts,
+                    "outstanding": self.outstanding, "busy_seconds": busy,
+                    "utilisation": busy / elapsed if elapsed > 0 else 0.0}
+
+
+class Dispatcher(CitServer):
+    """A server that spreads p-values over warm worker servers, started up front.
+
+    init loads a CSV file once into a shared-memory segment (or passes an npy_path,
+    raw_path or shm_name on), so all workers map one copy of the data; init and
+    update_params are broadcast to every worker. A batch is split into chunks of at most
+    chunk_size facts, grouped by conditioning set, each sent to the worker with the least
+    outstanding work. stats() reports each worker's requests, facts, busy time and
+    utilisation (busy time over time since the dispatcher started)."""
+
+    def __init__(self, engine="causal-learn-kci", workers=2, chunk_size=64, store=None):
+        super().__init__(engine, store=store)
+        self.chunk_size = chunk_size
+        self.workers = [_Worker(engine) for _ in range(workers)]
+        self._initialized = False
+        self._turn = 0
+        self._started = time.perf_counter()
+
+    def _broadcast(self, msg):
+        body = json.dumps(msg).encode()
+        replies = [future.result() for future in
+                   [worker.client._submit(OP_JSON, body) for worker in self.workers]]
+        for reply in replies:
+            if not reply.get("ok"):
+                raise RuntimeError(reply.get("error"))
+        return replies
+
+    def handle_init(self, msg):
+        self.params = msg.get("params", {}) or {}
+        self.verbose = bool(msg.get("verbose", False))
+
+        block = None
+        if msg.get("csv_path"):
+            X = load_csv(msg["csv_path"])
+            data_key = self._data_key(msg, X)
+            block, fields = share_data(X)
+        else:
+            fields = {key: msg[key] for key in ("npy_path", "raw_path", "shm_name", "shape",
+                                                "dtype", "order") if key in msg}
+            data_key = msg.get("data_key")
+            if self.store is not None and data_key is None:
+                X, mapped = load_data(fields)
+                data_key = self._data_key(msg, X)
+                del X
+                if mapped is not None:
+                    mapped.close()
+
+        try:
+            replies = self._broadcast(dict(fields, op="init", params=self.params,
+                                           verbose=self.verbose))
+        except Exception:
+            if block is not None:
+                block.close()
+                block.unlink()
+            raise
+
+        self._release()
+        self._block = block
+        self.data_key = data_key
+        self._initialized = True
+        return {"ok": True, "n": replies[0]["n"], "p": replies[0]["p"],
+                "workers": len(self.workers)}
+
+    def handle_update_params(self, msg):
+        self.params = msg.get("params", {}) or {}
+        self._broadcast({"op": "update_params", "params": self.params})
+        if not self._initialized:
+            return {"ok": True, "note": "params stored (no init yet)"}
+        return {"ok": True}
+
+    def _release(self):
+        # The dispatcher owns the segments it made from CSV files.
+        if self._block is not None:
+            self._block.close()
+            self._block.unlink()
+            self._block = None
+
+    def _compute(self, facts):
+        if not self._initialized:
+            raise RuntimeError("not initialized")
+        if not facts:
+            return []
+
+        order = sorted(range(len(facts)), key=lambda k: sorted(facts[k][2]))
+        size = min(self.chunk_size, math.ceil(len(facts) / len(self.workers)))
+        chunks = [order[start:start + size] for start in range(0, len(order), size)]
+
+        futures = []
+        for chunk in chunks:
+            # Least loaded first; ties go round robin.
+            with self._lock:
+                self._turn = (self._turn + 1) % len(self.workers)
+                turn = self._turn
+            candidates = self.workers[turn:] + self.workers[:turn]
+            worker = min(candidates, key=lambda w: w.outstanding)
+            futures.append(worker.submit([facts[k] for k in chunk]))
+
+        pvalues = [0.0] * len(facts)
+        for chunk, future in zip(chunks, futures):
+            for k, p in zip(chunk, future.result()):
+                pvalues[k] = p
+        return pvalues
+
+    def stats(self):
+        elapsed = time.perf_counter() - self._started
+        return dict(super().stats(), elapsed_seconds=elapsed,
+                    workers=[worker.stats(elapsed) for worker in self.workers])
+
+    def close(self):
+        for worker in self.workers:
+            worker.client.close()
+        super().close()
+
+
+def _send(stdout, obj):
+    stdout.write((json.dumps(obj) + "\n").encode())
+    stdout.flush()
+
+
+def serve_json(server, stdin, stdout):
+    """Protocol 1. Returns True if the client asked to switch to protocol 2."""
+    while True:
+        line = stdin.readline()
+        if not line:
+            return False
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            msg = json.loads(line)
+            if msg.get("op") == "protocol":
+                version = int(msg.get("version", 1))
+                if version not in (1, 2):
+                    raise ValueError(f"unsupported protocol: {version}")
+                _send(stdout, {"ok": True, "protocol": version})
+                if version == 2:
+                    return True
+                continue
+            out = server.handle(msg)
+            _send(stdout, out)
+            if out.get("bye"):
+                return False
+        except Exception as e:
+            if server.verbose:
+                traceback.print_exc()
+            _send(stdout, {"ok": False, "error": str(e)})
+
+
+def serve_binary(server, stdin, stdout, threads=1):
+    """Protocol 2, evaluating up to threads p-value requests at once."""
+    write_lock = threading.Lock()
+
+    def run(request_id, code, body):
+        try:
+            if code == OP_PVALUES:
+                reply = encode_pvalues(server.pvalues(decode_facts(body)))
+            elif code == OP_JSON:
+                reply = json.dumps(server.handle(json.loads(body))).encode()
+            else:
+                raise ValueError(f"unknown op code: {code}")
+            status = STATUS_OK
+        except Exception as e:
+            if server.verbose:
+                traceback.print_exc()
+            reply, status = str(e).encode(), STATUS_ERROR
+
+        with write_lock:
+            write_frame(stdout, request_id, status, reply)
+
+    executor = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+    pending = set()
+
+    try:
+        while True:
+            frame = read_frame(stdin)
+            if frame is None:
+                return
+
+            request_id, code, body = frame
+            if code == OP_PVALUES and executor is not None:
+                future = executor.submit(run, request_id, code, body)
+                pending.add(future)
+                future.add_done_callback(pending.discard)
+                continue
+
+            if code != OP_PVALUES:
+                for future in list(pending):
+                    future.result()
+            run(request_id, code, body)
+
+            if code == OP_JSON and json.loads(body).get("op") == "close":
+                return
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def main(default_engine="causal-learn-kci", argv=None):
+    parser = argparse.ArgumentParser(description="Conditional-independence test server.")
+    parser.add_argument("--engine", default=default_engine, choices=parallel.ENGINES)
+    parser.add_argument("--protocol", type=int, default=1, choices=[1, 2])
+    parser.add_argument("--threads", type=int, default=1,
+                        help="p-value requests evaluated at once (protocol 2)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="dispatch p-values to this many worker processes")
+    parser.add_argument("--store", default=os.environ.get("PYTETRAD_PVALUE_STORE"),
+                        help="SQLite p-value store to reuse and keep results in "
+                             "(default: $PYTETRAD_PVALUE_STORE, else none)")
+    args = parser.parse_args(argv)
+
+    if args.workers > 0:
+        # Each request thread waits on a worker, so allow several per worker.
+        server = Dispatcher(args.engine, workers=args.workers, store=args.store)
+        threads = max(args.threads, 4 * args.workers)
+    else:
+        server = CitServer(args.engine, store=args.store)
+        threads = args.threads
+
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    try:
+        _send(stdout, {"ok": True, "ready": True, "protocol": args.protocol})
+        if args.protocol == 2 or serve_json(server, stdin, stdout):
+            serve_binary(server, stdin, stdout, threads=threads)
+    finally:
+        server.close()
+
+
+# Client
+
+class CitClient:
+    """Starts a server process and talks to it. With protocol 2, submit() pipelines requests
+    and returns Futures; pvalue() and pvalues() wait for their replies."""
+
+    def __init__(self, engine="causal-learn-kci", protocol=2, threads=1, workers=0,
+                 store=None, command=None):
+        if command is None:
+            command = [sys.executable, "-m", "pytetrad.tools.cit_server", "--engine", engine,
+                       "--threads", str(threads), "--workers", str(workers)]
+            if store is not None:
+                command += ["--store", store]
+        self.protocol = protocol
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._stdin, self._stdout = self.process.stdin, self.process.stdout
+
+        greeting = json.loads(self._stdout.readline())
+        if not greeting.get("ready"):
+            raise RuntimeError(f"Unexpected greeting from the server: {greeting}")
+
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._futures = {}
+        self._reader = None
+
+        if protocol == 2:
+            if greeting.get("protocol", 1) == 1:
+                self._json({"op": "protocol", "version": 2})
+            self._reader = threading.Thread(target=self._read_replies, daemon=True)
+            self._reader.start()
+
+    def _json(self, msg):
+        # Protocol 1: one line out, one line back.
+        with self._lock:
+            _send(self._stdin, msg)
+            out = json.loads(self._stdout.readline())
+        if not out.get("ok"):
+            raise RuntimeError(out.get("error"))
+        return out
+
+    def _submit(self, code, body):
+        future = Future()
+        with self._lock:
+            request_id = self._next_id
+            self._next_id = (self._next_id + 1) % 2 ** 32
+            self._futures[request_id] = (future, code)
+            write_frame(self._stdin, request_id, code, body)
+        return future
+
+    def _read_replies(self):
+        while True:
+            try:
+                frame = read_frame(self._stdout)
+            except (EOFError, ValueError):
+                frame = None
+            if frame is None:
+                break
+
+            request_id, status, body = frame
+            with self._lock:
+                future, code = self._futures.pop(request_id)
+            if status != STATUS_OK:
+                future.set_exception(RuntimeError(body.decode()))
+            elif code == OP_PVALUES:
+                future.set_result(decode_pvalues(body))
+            else:
+                future.set_result(json.loads(body))
+
+        with self._lock:
+            futures, self._futures = self._futures, {}
+        for future, _ in futures.values():
+            future.set_exception(EOFError("The server closed the connection."))
+
+    def request(self, msg):
+        """Sends a JSON message (init, update_params, ...) and returns the reply."""
+        if self.protocol == 1:
+            return self._json(msg)
+        out = self._submit(OP_JSON, json.dumps(msg).encode()).result()
+        if not out.get("ok"):
+            raise RuntimeError(out.get("error"))
+        return out
+
+    def init(self, csv_path=None, params=None, **msg):
+        """Loads the data: from csv_path, or from npy_path, raw_path or shm_name (with
+        shape, dtype and order) given as keyword arguments."""
+        if csv_path is not None:
+            msg["csv_path"] = csv_path
+        return self.request(dict(msg, op="init", params=params or {}))
+
+    def update_params(self, params):
+        return self.request({"op": "update_params", "params": params})
+
+    def stats(self):
+        return self.request({"op": "stats"})
+
+    def submit(self, facts):
+        """A Future of the p-values of facts, (x, y, z) column indices (protocol 2)."""
+        if self.protocol != 2:
+            raise RuntimeError("submit() needs protocol 2.")
+        return self._submit(OP_PVALUES, encode_facts(facts))
+
+    def pvalues(self, facts):
+        if self.protocol == 1:
+            facts = [[int(x), int(y), [int(k) for k in z]] for x, y, z in facts]
+            return self._json({"op": "pvalues", "facts": facts})["p"]
+        return self.submit(facts).result()
+
+    def pvalue(self, x, y, z=()):
+        if self.protocol == 1:
+            return self._json({"op": "pvalue", "x": int(x), "y": int(y), "z": list(z)})["p"]
+        return self.submit([(x, y, z)]).result()[0]
+
+    def close(self):
+        if self.process.poll() is None:
+            try:
+                self.request({"op": "close"})
+            except (RuntimeError, EOFError, OSError):
+                pass
+            self._stdin.close()
+            self.process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""A content-addressed cache of pandas -> Tetrad data set conversions, so that building
+several TetradSearch objects, audits, imputations or wrapped tests over the same DataFrame
+converts it only once.
+
+Entries are keyed by a fingerprint of the frame's column names, dtypes and values (a
+BLAKE2 digest over the column buffers; the index is ignored, since the conversion ignores
+it), so an equal frame built elsewhere hits the cache, and a frame modified in place
+misses it. Both tiers are opt-in. Conversions may be kept in memory (least recently used
+evicted first), at the cost of holding them in the JVM heap; a memory hit returns a
+JVM-side copy, so that callers may modify what they get. Conversions may also be written
+as serialized BoxDataSets to a directory, so that later sessions and batch jobs over the
+same data skip conversion entirely. Files are named by the fingerprint, a format version
+and the size and date of the jars on the JVM's classpath, so that a new Tetrad jar never
+reads objects serialized by an old one; a file that cannot be written or read is a miss.
+
+The shared default cache is used by TetradSearch, tools.audit, tools.missing and the
+WrappedCl* tests. Its size and directory are read from the environment variables
+PYTETRAD_DATA_CACHE_SIZE (number of in-memory entries, default 0: no memory tier) and
+PYTETRAD_DATA_CACHE_DIR (unset by default: no disk tier), and may be changed with
+configure(); with neither, the shared cache just converts.
+
+Typical use:
+
+    import pytetrad.tools.datacache as dc
+
+    dc.configure(max_entries=2, cache_dir="~/.cache/pytetrad")
+    data = dc.pandas_data_to_tetrad(df)     # converts (or loads from disk)
+    data = dc.pandas_data_to_tetrad(df)     # memory hit
+    print(dc.stats())
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import pytetrad.tools.jvm as jvm
+import pytetrad.tools.translate as tr
+
+io = jvm.java_import("java.io")
+lang = jvm.java_import("java.lang")
+
+# Part of the names of cached files; changing how data sets are converted or stored
+# should change it.
+FORMAT_VERSION = 1
+
+
+def fingerprint(df, int_as_cont=False):
+    """Returns a hex digest identifying the conversion of df: its shape, column names,
+    dtypes and values, and the int_as_cont flag."""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(repr((bool(int_as_cont), df.shape)).encode())
+
+    for col in df.columns:
+        s = df[col]
+        h.update(repr((str(col), str(s.dtype))).encode())
+        values = s.to_numpy()
+
+        if isinstance(values, np.ndarray) and values.dtype.kind in "biufc":
+            h.update(np.ascontiguousarray(values).view(np.uint8))
+        else:
+            h.update(pd.util.hash_pandas_object(s, index=False).to_numpy())
+
+    return h.hexdigest()
+
+
+class DataCache:
+    """An LRU cache of up to max_entries converted data sets, with an optional on-disk tier
+    in cache_dir. When the cache keeps the data set it returns, get() returns a Java-side
+    copy (copy=True) so that callers may modify what they get without affecting later
+    hits."""
+
+    def __init__(self, max_entries=0, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = None if cache_dir is None else os.path.expanduser(cache_dir)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._classpath_key = None
+
+    def get(self, df, int_as_cont=False, copy=True):
+        key = fingerprint(df, int_as_cont)
+
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+
+        if data is None:
+            data = self._load(key)
+            if data is not None:
+                self.disk_hits += 1
+            else:
+                data = tr.pandas_data_to_tetrad(df, int_as_cont=int_as_cont)
+                self.misses += 1
+                self._save(key, data)
+            if not self._remember(key, data):
+                return data
+
+        return data.copy() if copy else data
+
+    def clear(self, disk=False):
+        """Empties the in-memory tier and, if disk is True, deletes the cached files."""
+        with self._lock:
+            self._entries.clear()
+
+        if disk and self.cache_dir is not None and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".ser"):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries,
+                    "hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "cache_dir": self.cache_dir}
+
+    def _remember(self, key, data):
+        """Keeps data in memory, if there is a memory tier; returns whether it was kept."""
+        if self.max_entries <= 0:
+            return False
+
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def _path(self, key):
+        if self._classpath_key is None:
+            self._classpath_key = _classpath_key()
+        return os.path.join(self.cache_dir, f"{key}-{self._classpath_key}.ser")
+
+    def _load(self, key):
+        if self.cache_dir is None or not os.path.exists(self._path(key)):
+            return None
+
+        stream = None
+        try:
+            stream = io.ObjectInputStream(io.BufferedInputStream(io.FileInputStream(self._path(key))))
+            return stream.readObject()
+        except Exception:
+            # A truncated or stale file (e.g. written by an incompatible jar) is just a miss.
+            return None
+        finally:
+            if stream is not None:
+                stream.close()
+
+    def _save(self, key, data):
+        if self.cache_dir is None:
+            return
+
+        tmp = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = self._path(key) + f".{os.getpid()}.tmp"
+            stream = io.ObjectOutputStream(io.BufferedOutputStream(io.FileOutputStream(tmp)))
+            try:
+                stream.writeObject(data)
+            finally:
+                stream.close()
+            os.replace(tmp, self._path(key))
+        except Exception:
+            # An unwritable directory or a full disk only means the next lookup misses.
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def _classpath_key():
+    """A short digest of FORMAT_VERSION and the names, sizes and dates of the entries of the
+    running JVM's classpath."""
+    h = hashlib.blake2b(digest_size=8)
+    h.update(repr(FORMAT_VERSION).encode())
+    for entry in str(lang.System.getProperty("java.class.path")).split(os.pathsep):
+        try:
+            stat = os.stat(entry)
+            h.update(repr((os.path.basename(entry), stat.st_size, stat.st_mtime_ns)).encode())
+        except OSError:
+            h.update(repr((entry, None)).encode())
+    return h.hexdigest()
+
+
+_default = DataCache(max_entries=int(os.environ.get("PYTETRAD_DATA_CACHE_SIZE", 0)),
+                     cache_dir=os.environ.get("PYTETRAD_DATA_CACHE_DIR"))
+
+
+def pandas_data_to_tetrad(df, int_as_cont=False):
+    """translate.pandas_data_to_tetrad through the shared default cache."""
+    return _default.get(df, int_as_cont=int_as_cont)
+
+
+def configure(max_entries=None, cache_dir=None):
+    """Changes the shared default cache's in-memory size and/or disk directory. Shrinking
+    max_entries takes effect at the next insertion."""
+    if max_entries is not None:
+        _default.max_entries = max_entries
+    if cache_dir is not None:
+        _default.cache_dir = os.path.expanduser(cache_dir)
+
+
+def clear(disk=False):
+    """Empties the shared default cache (and its directory, if disk is True)."""
+    _default.clear(disk=disk)
+
+
+def stats():
+    """Hit/miss counts and settings of the shared default cache, as a dict."""
+    return _default.stats()
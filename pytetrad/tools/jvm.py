@@ -0,0 +1,364 @@
+"""The one place py-tetrad starts the JVM. Importing pytetrad.tools modules no longer starts
+it; it is started on first use of a Java class - through the lazy package handles below,
+or through a plain `import edu.cmu...` / `import java...` statement - so that scripts and
+worker processes that only need the pandas-side helpers do not pay for JVM startup or
+class loading.
+
+The JVM can be started only once per process, and its options are fixed at that point.
+To change them, call configure() before anything touches Java:
+
+    import pytetrad.tools.jvm as jvm
+    jvm.configure(max_heap="16g", gc="G1", parallelism=8)
+
+    import pytetrad.tools.TetradSearch as ts   # still no JVM
+    search = ts.TetradSearch(df)               # JVM starts here
+
+or set the corresponding environment variables, which are read when the JVM starts:
+
+    setting       configure() keyword   environment variable      example
+    -----------   -------------------   -----------------------   ---------------------
+    preset        preset                PYTETRAD_JVM_PRESET       large-p
+    -Xmx          max_heap              PYTETRAD_JVM_MAX_HEAP     16g, or 75% (of RAM)
+    -Xss          stack_size            PYTETRAD_JVM_STACK_SIZE   16m
+    collector     gc                    PYTETRAD_JVM_GC           G1, Parallel, Z, ...
+    common pool   parallelism           PYTETRAD_JVM_PARALLELISM  8
+    other args    jvm_args              PYTETRAD_JVM_ARGS         -XX:+AlwaysPreTouch
+    classpath     classpath             PYTETRAD_JVM_CLASSPATH    /path/tetrad.jar
+
+Settings passed to configure() override environment variables, which override the
+preset, which overrides the JVM's own defaults. "common pool" is the parallelism of
+Java's ForkJoinPool.commonPool(), on which Tetrad's parallelized searches, bootstraps and
+Markov checks run (default: number of cores - 1). The presets (see PRESETS) are starting
+points:
+
+    small            interactive work on tens of variables: 2g heap, G1.
+    large-p          FGES/BOSS/GRaSP over thousands of variables: 75% of RAM as heap,
+                     16m thread stacks for deep recursion, the throughput (Parallel)
+                     collector.
+    bootstrap-heavy  many resamples or Markov-check subsamples run concurrently: 75% of
+                     RAM as heap, G1 with a relaxed pause target, which copes better
+                     with the churn of many short-lived per-resample objects.
+
+If a script has already started the JVM itself (jpype.startJVM(...)), that JVM is used
+as is. The classpath defaults to the tetrad-current.jar bundled with the package.
+
+memory_usage() and format_usage() report heap and GC activity of the running JVM;
+TetradSearch.set_jvm_diagnostics(True) reports them after each run_* call.
+
+Inside the package, Java packages and classes are bound with java_import, which returns
+a handle that imports the real package (starting the JVM if needed) on first attribute
+access or call, and Python implementations of Java interfaces are declared with
+implements, the deferred counterpart of jpype.JImplements.
+"""
+
+import importlib
+import importlib.resources as importlib_resources
+import os
+import sys
+import threading
+
+import jpype
+import jpype.imports
+from jpype import JImplements
+
+_lock = threading.RLock()
+
+# Settings given to configure(); None means not set there.
+_options = {
+    "preset": None,
+    "classpath": None,
+    "max_heap": None,
+    "stack_size": None,
+    "gc": None,
+    "parallelism": None,
+    "jvm_args": None,
+}
+
+_ENVIRONMENT = {
+    "preset": "PYTETRAD_JVM_PRESET",
+    "classpath": "PYTETRAD_JVM_CLASSPATH",
+    "max_heap": "PYTETRAD_JVM_MAX_HEAP",
+    "stack_size": "PYTETRAD_JVM_STACK_SIZE",
+    "gc": "PYTETRAD_JVM_GC",
+    "parallelism": "PYTETRAD_JVM_PARALLELISM",
+    "jvm_args": "PYTETRAD_JVM_ARGS",
+}
+
+PRESETS = {
+    "small": {"max_heap": "2g", "gc": "G1"},
+    "large-p": {"max_heap": "75%", "stack_size": "16m", "gc": "Parallel"},
+    "bootstrap-heavy": {"max_heap": "75%", "stack_size": "4m", "gc": "G1",
+                        "jvm_args": ["-XX:MaxGCPauseMillis=500"]},
+}
+
+# Names accepted for gc, mapped to the HotSpot flag selecting that collector.
+GC_FLAGS = {
+    "G1": "-XX:+UseG1GC",
+    "Parallel": "-XX:+UseParallelGC",
+    "Serial": "-XX:+UseSerialGC",
+    "Z": "-XX:+UseZGC",
+    "Shenandoah": "-XX:+UseShenandoahGC",
+}
+
+
+def default_jar_path():
+    """The tetrad-current.jar bundled with the package."""
+    return str(importlib_resources.files('pytetrad').joinpath('resources', 'tetrad-current.jar'))
+
+
+def is_started():
+    return jpype.isJVMStarted()
+
+
+def configure(preset=None, classpath=None, max_heap=None, stack_size=None, gc=None,
+              parallelism=None, jvm_args=None):
+    """Sets options for the JVM py-tetrad will start; see the module documentation for
+    their precedence with respect to environment variables. Arguments left as None keep
+    their current settings.
+
+    preset: one of the PRESETS names ("small", "large-p", "bootstrap-heavy").
+    classpath: list of jars/directories (default: the bundled tetrad-current.jar).
+    max_heap: maximum heap size, as accepted by -Xmx (e.g. "8g", "512m"), or a
+        percentage of physical memory (e.g. "75%").
+    stack_size: thread stack size, as accepted by -Xss (e.g. "16m").
+    gc: one of the GC_FLAGS names ("G1", "Parallel", "Serial", "Z", "Shenandoah").
+    parallelism: the parallelism of Java's common ForkJoinPool, which Tetrad's
+        parallelized searches and Markov checks run on.
+    jvm_args: further JVM arguments, passed verbatim.
+
+    Raises RuntimeError if the JVM is already running, since its options can no longer
+    change."""
+    with _lock:
+        if is_started():
+            raise RuntimeError("The JVM is already running; JVM options must be configured "
+                               "before the first use of Java (including any jpype.startJVM "
+                               "call or import of a Java package).")
+
+        given = {"preset": preset, "classpath": classpath, "max_heap": max_heap,
+                 "stack_size": stack_size, "gc": gc, "parallelism": parallelism,
+                 "jvm_args": jvm_args}
+        _validate({name: value for name, value in given.items() if value is not None})
+
+        for name, value in given.items():
+            if value is not None:
+                _options[name] = list(value) if name in ("classpath", "jvm_args") else value
+
+
+def _validate(settings):
+    if settings.get("preset") is not None and settings["preset"] not in PRESETS:
+        raise ValueError(f"Unknown preset '{settings['preset']}'; expected one of {sorted(PRESETS)}.")
+    if settings.get("gc") is not None and settings["gc"] not in GC_FLAGS:
+        raise ValueError(f"Unknown gc '{settings['gc']}'; expected one of {sorted(GC_FLAGS)}.")
+
+
+def _environment_settings():
+    settings = {}
+
+    for name, variable in _ENVIRONMENT.items():
+        value = os.environ.get(variable)
+        if not value:
+            continue
+        if name == "classpath":
+            value = value.split(os.pathsep)
+        elif name == "jvm_args":
+            value = value.split()
+        settings[name] = value
+
+    _validate(settings)
+    return settings
+
+
+def settings():
+    """The effective JVM settings, merging the preset, the environment and configure()."""
+    with _lock:
+        explicit = {name: value for name, value in _options.items() if value is not None}
+        environment = _environment_settings()
+        preset = explicit.get("preset", environment.get("preset"))
+
+        merged = {"preset": preset}
+        merged.update(PRESETS.get(preset, {}))
+        merged.update(environment)
+        merged.update(explicit)
+        return merged
+
+
+def jvm_arguments():
+    """The JVM arguments the current configuration would start with."""
+    current = settings()
+    # Java assertions on (-ea), as pytetrad has always started the JVM.
+    args = ["-ea", "--enable-native-access=ALL-UNNAMED"]
+
+    max_heap = current.get("max_heap")
+    if max_heap is not None:
+        if str(max_heap).endswith("%"):
+            args.append(f"-XX:MaxRAMPercentage={float(str(max_heap)[:-1])}")
+        else:
+            args.append(f"-Xmx{max_heap}")
+    if current.get("stack_size") is not None:
+        args.append(f"-Xss{current['stack_size']}")
+    if current.get("gc") is not None:
+        args.append(GC_FLAGS[current["gc"]])
+    if current.get("parallelism") is not None:
+        args.append(f"-Djava.util.concurrent.ForkJoinPool.common.parallelism={int(current['parallelism'])}")
+
+    return args + list(current.get("jvm_args") or [])
+
+
+def start():
+    """Starts the JVM with the configured options if it is not already running."""
+    if is_started():
+        return
+
+    with _lock:
+        if is_started():
+            return
+
+        classpath = settings().get("classpath") or [default_jar_path()]
+
+        jpype.startJVM(jpype.getDefaultJVMPath(), *jvm_arguments(), classpath=classpath)
+
+
+def memory_usage():
+    """A snapshot of the running JVM's memory and GC activity, as a dict: heap_used,
+    heap_committed, heap_max and heap_peak (bytes; the peak is the sum of the heap pools'
+    peaks since the last reset_peak_memory()), gc_count and gc_time_ms (totals over all
+    collectors) and gc (per collector: (count, time_ms))."""
+    start()
+    management = importlib.import_module("java.lang.management")
+    factory = management.ManagementFactory
+
+    heap = factory.getMemoryMXBean().getHeapMemoryUsage()
+    peak = sum(int(pool.getPeakUsage().getUsed()) for pool in factory.getMemoryPoolMXBeans()
+               if str(pool.getType()) == "HEAP" and pool.getPeakUsage() is not None)
+    gc = {str(bean.getName()): (int(bean.getCollectionCount()), int(bean.getCollectionTime()))
+          for bean in factory.getGarbageCollectorMXBeans()}
+
+    return {"heap_used": int(heap.getUsed()), "heap_committed": int(heap.getCommitted()),
+            "heap_max": int(heap.getMax()), "heap_peak": peak,
+            "gc_count": sum(count for count, _ in gc.values()),
+            "gc_time_ms": sum(time for _, time in gc.values()), "gc": gc}
+
+
+def reset_peak_memory():
+    """Resets the peak usage of the JVM's heap pools, so that the next memory_usage()
+    reports the peak since this call."""
+    start()
+    management = importlib.import_module("java.lang.management")
+    for pool in management.ManagementFactory.getMemoryPoolMXBeans():
+        pool.resetPeakUsage()
+
+
+def usage_delta(before, after):
+    """The usage over an interval, from memory_usage() snapshots taken at its ends: the
+    heap figures of after, with GC counts and times as differences."""
+    delta = dict(after)
+    delta["gc_count"] = after["gc_count"] - before["gc_count"]
+    delta["gc_time_ms"] = after["gc_time_ms"] - before["gc_time_ms"]
+    delta["gc"] = {name: (count - before["gc"].get(name, (0, 0))[0],
+                          time - before["gc"].get(name, (0, 0))[1])
+                   for name, (count, time) in after["gc"].items()}
+    return delta
+
+
+def format_usage(usage):
+    """A one-line rendering of a memory_usage() or usage_delta() dict."""
+    mb = 1024 * 1024
+    return (f"heap used {usage['heap_used'] / mb:,.0f} MB, peak {usage['heap_peak'] / mb:,.0f} MB, "
+            f"committed {usage['heap_committed'] / mb:,.0f} MB, max {usage['heap_max'] / mb:,.0f} MB; "
+            f"GC {usage['gc_count']} collections, {usage['gc_time_ms']:,} ms")
+
+
+class JavaPackage:
+    """Stands in for `import <name>` of a Java package or class, deferring the import (and
+    JVM startup) to first attribute access or call."""
+
+    def __init__(self, name):
+        self._name = name
+        self._target = None
+
+    def _resolve(self):
+        if self._target is None:
+            start()
+            try:
+                self._target = importlib.import_module(self._name)
+            except ImportError:
+                try:
+                    self._target = jpype.JClass(self._name)
+                except TypeError:
+                    raise ImportError(f"No Java package or class named {self._name} "
+                                      "on the classpath.") from None
+        return self._target
+
+    def __getattr__(self, attr):
+        if attr.startswith("__") and attr.endswith("__"):
+            raise AttributeError(attr)
+        try:
+            target = self._resolve()
+        except ImportError as e:
+            # So hasattr() on a package missing from an older jar answers False.
+            raise AttributeError(f"{attr} ({e})") from None
+        return getattr(target, attr)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        return f"<lazy Java import {self._name}>"
+
+
+def java_import(name):
+    """Returns a lazy handle for the Java package or class name, e.g.
+    td = java_import("edu.cmu.tetrad.data")."""
+    return JavaPackage(name)
+
+
+def implements(*interfaces):
+    """Class decorator equivalent to jpype.JImplements(*interfaces) for interfaces given by
+    fully qualified name, except that the interfaces are looked up (and the JVM started)
+    when the first instance is created rather than when the class is defined. Instances
+    record the arguments they were created with, so that another process can rebuild
+    them (see recipe)."""
+
+    def decorator(cls):
+        proxy = JImplements(*interfaces, deferred=True)(cls)
+        new = proxy.__new__
+
+        def __new__(tp, *args, **kwargs):
+            start()
+            obj = new(tp, *args, **kwargs)
+            obj._pytetrad_init_args = (args, kwargs)
+            return obj
+
+        proxy.__new__ = staticmethod(__new__)
+        return proxy
+
+    return decorator
+
+
+def recipe(obj):
+    """(cls, args, kwargs) with cls(*args, **kwargs) a copy of obj, an instance of a class
+    decorated with implements, or None for other objects. JPype proxy instances cannot be
+    pickled, but the class (which JPype subclasses) and the arguments usually can."""
+    init_args = getattr(obj, "_pytetrad_init_args", None)
+    if init_args is None:
+        return None
+    cls = next(c for c in type(obj).__mro__ if c.__module__ != "jpype._jproxy")
+    return cls, init_args[0], init_args[1]
+
+
+class _StartOnJavaImport:
+    """A meta path finder that starts the JVM when code imports a Java package directly
+    (`import edu.cmu.tetrad.search as ts`), as scripts written against earlier versions
+    of py-tetrad do after importing pytetrad.tools.translate. It finds nothing itself and
+    leaves the import to JPype's finder."""
+
+    DOMAINS = ("edu", "java", "javax")
+
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in self.DOMAINS and not is_started():
+            start()
+        return None
+
+
+if not any(isinstance(finder, _StartOnJavaImport) for finder in sys.meta_path):
+    sys.meta_path.insert(0, _StartOnJavaImport())
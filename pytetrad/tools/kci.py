@@ -0,0 +1,415 @@
+"""A kernel conditional-independence (KCI) test in NumPy, used by KciWrapper with
+engine="native" in place of causal-learn's CIT(..., "kci"). It follows causal-learn's
+KCI_UInd and KCI_CInd - z-scored data, Gaussian/Polynomial/Linear kernels with the
+"empirical", "median" or "manual" width rules, conditioning by kernel ridge regression on
+Z with epsilon = 1e-3, and the gamma approximation (approx=True) or a spectral simulation
+of the null (approx=False) - and takes the same keyword arguments.
+
+KCI costs O(n^3) per test, almost all of it in building kernel matrices and in the
+inverse and eigendecompositions derived from them. These depend only on the variables
+involved, which recur across the thousands of tests of a PC run: the centered Gram matrix
+of x (and its trace and squared norm) for unconditional tests, and for a conditioning set
+S the regression residual operator of its Gram matrix, and for each x with S the residual
+Gram matrix of x and its eigendecomposition. They are kept in a GramCache shared by all
+engines (keyed by a fingerprint of the data, so several engines over the same data share
+entries), bounded by a memory budget and evicted least recently used first. The default
+budget is PYTETRAD_KCI_CACHE_MB megabytes (default 1024); see configure().
+
+ApproxKCI is a large-n mode that replaces each Gram matrix by a low-rank approximation
+from random Fourier or Nystrom features, so that a test costs O(n m^2) for m features
+instead of O(n^3); it is usable on hundreds of thousands of rows where KCI is not beyond a
+few thousand. Its features and residualized features are kept in the same GramCache.
+calibrate_kci in pytetrad.tools.bench compares its p-values with KCI's.
+
+Requires scipy (for the gamma distribution).
+
+Typical use:
+
+    import pytetrad.tools.kci as kci
+
+    test = kci.KCI(df.values, est_width="median")
+    p = test(0, 1, [2])                       # or test.pvalue(0, 1, [2])
+    fast = kci.ApproxKCI(df.values, method="rff", num_features=20, seed=0)
+    print(kci.stats())
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+KERNELS = ("Gaussian", "Polynomial", "Linear")
+
+
+class GramCache:
+    """An LRU cache of kernel-derived arrays bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes=1024 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        """The cached value for key, or compute() (which is then cached if it fits).
+        Values are tuples of arrays and numbers."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        value = compute()
+        size = sum(v.nbytes for v in value if isinstance(v, np.ndarray))
+
+        with self._lock:
+            self.misses += 1
+            if size <= self.max_bytes and key not in self._entries:
+                self._entries[key] = (value, size)
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self.bytes -= evicted
+
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes,
+                    "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+
+_default = GramCache(int(os.environ.get("PYTETRAD_KCI_CACHE_MB", 1024)) * 2 ** 20)
+
+
+def configure(max_megabytes=None):
+    """Changes the memory budget of the shared Gram cache (takes effect at the next
+    insertion)."""
+    if max_megabytes is not None:
+        _default.max_bytes = int(max_megabytes * 2 ** 20)
+
+
+def clear():
+    _default.clear()
+
+
+def stats():
+    """Hit/miss counts and size of the shared Gram cache, as a dict."""
+    return _default.stats()
+
+
+def _center(K):
+    # H K H with H = I - 11'/n, without forming H.
+    row = K.mean(axis=0)
+    return K - row[None, :] - row[:, None] + row.mean()
+
+
+class KCI:
+    """KCI tests on the columns of data (an n x p array or DataFrame) by index."""
+
+    def __init__(self, data, kernelX="Gaussian", kernelY="Gaussian", kernelZ="Gaussian",
+                 est_width="empirical", polyd=2, kwidthx=None, kwidthy=None, kwidthz=None,
+                 approx=True, null_ss=None, nullss=None, epsilon=1e-3, thresh=1e-5,
+                 seed=None, cache=True, **kwargs):
+        try:
+            import scipy.stats  # noqa: F401
+        except ImportError:
+            raise ImportError(
+                "scipy is required for this function. "
+                "Install it with: pip install scipy"
+            ) from None
+
+        for kernel in (kernelX, kernelY, kernelZ):
+            if kernel not in KERNELS:
+                raise ValueError(f"Unknown kernel '{kernel}'; expected one of {KERNELS}.")
+        if est_width not in ("empirical", "median", "manual"):
+            raise ValueError(f"Unknown est_width '{est_width}'; expected 'empirical', "
+                             "'median' or 'manual'.")
+
+        values = np.asarray(data, dtype=np.float64)
+        self.n = values.shape[0]
+        std = values.std(axis=0, ddof=1)
+        self.data = np.nan_to_num((values - values.mean(axis=0)) / np.where(std > 0, std, 1.0))
+
+        self.kernels = {"x": (kernelX, kwidthx), "y": (kernelY, kwidthy), "z": (kernelZ, kwidthz)}
+        self.est_width = est_width
+        self.polyd = polyd
+        self.approx = approx
+        self.null_ss_unconditional = null_ss or nullss or 1000
+        self.null_ss_conditional = nullss or null_ss or 5000
+        self.epsilon = epsilon
+        self.thresh = thresh
+        self.seed = seed
+        self.cache = _default if cache is True else (cache or GramCache(0))
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr(values.shape).encode())
+        digest.update(np.ascontiguousarray(values).view(np.uint8))
+        self._data_key = digest.hexdigest()
+
+    def __call__(self, x, y, s=()):
+        return self.pvalue(x, y, s)
+
+    def pvalue(self, x, y, s=()):
+        """The p-value of x _||_ y | s, for column indices x, y and s. The conditional test
+        treats x and y differently; as causal-learn's CIT does, the lower index is taken
+        as x, so that p-values do not depend on the order of x and y."""
+        x, y = sorted((int(x), int(y)))
+        s = tuple(sorted(set(int(z) for z in s)))
+        if not s:
+            return self._unconditional(x, y)
+        return self._conditional(x, y, s)
+
+    # Kernels
+
+    def _kernel(self, role, X, width_data=None, conditional=False):
+        return self._kernel_between(role, X, X, self._theta(role, X, width_data, conditional))
+
+    def _kernel_between(self, role, A, B, theta):
+        kernel = self.kernels[role][0]
+
+        if kernel == "Linear":
+            return A @ B.T
+        if kernel == "Polynomial":
+            return (1.0 + A @ B.T) ** self.polyd
+
+        sq_a = np.sum(A * A, axis=1)
+        sq_b = np.sum(B * B, axis=1)
+        D2 = np.maximum(sq_a[:, None] + sq_b[None, :] - 2 * A @ B.T, 0.0)
+        return np.exp(-0.5 * D2 * theta)
+
+    def _theta(self, role, X, width_data, conditional):
+        # The precision 1 / width^2 of a Gaussian kernel on X.
+        manual = self.kernels[role][1]
+        if self.est_width == "manual" and manual is not None:
+            return 1.0 / float(manual) ** 2
+
+        if self.est_width == "median":
+            from scipy.spatial.distance import pdist
+
+            if self.n > 1000:
+                X = X[np.random.default_rng(0).permutation(self.n)[:1000]]
+            # Pairwise distances computed directly: through |a|^2 + |b|^2 - 2 a.b, equal
+            # rows can come out a rounding error apart and shift the median of those > 0.
+            D = pdist(X)
+            median = np.median(D[D > 0])
+            return 1.0 / (np.sqrt(2.0) * median) ** 2
+
+        # Empirical widths by sample size, scaled by the dimension of width_data.
+        if conditional:
+            width = 1.2 if self.n < 200 else 0.7 if self.n < 1200 else 0.4
+        else:
+            width = 0.8 if self.n < 200 else 0.5 if self.n < 1200 else 0.3
+        dims = (width_data if width_data is not None else X).shape[1]
+        return 1.0 / width ** 2 / dims
+
+    def _key(self, *parts):
+        return (self._data_key, self.est_width, self.polyd, self.epsilon, self.thresh) + parts
+
+    # Unconditional test (KCI_UInd)
+
+    def _gram(self, role, v):
+        def compute():
+            K = _center(self._kernel(role, self.data[:, [v]]))
+            return K, float(np.trace(K)), float(np.sum(K * K))
+
+        return self.cache.get(self._key("gram", self.kernels[role], v), compute)
+
+    def _unconditional(self, x, y):
+        Kx, trace_x, sq_x = self._gram("x", x)
+        Ky, trace_y, sq_y = self._gram("y", y)
+        stat = float(np.sum(Kx * Ky))
+
+        if self.approx:
+            return self._gamma_pvalue(stat, trace_x * trace_y / self.n,
+                                      2.0 * sq_x * sq_y / self.n ** 2)
+
+        lambda_x = self.cache.get(self._key("eigvals", self.kernels["x"], x),
+                                  lambda: (np.linalg.eigvalsh(Kx),))[0]
+        lambda_y = self.cache.get(self._key("eigvals", self.kernels["y"], y),
+                                  lambda: (np.linalg.eigvalsh(Ky),))[0]
+        products = np.outer(lambda_x, lambda_y).ravel()
+        products = products[products > products.max() * self.thresh]
+        return self._simulated_pvalue(products, stat, self.n, self.null_ss_unconditional)
+
+    # Conditional test (KCI_CInd)
+
+    def _residual_operator(self, s):
+        # R_z = epsilon (K_z + epsilon I)^-1, with K_z the centered Gram matrix of Z.
+        def compute():
+            Z = self.data[:, list(s)]
+            Kz = _center(self._kernel("z", Z, width_data=Z, conditional=True))
+            return (self.epsilon * np.linalg.inv(Kz + self.epsilon * np.eye(self.n)),)
+
+        return self.cache.get(self._key("rz", self.kernels["z"], s), compute)[0]
+
+    def _residual_gram(self, role, v, s):
+        # R_z K R_z for K the centered Gram matrix of [v, 0.5 Z] (x) or of v (y), with the
+        # scaled eigenvectors of the result above the threshold.
+        def compute():
+            Z = self.data[:, list(s)]
+            X = self._conditional_data(role, v, Z)
+            Rz = self._residual_operator(s)
+            K = _center(self._kernel(role, X, width_data=Z if self.est_width == "empirical" else X,
+                                     conditional=True))
+            KR = Rz @ K @ Rz
+            KR = (KR + KR.T) / 2
+            eigenvalues, vectors = np.linalg.eigh(KR)
+            keep = eigenvalues > eigenvalues.max() * self.thresh
+            return KR, vectors[:, keep] * np.sqrt(eigenvalues[keep])
+
+        return self.cache.get(self._key("residual", role, self.kernels[role], v, s), compute)
+
+    def _conditional_data(self, role, v, Z):
+        # As in KCI_CInd, x's kernel is on x and half of Z, y's on y alone; in both, an
+        # empirical width is scaled by Z's dimension and a median width is that of the
+        # kernel's own data.
+        if role == "x":
+            return np.concatenate([self.data[:, [v]], 0.5 * Z], axis=1)
+        return self.data[:, [v]]
+
+    def _conditional(self, x, y, s):
+        KxR, ex = self._residual_gram("x", x, s)
+        KyR, ey = self._residual_gram("y", y, s)
+        return self._conditional_pvalue(float(np.sum(KxR * KyR)), ex, ey)
+
+    def _conditional_pvalue(self, stat, ex, ey):
+        # The null of stat = tr(KxR KyR) for KxR = ex ex' and KyR = ey ey'.
+        uu = (ex[:, :, None] * ey[:, None, :]).reshape(self.n, -1)
+        uu_prod = uu @ uu.T if uu.shape[1] > self.n else uu.T @ uu
+
+        if self.approx:
+            return self._gamma_pvalue(stat, float(np.trace(uu_prod)),
+                                      2.0 * float(np.sum(uu_prod * uu_prod)))
+
+        eigenvalues = np.sort(np.linalg.eigvalsh(uu_prod))[::-1][:min(self.n, uu.shape[1])]
+        eigenvalues = eigenvalues[eigenvalues > eigenvalues.max() * self.thresh]
+        return self._simulated_pvalue(eigenvalues, stat, 1, self.null_ss_conditional)
+
+    @staticmethod
+    def _gamma_pvalue(stat, mean, var):
+        import scipy.stats as st
+
+        return float(st.gamma.sf(stat, mean ** 2 / var, 0, var / mean))
+
+    def _simulated_pvalue(self, weights, stat, scale, null_ss):
+        rng = np.random.default_rng(self.seed)
+        null = weights @ rng.chisquare(1, (len(weights), null_ss)) / scale
+        return float(np.mean(null > stat))
+
+
+METHODS = ("rff", "nystrom")
+
+
+class ApproxKCI(KCI):
+    """KCI with every centered Gram matrix replaced by a low-rank approximation F F', for
+    n x m features F: random Fourier features of Gaussian kernels (method="rff"), or
+    Nystrom features from m landmark rows (method="nystrom"; also used for Polynomial
+    kernels, which have no random Fourier features). Linear kernels are used exactly.
+
+    num_features is the number of features of x and y (and so of the rank of their
+    Gram matrices) and num_features_z that of Z. The features of a variable set are drawn
+    from a generator seeded by seed and the set, so p-values do not depend on the order
+    of the tests. A test costs O(n m^2) time and O(n m) memory instead of O(n^3) and
+    O(n^2): conditioning on Z is a ridge regression on its features,
+
+        R_z F = F - Fz (Fz' Fz + epsilon I)^-1 Fz' F   (= epsilon (Kz + epsilon I)^-1 F),
+
+    and the statistic and its null are computed as in KCI from the factors. Other
+    keyword arguments are those of KCI."""
+
+    def __init__(self, data, method="rff", num_features=10, num_features_z=100, seed=0,
+                 **kwargs):
+        if method not in METHODS:
+            raise ValueError(f"Unknown method '{method}'; expected one of {METHODS}.")
+        if num_features < 1 or num_features_z < 1:
+            raise ValueError("num_features and num_features_z must be positive.")
+
+        super().__init__(data, seed=seed, **kwargs)
+        self.method = method
+        self.num_features = int(num_features)
+        self.num_features_z = int(num_features_z)
+
+    def _key(self, *parts):
+        return super()._key("approx", self.method, self.num_features, self.num_features_z,
+                            self.seed) + parts
+
+    def _features(self, role, X, width_data, conditional, num, label):
+        # Centered features F of X with F F' ~ H K H, for K the Gram matrix of X.
+        def compute():
+            kernel = self.kernels[role][0]
+            if kernel == "Linear":
+                F = X
+            else:
+                digest = hashlib.blake2b(repr((role, label)).encode(), digest_size=8)
+                rng = np.random.default_rng(None if self.seed is None else
+                                            [int(self.seed), int(digest.hexdigest(), 16)])
+                theta = (self._theta(role, X, width_data, conditional)
+                         if kernel == "Gaussian" else None)
+
+                if kernel == "Gaussian" and self.method == "rff":
+                    W = rng.normal(scale=np.sqrt(theta), size=(X.shape[1], num))
+                    b = rng.uniform(0.0, 2.0 * np.pi, size=num)
+                    F = np.sqrt(2.0 / num) * np.cos(X @ W + b)
+                else:
+                    # K ~ K_nm K_mm^-1 K_mn for the m landmark rows.
+                    landmarks = X[rng.choice(self.n, size=min(num, self.n), replace=False)]
+                    K_mm = self._kernel_between(role, landmarks, landmarks, theta)
+                    eigenvalues, V = np.linalg.eigh(K_mm)
+                    keep = eigenvalues > eigenvalues.max() * self.thresh
+                    F = (self._kernel_between(role, X, landmarks, theta)
+                         @ (V[:, keep] / np.sqrt(eigenvalues[keep])))
+
+            return (F - F.mean(axis=0),)
+
+        return self.cache.get(self._key("features", role, self.kernels[role], label),
+                              compute)[0]
+
+    # Unconditional test
+
+    def _unconditional(self, x, y):
+        Fx = self._features("x", self.data[:, [x]], None, False, self.num_features, x)
+        Fy = self._features("y", self.data[:, [y]], None, False, self.num_features, y)
+        stat = float(np.sum((Fx.T @ Fy) ** 2))
+
+        # F'F has the nonzero eigenvalues of F F'.
+        Cx, Cy = Fx.T @ Fx, Fy.T @ Fy
+
+        if self.approx:
+            mean = float(np.trace(Cx)) * float(np.trace(Cy)) / self.n
+            var = 2.0 * float(np.sum(Cx * Cx)) * float(np.sum(Cy * Cy)) / self.n ** 2
+            return self._gamma_pvalue(stat, mean, var)
+
+        products = np.outer(np.linalg.eigvalsh(Cx), np.linalg.eigvalsh(Cy)).ravel()
+        products = products[products > products.max() * self.thresh]
+        return self._simulated_pvalue(products, stat, self.n, self.null_ss_unconditional)
+
+    # Conditional test
+
+    def _residual_features(self, role, v, s):
+        def compute():
+            Z = self.data[:, list(s)]
+            Fz = self._features("z", Z, Z, True, self.num_features_z, s)
+            X = self._conditional_data(role, v, Z)
+            F = self._features(role, X, Z if self.est_width == "empirical" else X, True,
+                               self.num_features, (v, s))
+            G = Fz.T @ Fz + self.epsilon * np.eye(Fz.shape[1])
+            return (F - Fz @ np.linalg.solve(G, Fz.T @ F),)
+
+        return self.cache.get(self._key("residual", role, self.kernels[role], v, s),
+                              compute)[0]
+
+    def _conditional(self, x, y, s):
+        Gx = self._residual_features("x", x, s)
+        Gy = self._residual_features("y", y, s)
+        return self._conditional_pvalue(float(np.sum((Gx.T @ Gy) ** 2)), Gx, Gy)
@@ -2,17 +2,13 @@
 auditing missingness, multiple imputation, and pooled imputation search. Requires a
 tetrad-current.jar built from development on or after 2026-08-05."""
 
-import jpype.imports
-
-try:
-    jpype.startJVM(classpath=["resources/tetrad-current.jar"])
-except OSError:
-    pass
-
-import edu.cmu.tetrad.data.missing as tm
-import edu.cmu.tetrad.util as util
+import pytetrad.tools.datacache as dc
+import pytetrad.tools.jvm as jvm
 import pytetrad.tools.translate as tr
 
+tm = jvm.java_import("edu.cmu.tetrad.data.missing")
+util = jvm.java_import("edu.cmu.tetrad.util")
+
 
 def _require():
     if not hasattr(tm, "MissingDataAudit"):
@@ -25,14 +21,14 @@ def audit(df):
     rates, complete rows, patterns, pairwise counts, and Little's MCAR test for continuous
     data). Use the Java class directly for programmatic access to the numbers."""
     _require()
-    return str(tm.MissingDataAudit(tr.pandas_data_to_tetrad(df)).report())
+    return str(tm.MissingDataAudit(dc.pandas_data_to_tetrad(df)).report())
 
 
 def impute(df, m=10, seed=-1, imputer=None):
     """Returns m completed copies of df as pandas DataFrames. imputer=None auto-selects:
     MvnImputer for all-continuous data, MiceLiteImputer for discrete or mixed data."""
     _require()
-    data = tr.pandas_data_to_tetrad(df)
+    data = dc.pandas_data_to_tetrad(df)
     if imputer is None:
         imputer = tm.MvnImputer() if data.isContinuous() else tm.MiceLiteImputer()
     return [tr.tetrad_data_to_pandas(d) for d in imputer.impute(data, m, seed)]
@@ -46,6 +42,6 @@ def imputation_search(df, algorithm, parameters=None, m=10, seed=-1, imputer=Non
     if parameters is None:
         parameters = util.Parameters()
     spec = tm.MissingDataSpec.multipleImputation(m).withSeed(seed)
-    result = tm.ImputationSearch.search(tr.pandas_data_to_tetrad(df), algorithm, parameters,
+    result = tm.ImputationSearch.search(dc.pandas_data_to_tetrad(df), algorithm, parameters,
                                         imputer, spec)
     return result.pooledGraph, list(result.imputationGraphs)
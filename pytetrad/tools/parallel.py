@@ -0,0 +1,179 @@
+"""A pool of worker processes that computes the p-values of the Python-implemented tests,
+so that the many Java threads of a parallel search or Markov check get real multi-core
+throughput. In one process, every call Java makes into KciWrapper or RcitWrapper runs
+under the Python GIL, so those calls run one at a time however many threads make them.
+
+A TestPool copies the data once into a shared-memory block, which every worker maps
+without copying it, and builds its engine (the native KCI, the approximate KCI, Fisher Z,
+or causal-learn's KCI or RCIT) there. pvalues(facts) splits the facts into chunks,
+grouped by conditioning set so that the kernel matrices a worker caches for a set are
+reused, and blocks until the workers return. The calling thread releases the GIL while it
+waits, so other Java threads can submit their own facts in the meantime.
+
+The wrappers use a pool when given workers=N. The workers are spawned processes, which
+re-import the calling script's __main__ module, so a script using a pool must keep its
+work under an `if __name__ == "__main__":` guard; otherwise every worker re-runs the
+whole script when it starts:
+
+    if __name__ == "__main__":
+        df = pd.read_csv("data.csv")
+        search = ts.TetradSearch(df)
+        test = wc.WrappedClKci(df, alpha=0.01, workers=8)
+        search.use_test(test)                 # or search.use_approx_kci(workers=8)
+        search.run_pc()
+
+get_pool() returns pools shared by data, engine and settings, so that the fresh wrappers
+Tetrad makes with each getTest() reuse one set of workers. Pools are shut down, and their
+shared memory released, by shutdown() or at exit.
+"""
+
+import atexit
+import hashlib
+import math
+import multiprocessing
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+ENGINES = ("kci", "approx-kci", "fisherz", "causal-learn-kci", "rcit")
+
+# State of a worker process, set by _init_worker.
+_worker = {}
+
+
+def make_engine(kind, data, kwargs):
+    """A callable (x, y, s) -> p-value computing the kind of test on data."""
+    if kind == "kci":
+        import pytetrad.tools.kci as kci
+        return kci.KCI(data, **kwargs)
+    if kind == "approx-kci":
+        import pytetrad.tools.kci as kci
+        return kci.ApproxKCI(data, **kwargs)
+    if kind == "fisherz":
+        import pytetrad.tools.fisherz as fz
+        return fz.FisherZ(data).pvalue
+    if kind in ("causal-learn-kci", "rcit"):
+        from causallearn.utils.cit import CIT
+        return CIT(data, "kci" if kind == "causal-learn-kci" else "rcit", **kwargs)
+    raise ValueError(f"Unknown engine '{kind}'; expected one of {ENGINES}.")
+
+
+def _init_worker(name, shape, dtype, kind, kwargs):
+    block = shared_memory.SharedMemory(name=name)
+    data = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    data.flags.writeable = False
+    _worker["block"] = block
+    _worker["engine"] = make_engine(kind, data, kwargs)
+
+
+def _run(facts):
+    engine = _worker["engine"]
+    return [float(engine(x, y, s)) for x, y, s in facts]
+
+
+def _release(executor, block):
+    executor.shutdown(wait=True, cancel_futures=True)
+    block.close()
+    block.unlink()
+
+
+class TestPool:
+    """Worker processes computing one kind of test (see ENGINES) on data, an n x p array
+    or DataFrame, held in shared memory. Other keyword arguments go to the engine."""
+
+    def __init__(self, kind, data, workers=None, chunks_per_worker=4, **kwargs):
+        if kind not in ENGINES:
+            raise ValueError(f"Unknown engine '{kind}'; expected one of {ENGINES}.")
+
+        values = np.ascontiguousarray(data, dtype=np.float64)
+        self.kind = kind
+        self.workers = workers or multiprocessing.cpu_count()
+        self.chunks_per_worker = chunks_per_worker
+        self.calls = 0
+        self.facts = 0
+
+        self._block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=self._block.buf)[...] = values
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self._block.name, values.shape, values.dtype.str, kind, kwargs))
+        self._finalizer = weakref.finalize(self, _release, self._executor, self._block)
+        self._lock = threading.Lock()
+
+    def pvalue(self, x, y, s=()):
+        return self.pvalues([(x, y, s)])[0]
+
+    def pvalues(self, facts):
+        """The p-values of facts, a list of (x, y, s) with column indices, in order."""
+        facts = [(int(x), int(y), [int(z) for z in s]) for x, y, s in facts]
+        if not facts:
+            return []
+
+        # Facts sharing a conditioning set go to the same chunk where possible.
+        order = sorted(range(len(facts)), key=lambda k: sorted(facts[k][2]))
+        size = math.ceil(len(facts) / (self.workers * self.chunks_per_worker))
+        chunks = [order[start:start + size] for start in range(0, len(order), size)]
+        futures = [self._executor.submit(_run, [facts[k] for k in chunk]) for chunk in chunks]
+
+        pvalues = [0.0] * len(facts)
+        for chunk, future in zip(chunks, futures):
+            for k, p in zip(chunk, future.result()):
+                pvalues[k] = p
+
+        with self._lock:
+            self.calls += 1
+            self.facts += len(facts)
+
+        return pvalues
+
+    def stats(self):
+        with self._lock:
+            return {"kind": self.kind, "workers": self.workers, "calls": self.calls,
+                    "facts": self.facts}
+
+    def close(self):
+        """Stops the workers and releases the shared memory."""
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(kind, data, workers=None, **kwargs):
+    """A TestPool for the kind of test on data with the given settings, shared with
+    earlier calls for the same data (by content) and settings."""
+    values = np.ascontiguousarray(data, dtype=np.float64)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(values.shape).encode())
+    digest.update(values.view(np.uint8))
+    key = (kind, digest.hexdigest(), workers, repr(sorted(kwargs.items())))
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = TestPool(kind, values, workers=workers, **kwargs)
+        return pool
+
+
+def shutdown():
+    """Closes every pool made by get_pool()."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(shutdown)
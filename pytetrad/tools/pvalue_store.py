@@ -0,0 +1,251 @@
+"""A persistent store of conditional-independence p-values in an SQLite file, so that jobs
+re-running searches over the same data reuse the p-values of earlier runs instead of
+recomputing them. It backs the disk tier of pytetrad.tools.cicache (used by the
+WrappedCl* wrappers) and, with --store, the CIT servers of pytetrad.tools.cit_server.
+
+p-values are keyed by the test's name, its parameters in canonical form (JSON with sorted
+keys), a hash of the data set and the fact (x, y, sorted z), with variables as column
+indices. Lookups read the file (and writes not yet flushed); writes are queued and written
+behind by a background thread in batches, so computing never waits on the disk. flush()
+and close() write out the queue, as happens at exit.
+
+Run as a script to inspect or prune a store:
+
+    python -m pytetrad.tools.pvalue_store ~/.cache/pytetrad/ci-pvalues.sqlite info
+    python -m pytetrad.tools.pvalue_store STORE list --test kci --limit 20
+    python -m pytetrad.tools.pvalue_store STORE prune --older-than 30 --data 1f3a...
+"""
+
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+import numpy as np
+
+_stores = weakref.WeakSet()
+
+
+def canonical_params(params):
+    """params (a dict) as a canonical string: JSON with sorted keys."""
+    return json.dumps(params or {}, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def array_fingerprint(values):
+    """A hex digest of an array's shape, dtype and values."""
+    values = np.ascontiguousarray(values)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(repr((values.shape, values.dtype.str)).encode())
+    digest.update(values.view(np.uint8).reshape(-1))
+    return digest.hexdigest()
+
+
+def fact_key(test, params, data_key, x, y, z):
+    """The key of x _||_ y | z in a store: (test, canonical params, data key, x, y, z),
+    with z as a comma-separated string of sorted column indices."""
+    params = params if isinstance(params, str) else canonical_params(params)
+    return (str(test), params, str(data_key), int(x), int(y),
+            ",".join(str(k) for k in sorted(set(int(k) for k in z))))
+
+
+class PValueStore:
+    """p-values in the SQLite file path, written behind in batches of up to batch_size,
+    at least every flush_seconds."""
+
+    def __init__(self, path, batch_size=1000, flush_seconds=1.0):
+        self.path = os.path.expanduser(path)
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.reads = 0
+        self.found = 0
+        self.written = 0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS pvalues (test TEXT, params TEXT, "
+                         "data TEXT, x INTEGER, y INTEGER, s TEXT, pvalue REAL, created REAL, "
+                         "PRIMARY KEY (test, params, data, x, y, s))")
+        self._db.commit()
+
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_behind, daemon=True)
+        self._writer.start()
+        _stores.add(self)
+
+    def get(self, key):
+        """The stored p-value of a fact_key, or None."""
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        pvalues = [None] * len(keys)
+        with self._lock:
+            self.reads += len(keys)
+            for k, key in enumerate(keys):
+                pvalues[k] = self._pending.get(key)
+            for k, key in enumerate(keys):
+                if pvalues[k] is None:
+                    row = self._db.execute("SELECT pvalue FROM pvalues WHERE test = ? AND "
+                                           "params = ? AND data = ? AND x = ? AND y = ? AND "
+                                           "s = ?", key).fetchone()
+                    if row is not None:
+                        pvalues[k] = row[0]
+            self.found += sum(p is not None for p in pvalues)
+        return pvalues
+
+    def put(self, key, pvalue):
+        self.put_many([(key, pvalue)])
+
+    def put_many(self, items):
+        """Queues (fact_key, p-value) pairs to be written."""
+        with self._lock:
+            for key, pvalue in items:
+                self._pending[key] = float(pvalue)
+            if len(self._pending) >= self.batch_size:
+                self._wake.notify()
+
+    def flush(self):
+        """Writes the queued p-values now."""
+        with self._lock:
+            self._write_pending()
+
+    def _write_pending(self):
+        # Called with the lock held.
+        if not self._pending or self._closed:
+            return
+        now = time.time()
+        self._db.executemany("INSERT OR REPLACE INTO pvalues VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             [key + (p, now) for key, p in self._pending.items()])
+        self._db.commit()
+        self.written += len(self._pending)
+        self._pending.clear()
+
+    def _write_behind(self):
+        with self._lock:
+            while not self._closed:
+                self._wake.wait(self.flush_seconds)
+                self._write_pending()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._write_pending()
+            self._closed = True
+            self._wake.notify()
+        self._writer.join()
+        self._db.close()
+
+    def stats(self):
+        with self._lock:
+            return {"path": self.path, "reads": self.reads, "found": self.found,
+                    "written": self.written, "pending": len(self._pending)}
+
+    # Inspection and pruning
+
+    @staticmethod
+    def _where(test=None, data=None, params=None, older_than_days=None):
+        clauses, values = [], []
+        for column, value in (("test", test), ("data", data), ("params", params)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                values.append(value)
+        if older_than_days is not None:
+            clauses.append("created < ?")
+            values.append(time.time() - older_than_days * 86400)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), values
+
+    def summary(self):
+        """Counts of stored p-values by test, parameters and data set."""
+        self.flush()
+        with self._lock:
+            rows = self._db.execute("SELECT test, params, data, COUNT(*), MIN(created), "
+                                    "MAX(created) FROM pvalues GROUP BY test, params, data "
+                                    "ORDER BY test, data").fetchall()
+        return [{"test": test, "params": params, "data": data, "count": count,
+                 "first": first, "last": last} for test, params, data, count, first, last in rows]
+
+    def rows(self, test=None, data=None, params=None, limit=100):
+        self.flush()
+        where, values = self._where(test, data, params)
+        with self._lock:
+            return self._db.execute(f"SELECT test, params, data, x, y, s, pvalue, created FROM "
+                                    f"pvalues{where} LIMIT ?", values + [int(limit)]).fetchall()
+
+    def prune(self, test=None, data=None, params=None, older_than_days=None, vacuum=True):
+        """Deletes the p-values matching all the given conditions (all of them if none is
+        given) and returns how many were deleted."""
+        self.flush()
+        where, values = self._where(test, data, params, older_than_days)
+        with self._lock:
+            deleted = self._db.execute(f"DELETE FROM pvalues{where}", values).rowcount
+            self._db.commit()
+            if vacuum:
+                self._db.execute("VACUUM")
+        return deleted
+
+
+@atexit.register
+def _close_all():
+    for store in list(_stores):
+        store.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or prune a p-value store.")
+    parser.add_argument("path", help="the SQLite file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("info", help="counts by test, parameters and data set")
+
+    for name in ("list", "prune"):
+        command = commands.add_parser(name, help=f"{name} stored p-values")
+        command.add_argument("--test", default=None)
+        command.add_argument("--data", default=None, help="data set hash")
+        command.add_argument("--params", default=None, help="canonical parameters (JSON)")
+        if name == "list":
+            command.add_argument("--limit", type=int, default=100)
+        else:
+            command.add_argument("--older-than", type=float, default=None,
+                                 help="only p-values stored more than this many days ago")
+
+    args = parser.parse_args(argv)
+    if not os.path.exists(os.path.expanduser(args.path)):
+        parser.error(f"No store at {args.path}")
+
+    store = PValueStore(args.path)
+    try:
+        if args.command == "info":
+            entries = store.summary()
+            size = os.path.getsize(store.path)
+            count = sum(e["count"] for e in entries)
+            print(f"{store.path}: {count} p-values, {size / 2 ** 20:.1f} MB")
+            for e in entries:
+                last = "-" if e["last"] is None else time.strftime("%Y-%m-%d %H:%M",
+                                                                   time.localtime(e["last"]))
+                print(f"  {e['test']:<20} data {e['data'][:12]:<12} {e['count']:>10}  "
+                      f"last {last}  params {e['params']}")
+        elif args.command == "list":
+            for row in store.rows(args.test, args.data, args.params, args.limit):
+                test, params, data, x, y, s, pvalue, _ = row
+                print(f"{test}\t{data[:12]}\t{x} _||_ {y} | {{{s}}}\t{pvalue:.6g}\t{params}")
+        else:
+            deleted = store.prune(args.test, args.data, args.params, args.older_than)
+            print(f"Deleted {deleted} p-values.")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+"""A base class for scores implemented in Python for Tetrad's score-based searches (FGES,
+BOSS, GRaSP, ...), so that a custom score only has to compute a local score:
+
+    import pytetrad.tools.score as ps
+
+    class MyScore(ps.PythonScore):
+        def local_score(self, node, parents):
+            ...                                   # column indices; parents sorted
+            return value
+
+    import edu.cmu.tetrad.search as ts
+    graph = ts.Fges(MyScore(df)).search()
+
+PythonScore implements Tetrad's Score interface: it maps Java's localScore and
+localScoreDiff overloads to local_score, and caches local scores by (node, sorted
+parents) in a ScoreCache, bounded to max_entries and evicting the least recently used
+entries. Cache reads take no lock, so the threads of a parallel FGES only contend when
+they compute new scores. stats() reports hits, misses and evictions. A cache may be saved
+to and loaded from a file (save(), load(), or persist=path to load when the score is
+first used and save at exit); a saved cache is only loaded by a score of the same class and
+parameters over the same data.
+
+FGES's first step asks for localScoreDiff(x, y) for every pair of variables, one call from
+Java at a time. prefill() computes them all at once before the search - from
+pair_scores() and empty_scores(), which a subclass may override to compute them with
+NumPy (from the correlation matrix, say) - and answers those calls from the result:
+
+    score = MyScore(df)
+    score.prefill()
+    graph = ts.Fges(score).search()
+
+LinearGaussianBicScore is a ready-made linear Gaussian BIC score built this way, with
+incremental Cholesky factors so that FGES's score differences cost O(|parents|).
+"""
+
+import atexit
+import itertools
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from jpype import JOverride
+
+import pytetrad.tools.datacache as dc
+import pytetrad.tools.jvm as jvm
+
+td = jvm.java_import("edu.cmu.tetrad.data")
+ju = jvm.java_import("java.util")
+
+# Scores given persist=path, saved at exit.
+_persistent = []
+
+
+class ScoreCache:
+    """A cache of local scores bounded to max_entries. Reads take no lock; when the bound
+    is passed, the least recently used evict_fraction of the entries is evicted at once.
+    Hit counts are approximate under concurrent reads."""
+
+    def __init__(self, max_entries=100000, evict_fraction=0.1):
+        self.max_entries = max_entries
+        self.evict_fraction = evict_fraction
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = {}
+        self._clock = itertools.count()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        """The cached value for key, or compute() (which is then cached)."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[1] = next(self._clock)
+            self.hits += 1
+            return entry[0]
+
+        value = compute()
+        with self._lock:
+            self.misses += 1
+        self.put(key, value)
+        return value
+
+    def lookup(self, key):
+        """The cached value for key, or None."""
+        entry = self._entries.get(key)
+        return None if entry is None else entry[0]
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = [value, next(self._clock)]
+            if len(self._entries) > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        # Called with the lock held. Readers holding the old dict are unaffected.
+        keep = int(self.max_entries * (1 - self.evict_fraction))
+        recent = sorted(self._entries.items(), key=lambda item: item[1][1], reverse=True)
+        self._entries = dict(recent[:keep])
+        self.evictions += len(recent) - keep
+
+    def items(self):
+        return [(key, entry[0]) for key, entry in list(self._entries.items())]
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+    def stats(self):
+        return {"entries": len(self._entries), "max_entries": self.max_entries,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+@jvm.implements("edu.cmu.tetrad.search.score.Score")
+class PythonScore:
+    """A Tetrad Score over the columns of df whose local scores are computed by
+    local_score(node, parents), which subclasses implement."""
+
+    name = "Python score"
+
+    def __init__(self, df, max_entries=100000, persist=None):
+        self.df = df
+        self.data = df.values
+        self.n, self.p = df.shape
+        self.cache = ScoreCache(max_entries)
+        self.persist = persist
+        self._first_step = None
+
+        self.variables = ju.ArrayList()
+        self.variable_map = {}
+        for col in df.columns:
+            col = str(col)
+            variable = td.ContinuousVariable(col)
+            self.variables.add(variable)
+            self.variable_map[col] = variable
+
+        # A saved cache is loaded on first use, not here: parameters(), which identifies
+        # it, may depend on attributes a subclass sets after calling this constructor.
+        self._load_pending = persist is not None
+        if persist is not None:
+            _persistent.append(self)
+
+    def local_score(self, node, parents):
+        """The local score of node (a column index) given parents (a sorted tuple of
+        column indices); higher is better."""
+        raise NotImplementedError
+
+    def parameters(self):
+        """The settings that affect local scores, as a dict; used to match saved caches."""
+        return {}
+
+    def empty_scores(self):
+        """The local scores of each variable with no parents, as an array of length p.
+        Subclasses may override this and pair_scores() with batched computations."""
+        return np.array([self.local_score(y, ()) for y in range(self.p)], dtype=float)
+
+    def pair_scores(self):
+        """A p x p array whose [x, y] entry is the local score of y with the one parent x
+        (nan on the diagonal)."""
+        scores = np.full((self.p, self.p), np.nan)
+        for y in range(self.p):
+            for x in range(self.p):
+                if x != y:
+                    scores[x, y] = self.local_score(y, (x,))
+        return scores
+
+    def first_step_diffs(self):
+        """A p x p array whose [x, y] entry is score_diff(x, y, []) (0 on the diagonal)."""
+        empty, pairs = self.empty_scores(), self.pair_scores()
+        diffs = pairs - empty[np.newaxis, :]
+        np.fill_diagonal(diffs, 0.0)
+        return diffs, empty, pairs
+
+    def prefill(self):
+        """Computes the local scores of every variable with no parents and with each single
+        parent in one batch, adds them to the cache (the single-parent ones only if they
+        take at most half of it) and answers localScoreDiff(x, y) with no other parents
+        from them from then on. Returns the p x p array of those differences."""
+        if self._load_pending:
+            self._load_persisted()
+        diffs, empty, pairs = self.first_step_diffs()
+        for y in range(self.p):
+            self.cache.put((y, ()), float(empty[y]))
+        if self.p * (self.p - 1) <= self.cache.max_entries // 2:
+            for x, y in zip(*np.nonzero(~np.eye(self.p, dtype=bool))):
+                self.cache.put((int(y), (int(x),)), float(pairs[x, y]))
+        self._first_step = diffs
+        return diffs
+
+    def score(self, node, parents=()):
+        """The cached local score of node given parents."""
+        if self._load_pending:
+            self._load_persisted()
+        key = (int(node), tuple(sorted(int(z) for z in parents)))
+        return self.cache.get(key, lambda: float(self.local_score(*key)))
+
+    def score_diff(self, x, y, z=()):
+        """The change in the local score of y when x is added to its parents z."""
+        z = [int(k) for k in z]
+        return self.score(y, z + [int(x)]) - self.score(y, z)
+
+    @JOverride
+    def localScore(self, *args):
+        if len(args) == 1:
+            parents = []
+        elif isinstance(args[1], int):
+            parents = [args[1]]
+        else:
+            parents = list(args[1])
+        return self.score(args[0], parents)
+
+    @JOverride
+    def localScoreDiff(self, *args):
+        z = list(args[2]) if len(args) > 2 else []
+        if not z and self._first_step is not None:
+            return float(self._first_step[args[0], args[1]])
+        return self.score_diff(args[0], args[1], z)
+
+    @JOverride
+    def getVariables(self):
+        return self.variables
+
+    @JOverride
+    def getSampleSize(self):
+        return self.n
+
+    @JOverride
+    def toString(self):
+        return self.name
+
+    @JOverride
+    def getVariable(self, targetName):
+        return self.variable_map.get(str(targetName))
+
+    @JOverride
+    def isEffectEdge(self, bump):
+        return False
+
+    @JOverride
+    def getMaxDegree(self):
+        return 1000
+
+    @JOverride
+    def defaultScore(self):
+        return self
+
+    # Statistics and persistence
+
+    def stats(self):
+        return self.cache.stats()
+
+    def _identity(self):
+        return (type(self).__module__, type(self).__qualname__,
+                repr(sorted(self.parameters().items())), dc.fingerprint(self.df))
+
+    def _load_persisted(self):
+        self._load_pending = False
+        if os.path.exists(os.path.expanduser(self.persist)):
+            self.load()
+
+    def save(self, path=None):
+        """Writes the cached local scores to path (default: persist)."""
+        if self._load_pending:
+            self._load_persisted()
+        path = os.path.expanduser(path or self.persist)
+        with open(path, "wb") as f:
+            pickle.dump({"identity": self._identity(), "entries": self.cache.items()}, f)
+
+    def load(self, path=None):
+        """Adds the local scores saved in path (default: persist) to the cache, if they were
+        saved by a score of the same class and parameters over the same data. Returns the
+        number of entries loaded."""
+        with open(os.path.expanduser(path or self.persist), "rb") as f:
+            saved = pickle.load(f)
+        if saved.get("identity") != self._identity():
+            return 0
+        for key, value in saved["entries"]:
+            self.cache.put(key, value)
+        return len(saved["entries"])
+
+
+@atexit.register
+def _save_all():
+    for score in _persistent:
+        score.save()
+
+
+class LinearGaussianBicScore(PythonScore):
+    """The BIC score of a linear Gaussian model, from the covariance matrix C of df:
+
+        local_score(y, S) = -n log var(y | S) - penalty_discount |S| log n,
+
+    with var(y | S) = C[y, y] - C[y, S] C[S, S]^-1 C[S, y]. For each parent set S it keeps
+    (in an LRU cache of max_cached_sets sets) the whitened cross-covariances
+    W_S = L_S^-1 C[S, :], for L_S the Cholesky factor of C[S, S], and the residual
+    variances of all variables given S, so every local score with parents S costs O(1).
+    The factors of S + x are derived from those of S by a bordered (rank-one) Cholesky
+    update in O(|S| p) rather than refactored, and a score difference - adding x to the
+    parents S of y - costs O(|S|) from the factors of S alone:
+
+        var(y | S + x) = var(y | S) - (C[x, y] - W_S[:, x] . W_S[:, y])^2 / var(x | S).
+    """
+
+    name = "Linear Gaussian BIC score (Python)"
+
+    def __init__(self, df, penalty_discount=1.0, max_cached_sets=4096, **kwargs):
+        super().__init__(df, **kwargs)
+        self.penalty_discount = penalty_discount
+        self.cov = np.atleast_2d(np.cov(np.asarray(self.data, dtype=np.float64), rowvar=False))
+        self.max_cached_sets = max_cached_sets
+        self._factors = OrderedDict()
+        self._factor_lock = threading.Lock()
+        # Residual variances below these are taken as zero (a variable determined by others).
+        self._tiny = 1e-10 * np.maximum(np.diag(self.cov), np.finfo(float).tiny)
+
+    def parameters(self):
+        return {"penalty_discount": self.penalty_discount}
+
+    def _penalty(self):
+        return self.penalty_discount * np.log(self.n)
+
+    def local_score(self, node, parents):
+        residual = self._factor(tuple(parents))[1][node]
+        return (-self.n * np.log(max(residual, self._tiny[node]))
+                - self._penalty() * len(parents))
+
+    def empty_scores(self):
+        residual = np.maximum(np.diag(self.cov), self._tiny)
+        return -self.n * np.log(residual)
+
+    def pair_scores(self):
+        # var(y | x) = C[y, y] (1 - r_xy^2), for all pairs at once.
+        sd = np.sqrt(np.diag(self.cov))
+        r = self.cov / np.outer(sd, sd)
+        residual = np.maximum(np.diag(self.cov)[np.newaxis, :] * (1 - r * r), self._tiny)
+        scores = -self.n * np.log(residual) - self._penalty()
+        np.fill_diagonal(scores, np.nan)
+        return scores
+
+    def score_diff(self, x, y, z=()):
+        x, y = int(x), int(y)
+        z = tuple(sorted(set(int(k) for k in z)))
+        if x == y or x in z:
+            return 0.0
+
+        W, residual = self._factor(z)
+        if residual[x] <= self._tiny[x]:
+            # x is a linear function of z: adding it changes nothing but the penalty.
+            return -self._penalty()
+
+        w = self.cov[x, y] - W[:, x] @ W[:, y]
+        before = max(residual[y], self._tiny[y])
+        after = max(residual[y] - w * w / residual[x], self._tiny[y])
+        return -self.n * np.log(after / before) - self._penalty()
+
+    def _factor(self, key):
+        """(W_S, residual variances of all variables given S) for the sorted tuple S."""
+        with self._factor_lock:
+            entry = self._factors.get(key)
+            if entry is not None:
+                self._factors.move_to_end(key)
+                return entry
+
+        if not key:
+            entry = (np.zeros((0, self.p)), np.diag(self.cov).copy())
+        else:
+            entry = self._bordered(key) or self._full(key)
+
+        with self._factor_lock:
+            self._factors[key] = entry
+            while len(self._factors) > self.max_cached_sets:
+                self._factors.popitem(last=False)
+
+        return entry
+
+    def _bordered(self, key):
+        # The factors of S from those of S minus one element, if they are cached: the new
+        # row of L is (l, d) with l = W[:, x] and d^2 = var(x | rest), so the new row of W
+        # is (C[x, :] - l' W) / d. None if no such subset is cached or x is (nearly)
+        # determined by the rest.
+        with self._factor_lock:
+            for k in reversed(range(len(key))):
+                rest = key[:k] + key[k + 1:]
+                if rest in self._factors:
+                    W, residual = self._factors[rest]
+                    x = key[k]
+                    break
+            else:
+                return None
+
+        if residual[x] <= self._tiny[x]:
+            return None
+
+        row = (self.cov[x, :] - W[:, x] @ W) / np.sqrt(residual[x])
+        # Rows of W in the order the elements were added; only their span matters.
+        return np.vstack([W, row]), residual - row * row
+
+    def _full(self, key):
+        S = list(key)
+        C_ss = self.cov[np.ix_(S, S)]
+        try:
+            L = np.linalg.cholesky(C_ss)
+            W = np.linalg.solve(L, self.cov[S, :])
+        except np.linalg.LinAlgError:
+            eigenvalues, V = np.linalg.eigh(C_ss)
+            keep = eigenvalues > eigenvalues.max() * len(S) * np.finfo(float).eps
+            W = (V[:, keep] / np.sqrt(eigenvalues[keep])).T @ self.cov[S, :]
+        return W, np.diag(self.cov) - np.einsum("ij,ij->j", W, W)
@@ -1,28 +1,16 @@
-## This assumes that you have already started the JVM using JPype. You may
-## start the JVM only once per session. Your code should start with the following
-## lines:
-#
-import jpype
-import jpype.imports
-
-import importlib.resources as importlib_resources
-jar_path = importlib_resources.files('pytetrad').joinpath('resources','tetrad-current.jar')
-jar_path = str(jar_path)
-if not jpype.isJVMStarted():
-    try:
-        jpype.startJVM(jpype.getDefaultJVMPath(), classpath=[jar_path])
-    except OSError:
-        print("can't load jvm")
-        pass
+## The JVM is started (once per session) by pytetrad.tools.jvm on first use of a Java
+## class; importing this module does not start it.
+import pytetrad.tools.jvm as jvm
 
 ## Some functions wrapping various classes in Tetrad. Feel free to just steal
 ## the relevant code for your own projects, or 'pip install' this Github directory
 ## and call these functions. will add more named parameters to help one see which 
 ## methods for the the searches can be controlled.
 
-from edu.cmu.tetrad.util import Params, Parameters
-import edu.cmu.tetrad.algcomparison.simulation as sim
-import edu.cmu.tetrad.algcomparison.graph as graph
+Params = jvm.java_import("edu.cmu.tetrad.util.Params")
+Parameters = jvm.java_import("edu.cmu.tetrad.util.Parameters")
+sim = jvm.java_import("edu.cmu.tetrad.algcomparison.simulation")
+graph = jvm.java_import("edu.cmu.tetrad.algcomparison.graph")
 
 # Simuolates a continuous dataset with the given arguments and returns the dataset as a pandas datafram
 def simulateLinearFisher(num_meas = 20, num_lat = 0, avg_deg = 4, samp_size = 200, coef_low = 0, coef_high = 1,
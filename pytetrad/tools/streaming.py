@@ -0,0 +1,235 @@
+"""Covariance matrices of tables too large to load into memory, computed in one pass over
+chunks of rows, for searches that need only a covariance matrix and sample size (SEM-BIC,
+EBIC, Fisher Z, ...; see TetradSearch.from_covariance).
+
+A CovarianceAccumulator keeps the number of rows, the column means and the matrix of
+centered cross-products in float64. Each chunk's means and cross-products are computed
+about the chunk's own means and merged into the totals with Chan et al.'s pairwise update,
+so the result does not suffer the cancellation of accumulating raw sums of squares, and
+accumulators over different parts of the data (different files, say) merge the same way.
+Rows with missing values are skipped and counted.
+
+Typical use:
+
+    import pytetrad.tools.streaming as st
+
+    acc = st.covariance_from_files(["part-0.csv", "part-1.csv"], workers=2)
+    search = acc.to_search()                  # TetradSearch.from_covariance(cov, n)
+    search.use_sem_bic()
+    search.run_boss()
+
+CSV files are read with pandas.read_csv(chunksize=...) and Parquet files one row group at
+a time with pyarrow. Run as a script to write the covariance matrix to a CSV file:
+
+    python -m pytetrad.tools.streaming data/*.parquet --out cov.csv --workers 4
+"""
+
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+PARQUET_SUFFIXES = (".parquet", ".pq")
+
+
+class CovarianceAccumulator:
+    """The running covariance matrix of the rows given to update(), over the columns named
+    in columns (by default, those of the first chunk)."""
+
+    def __init__(self, columns=None):
+        self.columns = None if columns is None else [str(c) for c in columns]
+        self.n = 0
+        self.skipped = 0
+        self.mean = None
+        self.comoment = None
+
+    def update(self, chunk):
+        """Adds the rows of chunk, a DataFrame (whose columns are selected by name) or an
+        array with one column per variable."""
+        if isinstance(chunk, pd.DataFrame):
+            if self.columns is None:
+                self.columns = [str(c) for c in chunk.columns]
+            chunk = chunk.rename(columns=str)
+            missing = [c for c in self.columns if c not in chunk.columns]
+            if missing:
+                raise ValueError(f"Columns {missing} are not in the chunk.")
+            values = chunk[self.columns].to_numpy(dtype=np.float64)
+        else:
+            values = np.asarray(chunk, dtype=np.float64)
+            if values.ndim != 2:
+                raise ValueError("A chunk must be two-dimensional.")
+            if self.columns is None:
+                self.columns = [f"X{j + 1}" for j in range(values.shape[1])]
+            if values.shape[1] != len(self.columns):
+                raise ValueError(f"A chunk has {values.shape[1]} columns; expected "
+                                 f"{len(self.columns)}.")
+
+        complete = np.isfinite(values).all(axis=1)
+        if not complete.all():
+            self.skipped += int((~complete).sum())
+            values = values[complete]
+
+        m = len(values)
+        if m == 0:
+            return self
+
+        mean = values.mean(axis=0)
+        centered = values - mean
+        self._merge(m, mean, centered.T @ centered)
+        return self
+
+    def merge(self, other):
+        """Adds the rows accumulated by other, an accumulator over the same columns."""
+        if other.n == 0:
+            self.skipped += other.skipped
+            return self
+        if self.columns is not None and other.columns != self.columns:
+            raise ValueError("Accumulators over different columns cannot be merged.")
+        self.columns = other.columns
+        self.skipped += other.skipped
+        self._merge(other.n, other.mean, other.comoment)
+        return self
+
+    def _merge(self, m, mean, comoment):
+        if self.n == 0:
+            self.n, self.mean, self.comoment = m, mean.copy(), comoment.copy()
+            return
+
+        n = self.n + m
+        delta = mean - self.mean
+        self.comoment += comoment + np.outer(delta, delta) * (self.n * m / n)
+        self.mean += delta * (m / n)
+        self.n = n
+
+    def covariance(self, ddof=1):
+        """The covariance matrix as a DataFrame indexed and headed by the column names."""
+        if self.n <= ddof:
+            raise ValueError(f"A covariance matrix needs more than {ddof} complete rows; "
+                             f"have {self.n}.")
+        cov = self.comoment / (self.n - ddof)
+        return pd.DataFrame(cov, index=self.columns, columns=self.columns)
+
+    def correlation(self):
+        cov = self.covariance().to_numpy()
+        sd = np.sqrt(np.diag(cov))
+        return pd.DataFrame(cov / np.outer(sd, sd), index=self.columns, columns=self.columns)
+
+    def sufficient_statistics(self):
+        """(covariance matrix, sample size), the arguments of TetradSearch.from_covariance."""
+        return self.covariance(), self.n
+
+    def to_search(self):
+        """A TetradSearch over the covariance matrix (see TetradSearch.from_covariance)."""
+        from pytetrad.tools.TetradSearch import TetradSearch
+        return TetradSearch.from_covariance(*self.sufficient_statistics())
+
+    def stats(self):
+        return {"rows": self.n, "skipped": self.skipped,
+                "columns": 0 if self.columns is None else len(self.columns)}
+
+
+def iter_csv(path, columns=None, chunksize=100000, **kwargs):
+    """The rows of the CSV file path as DataFrames of up to chunksize rows. Other keyword
+    arguments go to pandas.read_csv."""
+    with pd.read_csv(path, usecols=columns, chunksize=chunksize, **kwargs) as reader:
+        yield from reader
+
+
+def iter_parquet(path, columns=None):
+    """The rows of the Parquet file path as DataFrames, one per row group."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError(
+            "pyarrow is required for this function. "
+            "Install it with: pip install pyarrow"
+        ) from None
+
+    parquet = pq.ParquetFile(path)
+    for k in range(parquet.num_row_groups):
+        yield parquet.read_row_group(k, columns=columns).to_pandas()
+
+
+def iter_file(path, columns=None, chunksize=100000, **kwargs):
+    """The rows of path as DataFrames: Parquet row groups for .parquet and .pq files, and
+    chunks of a CSV file (read with pandas.read_csv and kwargs) otherwise."""
+    if str(path).lower().endswith(PARQUET_SUFFIXES):
+        return iter_parquet(path, columns=columns)
+    return iter_csv(path, columns=columns, chunksize=chunksize, **kwargs)
+
+
+def covariance_from_chunks(chunks, columns=None):
+    """A CovarianceAccumulator over an iterable of chunks (DataFrames or arrays)."""
+    acc = CovarianceAccumulator(columns)
+    for chunk in chunks:
+        acc.update(chunk)
+    return acc
+
+
+def covariance_from_file(path, columns=None, chunksize=100000, **kwargs):
+    """A CovarianceAccumulator over the CSV or Parquet file path (see iter_file)."""
+    return covariance_from_chunks(iter_file(path, columns, chunksize, **kwargs), columns)
+
+
+def covariance_from_files(paths, columns=None, chunksize=100000, workers=1, **kwargs):
+    """A CovarianceAccumulator over the rows of all the files in paths, which must have the
+    same columns (or all contain columns). With workers > 1 (None: one per core), files are
+    read by that many worker processes and their accumulators merged."""
+    paths = [os.fspath(path) for path in paths]
+    if not paths:
+        raise ValueError("No files given.")
+
+    workers = workers or multiprocessing.cpu_count()
+    if workers == 1 or len(paths) == 1:
+        parts = [covariance_from_file(path, columns, chunksize, **kwargs) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths)),
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [executor.submit(covariance_from_file, path, columns, chunksize, **kwargs)
+                       for path in paths]
+            parts = [future.result() for future in futures]
+
+    # Later files' columns are put in the first file's order.
+    acc = CovarianceAccumulator(columns or parts[0].columns)
+    for path, part in zip(paths, parts):
+        if part.columns is not None and sorted(part.columns) != sorted(acc.columns):
+            raise ValueError(f"{path} has columns {part.columns}; expected {acc.columns}.")
+        acc.merge(_reordered(part, acc.columns))
+    return acc
+
+
+def _reordered(acc, columns):
+    if acc.columns is None or acc.columns == columns:
+        return acc
+    order = [acc.columns.index(c) for c in columns]
+    out = CovarianceAccumulator(columns)
+    out.n, out.skipped = acc.n, acc.skipped
+    out.mean = acc.mean[order]
+    out.comoment = acc.comoment[np.ix_(order, order)]
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compute the covariance matrix of CSV or Parquet files in one pass.")
+    parser.add_argument("paths", nargs="+", help="CSV or Parquet files with the same columns")
+    parser.add_argument("--out", required=True, help="CSV file for the covariance matrix")
+    parser.add_argument("--columns", default=None, help="comma-separated columns to use")
+    parser.add_argument("--chunksize", type=int, default=100000, help="rows per CSV chunk")
+    parser.add_argument("--sep", default=",", help="CSV field separator")
+    parser.add_argument("--workers", type=int, default=1, help="processes reading files")
+    args = parser.parse_args(argv)
+
+    columns = args.columns.split(",") if args.columns else None
+    acc = covariance_from_files(args.paths, columns=columns, chunksize=args.chunksize,
+                                workers=args.workers, sep=args.sep)
+    acc.covariance().to_csv(args.out)
+    print(f"Wrote the {len(acc.columns)} x {len(acc.columns)} covariance matrix of {acc.n} "
+          f"rows to {args.out} ({acc.skipped} rows with missing values skipped).")
+
+
+if __name__ == "__main__":
+    main()
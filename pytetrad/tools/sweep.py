@@ -30,19 +30,14 @@ Typical use:
     print(report.point_graph(i))
 """
 
-import jpype.imports
-
-try:
-    jpype.startJVM(classpath=["resources/tetrad-current.jar"])
-except OSError:
-    pass
-
 import pandas as pd
 
-import edu.cmu.tetrad.algcomparison.sweep as tsweep
-import edu.cmu.tetrad.algcomparison.algorithm.oracle.cpdag as cpdag
-import edu.cmu.tetrad.search as ts
-import java.util as jutil
+import pytetrad.tools.jvm as jvm
+
+tsweep = jvm.java_import("edu.cmu.tetrad.algcomparison.sweep")
+cpdag = jvm.java_import("edu.cmu.tetrad.algcomparison.algorithm.oracle.cpdag")
+ts = jvm.java_import("edu.cmu.tetrad.search")
+jutil = jvm.java_import("java.util")
 
 
 def _require():
@@ -9,7 +9,7 @@ jpype.startJVM(classpath=["/tmp/work/tetrad-current.jar"], convertStrings=False)
 import pandas as pd
 sys.path.insert(0, "/tmp/pytetrad")
 import pytetrad.tools.TetradSearch as ts_mod
-import pytetrad.tools.translate as tr
+import pytetrad.tools.datacache as dc
 import edu.cmu.tetrad.search as tsearch
 import edu.cmu.tetrad.search.test as ttest
 
@@ -18,7 +18,7 @@ for col in df.columns:
     df[col] = df[col].astype(float)
 df["origin"] = df["origin"].astype(int)
 
-data_java = tr.pandas_data_to_tetrad(df)
+data_java = dc.pandas_data_to_tetrad(df)
 CST = tsearch.ConditioningSetType.ORDERED_LOCAL_MARKOV_PROPERTY
 
 def check(search, graph):
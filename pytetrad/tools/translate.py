@@ -1,20 +1,12 @@
-## This assumes that you have already started the JVM using JPype. You may
-## start the JVM only once per session. Your code should start with the following
-## lines:
-#
-import jpype
-import jpype.imports
+## The JVM is started (once per session) by pytetrad.tools.jvm on first use of a Java
+## class; importing this module does not start it. To pass JVM options (heap size etc.),
+## call pytetrad.tools.jvm.configure(...) before using any of these functions.
+from __future__ import annotations
 
-import importlib.resources as importlib_resources
-jar_path = importlib_resources.files('pytetrad').joinpath('resources','tetrad-current.jar')
-jar_path = str(jar_path)
-if not jpype.isJVMStarted():
-    try:
-        jpype.startJVM(jpype.getDefaultJVMPath(), "-ea",
-                       "--enable-native-access=ALL-UNNAMED", classpath=[jar_path], )
-    except OSError:
-        print("can't load jvm")
-        pass
+import re
+
+import jpype
+from jpype import JArray, JDouble, JInt
 
 ## Some functions wrapping various classes in Tetrad. Feel free to just steal
 ## the relevant code for your own projects, or 'pip install' this Github directory
@@ -29,12 +21,30 @@ import numpy as np
 import pandas as pd
 from pandas import DataFrame
 
-import java.util as util
-import edu.cmu.tetrad.data as td
-import edu.cmu.tetrad.graph as tg
+import pytetrad.tools.jvm as jvm
 
+util = jvm.java_import("java.util")
+td = jvm.java_import("edu.cmu.tetrad.data")
+tg = jvm.java_import("edu.cmu.tetrad.graph")
+tu = jvm.java_import("edu.cmu.tetrad.util")
+gp = jvm.java_import("edu.cmu.tetrad.graph.GraphSaveLoadUtils")
+jio = jvm.java_import("java.io")
 
-def pandas_data_to_tetrad(df: DataFrame, int_as_cont=False):
+# Node names that Tetrad's graph file format can carry.
+_GRAPH_FILE_NAME = re.compile(r"[^\s;,]+")
+
+
+def pandas_data_to_tetrad(df: DataFrame, int_as_cont=False, bulk=True):
+    """Translates a pandas DataFrame into a Tetrad BoxDataSet. Float columns (and, with
+    int_as_cont=True, integer columns) become continuous variables; all other columns become
+    discrete variables whose categories are the column's distinct values in order of first
+    appearance.
+
+    By default (bulk=True) the values are handed to Java a whole matrix or a whole column
+    at a time as primitive arrays, so conversion cost is dominated by copying rather than
+    by one JNI call per cell. bulk=False keeps the original cell-by-cell fill, which is
+    useful only as a reference (see run_conversion_benchmark.py); both produce the same
+    data box types and the same data set."""
     dtypes = ["float16", "float32", "float64"]
     if int_as_cont:
         for i in range(3, 7):
@@ -42,8 +52,6 @@ def pandas_data_to_tetrad(df: DataFrame, int_as_cont=False):
             dtypes.append(f"uint{2 ** i}")
     cols = df.columns
     discrete_cols = [col for col in cols if df[col].dtypes not in dtypes]
-    category_map = {col: {val: i for i, val in enumerate(df[col].unique())} for col in discrete_cols}
-    # df = df.replace(category_map) // Deprecated
 
     category_map = {
         col: {val: i for i, val in enumerate(df[col].unique())}
@@ -55,7 +63,6 @@ def pandas_data_to_tetrad(df: DataFrame, int_as_cont=False):
         s = df[col].map(category_map[col])
         df[col] = s.astype("int64")  # or "Int64" if you want pandas NA support
 
-    values = df.values
     n, p = df.shape
 
     variables = util.ArrayList()
@@ -68,9 +75,63 @@ def pandas_data_to_tetrad(df: DataFrame, int_as_cont=False):
         else:
             variables.add(td.ContinuousVariable(str(col)))
 
+    if not bulk:
+        return td.BoxDataSet(_fill_databox_by_cell(df, variables, len(discrete_cols)), variables)
+
     if len(discrete_cols) == len(cols):
-        databox = td.IntDataBox(n, p)
+        # int[n][p], row-major, as IntDataBox stores it.
+        databox = td.IntDataBox(JArray.of(df.to_numpy(dtype=np.int32)))
     elif len(discrete_cols) == 0:
+        # double[n][p], row-major, as DoubleDataBox stores it.
+        databox = td.DoubleDataBox(JArray.of(df.to_numpy(dtype=np.float64)))
+    else:
+        # MixedDataBox stores columns: continuous[col] for continuous columns and
+        # discrete[col] for discrete ones, with the other slot left null.
+        continuous = JArray(JDouble, 2)(p)
+        discrete = JArray(JInt, 2)(p)
+
+        for j, col in enumerate(cols):
+            if col in discrete_cols:
+                discrete[j] = JArray(JInt)(np.ascontiguousarray(df[col].to_numpy(), dtype=np.int32))
+            else:
+                continuous[j] = JArray(JDouble)(np.ascontiguousarray(df[col].to_numpy(), dtype=np.float64))
+
+        databox = td.MixedDataBox(variables, n, continuous, discrete)
+
+    return td.BoxDataSet(databox, variables)
+
+
+def pandas_covariance_to_tetrad(cov_df: DataFrame, n):
+    """Translates a covariance matrix, a square DataFrame whose columns name the
+    (continuous) variables, and the sample size n it was computed from into a Tetrad
+    CovarianceMatrix."""
+    values = np.asarray(cov_df, dtype=np.float64)
+    p = len(cov_df.columns)
+    if values.shape != (p, p):
+        raise ValueError(f"A covariance matrix must be square; got shape {values.shape}.")
+    if not np.all(np.isfinite(values)):
+        raise ValueError("The covariance matrix has missing or infinite entries.")
+    if not np.allclose(values, values.T, rtol=1e-8, atol=1e-12):
+        raise ValueError("The covariance matrix is not symmetric.")
+    if int(n) != n or n < 2:
+        raise ValueError(f"The sample size must be an integer of at least 2; got {n}.")
+
+    variables = util.ArrayList()
+    for col in cov_df.columns:
+        variables.add(td.ContinuousVariable(str(col)))
+
+    # Symmetrized, so rounding in whoever computed it does not reach Java.
+    matrix = tu.Matrix(JArray.of(np.ascontiguousarray((values + values.T) / 2)))
+    return td.CovarianceMatrix(variables, matrix, int(n))
+
+
+def _fill_databox_by_cell(df, variables, num_discrete):
+    n, p = df.shape
+    values = df.values
+
+    if num_discrete == p:
+        databox = td.IntDataBox(n, p)
+    elif num_discrete == 0:
         databox = td.DoubleDataBox(n, p)
     else:
         databox = td.MixedDataBox(variables, n)
@@ -79,10 +140,93 @@ def pandas_data_to_tetrad(df: DataFrame, int_as_cont=False):
         for row, val in enumerate(var):
             databox.set(row, col, val)
 
-    return td.BoxDataSet(databox, variables)
+    return databox
+
+
+def tetrad_data_to_pandas(data: td.DataSet, typed=False, categorical=True, bulk=True):
+    """Translates a Tetrad DataSet into a pandas DataFrame. By default the columns have
+    object dtype and hold what DataSet.getObject returns for each cell: floats for
+    continuous variables and, for discrete variables, category names if the variable
+    displays them or integer category indices otherwise. With typed=True, continuous
+    variables become float64 columns and discrete variables become pandas categoricals
+    over the category names if categorical is True, or integer category indices otherwise
+    (int64, or nullable Int64 if the column has missing values).
+
+    By default (bulk=True) the values are read straight from the arrays behind the data
+    set's DataBox, one JNI transfer per array and with no copy on the Java side, rather than
+    with one JNI call per cell. bulk=False keeps the original cell-by-cell read."""
+    if not bulk:
+        return _read_dataframe_by_cell(data)
+
+    names = [str(name) for name in data.getVariableNames()]
+    columns = _databox_columns(data)
+    if columns is None:
+        # Not a box of a known layout: a copy of the data as one n x p matrix.
+        matrix = np.asarray(data.getDoubleData().toArray(), dtype=np.float64)
+        columns = [matrix[:, j] for j in range(len(names))]
+
+    frame = {}
+
+    for j, name in enumerate(names):
+        values = columns[j]
+        variable = data.getVariable(j)
+
+        if not isinstance(variable, td.DiscreteVariable):
+            values = np.asarray(values, dtype=np.float64)
+            frame[name] = values if typed else values.astype(object)
+            continue
+
+        values = np.asarray(values)
+        missing = (values == td.DiscreteVariable.MISSING_VALUE)
+        if values.dtype.kind == "f":
+            missing |= np.isnan(values)
+        codes = np.where(missing, -1, values).astype(np.int64)
+        categories = [str(category) for category in variable.getCategories()]
+
+        if not typed:
+            if variable.isCategoryNamesDisplayed():
+                labels = np.array(categories + [None], dtype=object)
+                frame[name] = labels[codes]
+            else:
+                frame[name] = np.where(missing, td.DiscreteVariable.MISSING_VALUE,
+                                       codes).astype(object)
+        elif categorical:
+            frame[name] = pd.Categorical.from_codes(codes, categories=categories)
+        elif missing.any():
+            frame[name] = pd.array(np.where(missing, None, codes), dtype="Int64")
+        else:
+            frame[name] = codes
+
+    return pd.DataFrame(frame, columns=names)
 
 
-def tetrad_data_to_pandas(data: td.DataSet):
+def _databox_columns(data):
+    """The columns of data as NumPy arrays, read from the arrays its DataBox stores, or None
+    if data is not backed by a box of a known layout."""
+    n, p = data.getNumRows(), data.getNumColumns()
+    try:
+        box = data.getDataBox()
+        if isinstance(box, (td.DoubleDataBox, td.IntDataBox)):
+            # Rows: [n][p].
+            if n == 0:
+                return [np.empty(0)] * p
+            rows = np.asarray(box.getData())
+            return [rows[:, j] for j in range(p)]
+        if isinstance(box, (td.VerticalDoubleDataBox, td.VerticalIntDataBox)):
+            # Columns: [p][n].
+            return [np.asarray(column) for column in box.getVariableVectors()]
+        if isinstance(box, td.MixedDataBox):
+            # Columns, each in whichever of the two arrays is not null for it.
+            continuous, discrete = box.getContinuousData(), box.getDiscreteData()
+            return [np.asarray(continuous[j] if continuous[j] is not None else discrete[j])
+                    for j in range(p)]
+    except AttributeError:
+        # A data set without a box, or a Tetrad version without these accessors.
+        pass
+    return None
+
+
+def _read_dataframe_by_cell(data):
     names = data.getVariableNames()
     columns_ = []
 
@@ -97,30 +241,100 @@ def tetrad_data_to_pandas(data: td.DataSet):
 
     return df
 
-## The defaults here are for the PCALG style of general graph endpoint matrices, but
-## the user can use whichever endpoint encoding they like.
-def graph_to_matrix(g, nullEpt = 0, circleEpt = 1, arrowEpt = 2, tailEpt = 3):
-    endpoint_map = {"NULL": nullEpt,
-                    "CIRCLE": circleEpt,
-                    "ARROW": arrowEpt,
-                    "TAIL": tailEpt}
+# Endpoint codes used by graph_to_endpoints; these happen to be the PCALG codes that
+# graph_to_matrix uses by default.
+_ENDPOINT_CODES = {"NULL": 0, "CIRCLE": 1, "ARROW": 2, "TAIL": 3}
+
+
+def graph_to_endpoints(g):
+    """Returns the edges of a Tetrad graph as parallel NumPy arrays (names, i, j, e1, e2):
+    names lists the node names in g.getNodes() order, and edge k runs between node i[k]
+    and node j[k] with endpoint e1[k] at node i[k] and e2[k] at node j[k]. Endpoints are
+    coded NULL = 0, CIRCLE = 1, ARROW = 2, TAIL = 3.
+
+    The edges are read in one pass over g.getEdges(), with nodes looked up by name and
+    endpoints by ordinal in dictionaries built once, rather than by the linear
+    nodes.indexOf scans of a per-edge lookup or by hashing Java objects (which calls back
+    into Java for hashCode and equals). This is still not a bulk transfer: each edge
+    costs eight Java calls (its two nodes and their names, its two endpoints and their
+    ordinals), so the cost is O(E) JNI calls."""
+    names = [str(node.getName()) for node in g.getNodes()]
+    index = {name: k for k, name in enumerate(names)}
+    codes = {getattr(tg.Endpoint, name).ordinal(): code
+             for name, code in _ENDPOINT_CODES.items()}
+
+    rows = [(index[str(edge.getNode1().getName())], index[str(edge.getNode2().getName())],
+             codes[edge.getEndpoint1().ordinal()], codes[edge.getEndpoint2().ordinal()])
+            for edge in g.getEdges()]
+
+    edges = np.array(rows, dtype=np.int32).reshape(-1, 4)
+    return (names, edges[:, 0], edges[:, 1], edges[:, 2].astype(np.int8),
+            edges[:, 3].astype(np.int8))
+
+
+def endpoints_to_graph(names, i, j, e1, e2):
+    """The inverse of graph_to_endpoints: returns a Java EdgeListGraph over nodes named
+    names with an edge between nodes i[k] and j[k] for each k, with endpoint e1[k] at node
+    i[k] and e2[k] at node j[k] (coded as in graph_to_endpoints)."""
+    endpoints = [None, tg.Endpoint.CIRCLE, tg.Endpoint.ARROW, tg.Endpoint.TAIL]
+    nodes = [tg.GraphNode(str(name)) for name in names]
+    variables = util.ArrayList()
+
+    for node in nodes:
+        variables.add(node)
+
+    graph = tg.EdgeListGraph(variables)
+
+    for a, b, mark1, mark2 in zip(np.asarray(i).tolist(), np.asarray(j).tolist(),
+                                  np.asarray(e1).tolist(), np.asarray(e2).tolist()):
+        graph.addEdge(tg.Edge(nodes[a], nodes[b], endpoints[mark1], endpoints[mark2]))
+
+    return graph
+
+
+def graph_to_numpy(g, nullEpt=0, circleEpt=1, arrowEpt=2, tailEpt=3):
+    """Returns the endpoint matrix of a Tetrad graph as a p x p NumPy array, with A[j][i]
+    the endpoint at node i and A[i][j] the endpoint at node j of the edge between nodes i
+    and j, in g.getNodes() order. See graph_to_matrix for the encoding; as there, entries
+    for pairs of nodes with no edge are 0, and nullEpt codes only NULL endpoints of edges."""
+    names, i, j, e1, e2 = graph_to_endpoints(g)
+    return _endpoint_matrix(len(names), i, j, e1, e2, (nullEpt, circleEpt, arrowEpt, tailEpt))
 
-    nodes = g.getNodes()
-    p = g.getNumNodes()
+
+def _endpoint_matrix(p, i, j, e1, e2, encoding):
+    codes = np.array(encoding, dtype=int)
     A = np.zeros((p, p), dtype=int)
+    A[j, i] = codes[e1]
+    A[i, j] = codes[e2]
+    return A
 
-    for edge in g.getEdges():
-        i = nodes.indexOf(edge.getNode1())
-        j = nodes.indexOf(edge.getNode2())
-        A[j][i] = endpoint_map[edge.getEndpoint1().name()]
-        A[i][j] = endpoint_map[edge.getEndpoint2().name()]
 
-    columns_ = []
+def graph_to_sparse(g, nullEpt=0, circleEpt=1, arrowEpt=2, tailEpt=3):
+    """Returns the endpoint matrix of graph_to_numpy as a scipy.sparse COO matrix, for
+    graphs too large to hold densely. Unstored entries mean no edge."""
+    try:
+        import scipy.sparse as sp
+    except ImportError:
+        raise ImportError(
+            "scipy is required for this function. "
+            "Install it with: pip install scipy"
+        ) from None
 
-    for name in nodes:
-        columns_.append(str(name))
+    names, i, j, e1, e2 = graph_to_endpoints(g)
+    codes = np.array([nullEpt, circleEpt, arrowEpt, tailEpt], dtype=int)
+
+    return sp.coo_matrix((np.concatenate([codes[e1], codes[e2]]),
+                          (np.concatenate([j, i]), np.concatenate([i, j]))),
+                         shape=(len(names), len(names)))
 
-    return pd.DataFrame(A, columns=columns_)
+
+## The defaults here are for the PCALG style of general graph endpoint matrices, but
+## the user can use whichever endpoint encoding they like. Pairs of nodes with no edge
+## are always 0; nullEpt codes only NULL endpoints of edges.
+def graph_to_matrix(g, nullEpt = 0, circleEpt = 1, arrowEpt = 2, tailEpt = 3):
+    names, i, j, e1, e2 = graph_to_endpoints(g)
+    A = _endpoint_matrix(len(names), i, j, e1, e2, (nullEpt, circleEpt, arrowEpt, tailEpt))
+    return pd.DataFrame(A, columns=names)
 
 def tetrad_matrix_to_numpy(array):
     # print(array)
@@ -141,26 +355,91 @@ def tetrad_matrix_to_pandas(array, variables):
     columns = [str(variables.get(i)) for i in range(array.getNumColumns())]
     return pd.DataFrame(np_array, columns=columns)
 
-# Input a square int[][] array with only 0's and 1's, where a[i][j] = 1 just in case
-# j->i. Returns a Java graph object for this.
-def adj_matrix_to_graph(adjMatrix):
-    rows, cols = adjMatrix.shape
+# Input a square array with only 0's and 1's, where a[i][j] = 1 just in case
+# i->j; a scipy.sparse matrix may be given instead. Returns a Java graph object for this.
+def adj_matrix_to_graph(adjMatrix, node_names=None):
+    """Returns a Java EdgeListGraph with a directed edge i -> j for every nonzero
+    adjMatrix[i][j]. adjMatrix may be a dense square array or a scipy.sparse matrix; only
+    its nonzero entries are visited. node_names gives the names of the nodes in row order
+    (default X1, ..., Xp)."""
+    if hasattr(adjMatrix, "tocoo"):
+        coo = adjMatrix.tocoo()
+        rows, cols = coo.shape
+        nonzero = coo.data != 0
+        sources, targets = coo.row[nonzero], coo.col[nonzero]
+    else:
+        adjMatrix = np.asarray(adjMatrix)
+        if adjMatrix.ndim != 2:
+            raise ValueError("The matrix must be two-dimensional.")
+        rows, cols = adjMatrix.shape
+        sources, targets = np.nonzero(adjMatrix)
 
     if rows != cols:
         raise ValueError("The matrix is not square. Rows and columns must be equal.")
 
-    variable_names = ["X" + str(i) for i in range(1, rows + 1)]
+    return _directed_graph(rows, sources, targets, node_names)
+
+
+def edge_list_to_graph(edges, node_names=None, num_nodes=None):
+    """Returns a Java EdgeListGraph with a directed edge i -> j for every row (i, j) of
+    edges, an (E, 2) array of 0-based node indices. The number of nodes is len(node_names)
+    if names are given, else num_nodes, else one more than the largest index; names
+    default to X1, ..., Xp."""
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+
+    if node_names is not None:
+        p = len(node_names)
+    elif num_nodes is not None:
+        p = num_nodes
+    else:
+        p = int(edges.max()) + 1 if len(edges) else 0
+
+    if len(edges) and (edges.min() < 0 or edges.max() >= p):
+        raise ValueError(f"Edge indices must lie in 0..{p - 1}.")
+
+    return _directed_graph(p, edges[:, 0], edges[:, 1], node_names)
+
+
+def _directed_graph(p, sources, targets, node_names):
+    if node_names is None:
+        node_names = ["X" + str(i) for i in range(1, p + 1)]
+    elif len(node_names) != p:
+        raise ValueError(f"Expected {p} node names but got {len(node_names)}.")
+
+    names = [str(name) for name in node_names]
+
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    loops = np.flatnonzero(sources == targets)
+    if len(loops):
+        raise ValueError(f"Self-loops are not allowed; node {int(sources[loops[0]])} has an "
+                         "edge to itself.")
+
+    # Repeated (i, j) pairs, e.g. from a sparse matrix with uncoalesced entries, give one
+    # edge, whichever way the edges are added below.
+    pairs = np.unique(np.column_stack([sources, targets]).reshape(-1, 2), axis=0)
+    sources, targets = pairs[:, 0], pairs[:, 1]
+
+    # The Graph API has no bulk edge insertion, so the whole edge list goes to Java in one
+    # call, as a graph in Tetrad's graph file format, read by Tetrad's own loader. That
+    # format separates names by ';' and whitespace, so other names are added edge by edge.
+    if names and all(_GRAPH_FILE_NAME.fullmatch(name) for name in names):
+        lines = ["Graph Nodes:", ";".join(names), "", "Graph Edges:"]
+        lines += [f"{k}. {names[i]} --> {names[j]}"
+                  for k, (i, j) in enumerate(zip(sources.tolist(), targets.tolist()), 1)]
+        lines.append("")
+        return gp.readerToGraphTxt(jio.StringReader("\n".join(lines)))
+
+    nodes = [tg.GraphNode(name) for name in names]
     variables = util.ArrayList()
 
-    for i in range(0, rows):
-        variables.append(tg.GraphNode(variable_names[i]))
+    for node in nodes:
+        variables.add(node)
 
     graph = tg.EdgeListGraph(variables)
 
-    for i, row in enumerate(adjMatrix):
-        for j, value in enumerate(row):
-            if (adjMatrix[i][j]):
-                graph.addDirectedEdge(variables.get(i), variables.get(j))
+    for i, j in zip(sources.tolist(), targets.tolist()):
+        graph.addDirectedEdge(nodes[i], nodes[j])
 
     return graph
 
@@ -1,25 +1,99 @@
 
-def graphs_to_probs(graphs):
-    probs = {}
-    reverse = {"---": "---", "o-o": "o-o", "o--": "--o",
-               "--o": "o--", "<--": "-->", "-->": "<--",
-               "<-o": "o->", "o->": "<-o", "<->": "<->"}
+import numpy as np
+import pandas as pd
+
+import pytetrad.tools.translate as tr
+
+# Edge marks by endpoint code (translate.graph_to_endpoints), at the first and at the
+# second node of an edge string such as "o->".
+_MARKS1 = {1: "o", 2: "<", 3: "-"}
+_MARKS2 = {1: "o", 2: ">", 3: "-"}
+
+
+def graphs_to_tensor(graphs):
+    """Stacks the edges of several Tetrad graphs into one array. Returns (names, pairs,
+    tensor): names lists every node name, pairs is a (P, 2) array of indices into names of
+    the node pairs adjacent in at least one graph (the first name sorting before the second,
+    as in graphs_to_probs), and tensor is an int8 array of shape (len(graphs), P) whose entry
+    [g, k] codes the edge of pair k in graph g as 4 * e1 + e2, with e1 and e2 the endpoint
+    codes of translate.graph_to_endpoints at the pair's first and second node (0 = no edge).
+
+    Each graph is read once, via graph_to_endpoints."""
+    names = []
+    index = {}
+    edges = []
 
     for graph in graphs:
-        for edge in graph.getEdges():
-            edge = str(edge).split()
+        graph_names, i, j, e1, e2 = tr.graph_to_endpoints(graph)
+        for name in graph_names:
+            if name not in index:
+                index[name] = len(names)
+                names.append(name)
+        position = np.array([index[name] for name in graph_names], dtype=np.int64)
+        edges.append((position[i], position[j], e1, e2))
+
+    p = len(names)
+    rank = np.empty(p, dtype=np.int64)
+    rank[np.argsort(np.array(names, dtype=object), kind="stable")] = np.arange(p)
+
+    keys = []
+    codes = []
+    for i, j, e1, e2 in edges:
+        swap = rank[i] > rank[j]
+        first, second = np.where(swap, j, i), np.where(swap, i, j)
+        keys.append(first * p + second)
+        codes.append((np.where(swap, e2, e1) * 4 + np.where(swap, e1, e2)).astype(np.int8))
+
+    pair_keys = np.unique(np.concatenate(keys)) if keys else np.empty(0, dtype=np.int64)
+    tensor = np.zeros((len(edges), len(pair_keys)), dtype=np.int8)
+
+    for g, (key, code) in enumerate(zip(keys, codes)):
+        tensor[g, np.searchsorted(pair_keys, key)] = code
 
-            if edge[0] < edge[2]:
-                key = (edge[0], edge[2])
-                arr = edge[1]
-            else:
-                key = (edge[2], edge[0])
-                arr = reverse[edge[1]]
+    pairs = np.stack([pair_keys // max(p, 1), pair_keys % max(p, 1)], axis=1)
+    return names, pairs, tensor
+
+
+def _edge_type_counts(tensor):
+    # counts[k, c]: the number of graphs in which pair k has the edge coded c.
+    num_pairs = tensor.shape[1]
+    offsets = 16 * np.arange(num_pairs, dtype=np.int64)
+    flat = (tensor.astype(np.int64) + offsets).ravel()
+    return np.bincount(flat, minlength=16 * num_pairs).reshape(num_pairs, 16)
+
+
+def _edge_string(code):
+    return _MARKS1[code // 4] + "-" + _MARKS2[code % 4]
+
+
+def graphs_to_probs_frame(graphs):
+    """Edge-type frequencies over graphs as a DataFrame with one row per node pair and edge
+    type that occurs: node1, node2, edge (e.g. "o->", read from node1 to node2), count and
+    probability (count / len(graphs)). Pairs are ordered as in graphs_to_probs."""
+    names, pairs, tensor = graphs_to_tensor(graphs)
+    counts = _edge_type_counts(tensor)
+    counts[:, 0] = 0
+    k, code = np.nonzero(counts)
+    names = np.array(names, dtype=object)
+
+    return pd.DataFrame({"node1": names[pairs[k, 0]] if len(k) else [],
+                         "node2": names[pairs[k, 1]] if len(k) else [],
+                         "edge": [_edge_string(c) for c in code.tolist()],
+                         "count": counts[k, code],
+                         "probability": counts[k, code] / max(tensor.shape[0], 1)})
+
+
+def graphs_to_probs(graphs):
+    """Edge-type frequencies over graphs as a dict {(node1, node2): {edge: probability}},
+    with node1 < node2 and edge strings such as "-->" read from node1 to node2; see
+    graphs_to_probs_frame for the same as a DataFrame."""
+    frame = graphs_to_probs_frame(graphs)
+    probs = {}
 
-            if key not in probs: probs[key] = {}
-            if arr not in probs[key]: probs[key][arr] = 0
+    for node1, node2, edge, prob in zip(frame["node1"], frame["node2"], frame["edge"],
+                                        frame["probability"]):
+        probs.setdefault((node1, node2), {})[edge] = float(prob)
 
-            probs[key][arr] += 1.0 / len(graphs)
     return probs
 
 
@@ -0,0 +1,36 @@
+import jpype
+import numpy as np
+import pandas as pd
+import pytest
+
+import pytetrad.tools.jvm as jvm
+
+
+@pytest.fixture(scope="session")
+def java():
+    """A running JVM; tests needing one are skipped if it cannot start (no JDK, say)."""
+    try:
+        jvm.start()
+    except Exception as e:
+        pytest.skip(f"the JVM cannot be started: {e}")
+
+
+@pytest.fixture(scope="session")
+def tetrad(java):
+    """A running JVM with Tetrad on the classpath."""
+    try:
+        jpype.JClass("edu.cmu.tetrad.data.DataSet")
+    except Exception:
+        pytest.skip("Tetrad is not on the classpath (see jvm.default_jar_path)")
+
+
+@pytest.fixture
+def linear_df():
+    """500 rows of the chain X1 -> X2 -> X3 and an independent X4."""
+    rng = np.random.default_rng(0)
+    n = 500
+    x1 = rng.normal(size=n)
+    x2 = 0.8 * x1 + rng.normal(size=n)
+    x3 = 0.8 * x2 + rng.normal(size=n)
+    x4 = rng.normal(size=n)
+    return pd.DataFrame({"X1": x1, "X2": x2, "X3": x3, "X4": x4})
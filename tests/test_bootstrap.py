@@ -0,0 +1,85 @@
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+from jpype import JOverride
+
+import pytetrad.tools.bootstrap as bs
+import pytetrad.tools.jvm as jvm
+
+
+@jvm.implements("java.lang.Runnable")
+class Task:
+    def __init__(self, df, alpha=0.01, inner=None):
+        self.df = df
+        self.alpha = alpha
+        self.inner = inner
+
+    @JOverride
+    def run(self):
+        pass
+
+
+def test_python_objects_are_rebuilt_over_the_resample(java, linear_df):
+    task = Task(linear_df, alpha=0.05, inner=Task(linear_df))
+    resample = linear_df.sample(frac=1.0, replace=True, random_state=1)
+
+    rebuilt = bs._loads(bs._dumps(task, linear_df), resample)
+
+    assert type(rebuilt) is type(task)
+    assert rebuilt.df is resample
+    assert rebuilt.alpha == 0.05
+    assert rebuilt.inner.df is resample
+
+
+def test_objects_that_cannot_be_rebuilt_are_rejected(java, linear_df):
+    with pytest.raises(RuntimeError):
+        bs._dumps(object(), linear_df)
+
+
+def _edge_type_probabilities(edge):
+    return {str(p.getEdgeType()): p.getProbability() for p in edge.getEdgeTypeProbabilities()}
+
+
+def test_ensemble_probabilities_follow_the_edge_direction(tetrad):
+    # A <-- B in three graphs and A --> B in one; Edge stores the first as B --> A.
+    a_from_b = (["A", "B"], np.array([0]), np.array([1]), np.array([2]), np.array([3]))
+    a_to_b = (["A", "B"], np.array([0]), np.array([1]), np.array([3]), np.array([2]))
+
+    graph = bs.ensemble_graph([a_from_b] * 3 + [a_to_b])
+    edge = graph.getEdge(graph.getNode("A"), graph.getNode("B"))
+    probabilities = _edge_type_probabilities(edge)
+
+    assert str(edge.getNode1().getName()) == "B"
+    assert probabilities["ta"] == pytest.approx(0.75)
+    assert probabilities["at"] == pytest.approx(0.25)
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_run_bootstrap_with_python_test(tetrad, n_jobs):
+    import pytetrad.tools.TetradSearch as ts
+    import pytetrad.tools.WrappedClFisherZ as fz
+
+    # The collider B --> A <-- C, with A first so that its edges point left.
+    rng = np.random.default_rng(0)
+    b, c = rng.normal(size=1000), rng.normal(size=1000)
+    df = pd.DataFrame({"A": b + c + 0.5 * rng.normal(size=1000), "B": b, "C": c})
+
+    search = ts.TetradSearch(df)
+    search.use_test(fz.WrappedClFisherZ(df, alpha=0.01))
+    search.run_bootstrap("pc", num_resamples=4, n_jobs=n_jobs, seed=0)
+
+    assert search.bootstrap_graphs.size() == 5
+    graph = search.get_java()
+    for parent in ("B", "C"):
+        edge = graph.getEdge(graph.getNode("A"), graph.getNode(parent))
+        assert str(edge.getNode1().getName()) == parent
+        assert _edge_type_probabilities(edge)["ta"] > 0.5
+
+
+@pytest.mark.parametrize("num_resamples", [0, -1, 2.5])
+def test_num_resamples_must_be_positive(linear_df, num_resamples):
+    search = types.SimpleNamespace(df=linear_df, run_pc=lambda: None)
+    with pytest.raises(ValueError, match="num_resamples"):
+        bs.run(search, "pc", num_resamples=num_resamples, add_original=False)
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+import pytetrad.tools.fisherz as fz
+
+cit = pytest.importorskip("causallearn.utils.cit")
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(400, 5))
+    x[:, 1] += 0.5 * x[:, 0]
+    x[:, 2] += 0.5 * x[:, 1]
+    x[:, 4] += 0.3 * x[:, 2] + 0.3 * x[:, 3]
+    return x
+
+
+@pytest.mark.parametrize("x, y, s", [(0, 1, []), (0, 2, [1]), (3, 2, [4]), (0, 4, [1, 2, 3]),
+                                     (2, 0, [3, 1])])
+def test_matches_causal_learn(data, x, y, s):
+    expected = cit.CIT(data, "fisherz")(x, y, s)
+    assert fz.FisherZ(data).pvalue(x, y, s) == pytest.approx(expected, rel=1e-9, abs=1e-12)
+
+
+def test_batched_pvalues_match_single_ones(data):
+    test = fz.FisherZ(data)
+    pairs = [(0, 2), (0, 3), (2, 4), (3, 0)]
+
+    batched = test.pvalues(pairs, [1])
+
+    fresh = fz.FisherZ(data)
+    assert batched == pytest.approx([fresh.pvalue(x, y, [1]) for x, y in pairs])
+
+
+def test_singular_conditioning_set(data):
+    data = np.column_stack([data, data[:, 1]])
+    p = fz.FisherZ(data).pvalue(0, 2, [1, 5])
+    assert 0.0 <= p <= 1.0
+
+
+def test_cache_is_bounded_by_bytes(data):
+    # With p = 5, a cached set S holds |S| x 5 + 5 float64s: 80 bytes for |S| = 1.
+    test = fz.FisherZ(data, max_cache_mb=200 / 2 ** 20)
+    expected = [fz.FisherZ(data).pvalue(0, 4, [s]) for s in (1, 2, 3)]
+
+    assert [test.pvalue(0, 4, [s]) for s in (1, 2, 3)] == pytest.approx(expected)
+    assert test.cache_bytes == 160
+    assert list(test._whitened) == [(2,), (3,)]
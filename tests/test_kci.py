@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+import pytetrad.tools.kci as kci
+
+kci_module = pytest.importorskip("causallearn.utils.KCI.KCI")
+cit = pytest.importorskip("causallearn.utils.cit")
+
+
+def _data(seed, dependent, n=300):
+    rng = np.random.default_rng(seed)
+    z = rng.normal(size=(n, 2))
+    x = np.tanh(z[:, :1]) + 0.5 * rng.normal(size=(n, 1))
+    y = z[:, 1:] ** 2 + 0.5 * rng.normal(size=(n, 1)) + (0.3 * x if dependent else 0.0)
+    return np.hstack([x, y, z])
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("est_width", ["empirical", "median"])
+@pytest.mark.parametrize("x, y", [(0, 1), (1, 0)])
+def test_conditional_matches_causal_learn(seed, est_width, x, y):
+    data = _data(seed, dependent=seed % 2 == 1)
+    expected = kci_module.KCI_CInd(est_width=est_width).compute_pvalue(
+        data[:, [x]], data[:, [y]], data[:, 2:])[0]
+
+    test = kci.KCI(data, est_width=est_width, cache=False)
+    assert test._conditional(x, y, (2, 3)) == pytest.approx(expected, abs=1e-9)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_unconditional_matches_causal_learn(seed):
+    data = _data(seed, dependent=True)
+    expected = kci_module.KCI_UInd().compute_pvalue(data[:, [0]], data[:, [1]])[0]
+    assert kci.KCI(data, cache=False).pvalue(0, 1) == pytest.approx(expected, abs=1e-9)
+
+
+def test_pvalue_matches_cit_in_either_order():
+    data = _data(0, dependent=False)
+    expected = cit.CIT(data, "kci")(0, 1, [2, 3])
+
+    test = kci.KCI(data, cache=False)
+    assert test.pvalue(0, 1, [2, 3]) == pytest.approx(expected, abs=1e-9)
+    assert test.pvalue(1, 0, [3, 2]) == pytest.approx(expected, abs=1e-9)
+
+
+def test_x_and_y_roles_are_cached_separately():
+    data = _data(1, dependent=True)
+    test = kci.KCI(data, cache=kci.GramCache())
+    fresh = kci.KCI(data, cache=False)
+
+    test._conditional(0, 1, (2, 3))
+    assert test._conditional(1, 0, (2, 3)) == pytest.approx(fresh._conditional(1, 0, (2, 3)))
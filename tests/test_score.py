@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import pytetrad.tools.score as ps
+
+
+@pytest.fixture
+def score(tetrad, linear_df):
+    return ps.LinearGaussianBicScore(linear_df, penalty_discount=2.0)
+
+
+def _direct_bic(df, node, parents, penalty_discount):
+    # -n log of the residual variance of an OLS fit with intercept (on n - 1 degrees of
+    # freedom, as np.cov), minus the penalty.
+    values = df.to_numpy()
+    n = len(values)
+    design = np.column_stack([np.ones(n)] + [values[:, z] for z in parents])
+    coefficients, *_ = np.linalg.lstsq(design, values[:, node], rcond=None)
+    residual = values[:, node] - design @ coefficients
+    return -n * np.log(residual @ residual / (n - 1)) - penalty_discount * len(parents) * np.log(n)
+
+
+@pytest.mark.parametrize("node, parents", [(0, ()), (1, (0,)), (2, (0, 1)), (3, (0, 1, 2))])
+def test_local_score_matches_direct_computation(score, linear_df, node, parents):
+    assert score.local_score(node, parents) == pytest.approx(
+        _direct_bic(linear_df, node, parents, 2.0), rel=1e-9)
+
+
+def test_score_diff_is_difference_of_local_scores(score, linear_df):
+    for x, y, z in [(0, 1, ()), (1, 2, (0,)), (3, 2, (0, 1))]:
+        expected = (_direct_bic(linear_df, y, tuple(sorted(z + (x,))), 2.0)
+                    - _direct_bic(linear_df, y, z, 2.0))
+        assert score.score_diff(x, y, z) == pytest.approx(expected, rel=1e-9)
+
+
+def test_batched_first_step_matches_local_scores(score):
+    diffs, empty, pairs = score.first_step_diffs()
+
+    for y in range(score.p):
+        assert empty[y] == pytest.approx(score.local_score(y, ()))
+        for x in range(score.p):
+            if x != y:
+                assert pairs[x, y] == pytest.approx(score.local_score(y, (x,)))
+
+
+def test_collinear_parent_costs_only_the_penalty(tetrad, linear_df):
+    df = linear_df.assign(X5=2.0 * linear_df["X1"])
+    score = ps.LinearGaussianBicScore(df)
+    assert score.score_diff(4, 1, (0,)) == pytest.approx(-np.log(len(df)))
+
+
+def test_saved_scores_are_reloaded(tetrad, linear_df, tmp_path, monkeypatch):
+    monkeypatch.setattr(ps, "_persistent", [])
+    path = str(tmp_path / "scores.pkl")
+
+    first = ps.LinearGaussianBicScore(linear_df, penalty_discount=2.0, persist=path)
+    expected = first.score(2, (0, 1))
+    first.save()
+
+    again = ps.LinearGaussianBicScore(linear_df, penalty_discount=2.0, persist=path)
+    assert again.score(2, (0, 1)) == expected
+    assert again.stats()["hits"] == 1
+
+    other = ps.LinearGaussianBicScore(linear_df, penalty_discount=1.0, persist=path)
+    other.score(2, (0, 1))
+    assert other.stats()["hits"] == 0
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import pytetrad.tools.streaming as st
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    values = rng.normal(loc=1e6, size=(1000, 4)) @ rng.normal(size=(4, 4))
+    return pd.DataFrame(values, columns=["A", "B", "C", "D"])
+
+
+def test_chunks_give_the_full_covariance(df):
+    acc = st.covariance_from_chunks(np.array_split(df, 7))
+
+    assert acc.n == len(df)
+    np.testing.assert_allclose(acc.covariance().to_numpy(), np.cov(df.to_numpy(), rowvar=False),
+                               rtol=1e-9)
+
+
+def test_merged_accumulators_equal_one_pass(df):
+    left = st.covariance_from_chunks([df.iloc[:300]])
+    right = st.covariance_from_chunks([df.iloc[300:600], df.iloc[600:]])
+
+    merged = left.merge(right)
+
+    np.testing.assert_allclose(merged.covariance().to_numpy(),
+                               st.covariance_from_chunks([df]).covariance().to_numpy(),
+                               rtol=1e-9)
+
+
+def test_rows_with_missing_values_are_skipped(df):
+    holes = df.copy()
+    holes.iloc[[3, 10, 500], 1] = np.nan
+
+    acc = st.covariance_from_chunks([holes])
+
+    assert acc.skipped == 3
+    np.testing.assert_allclose(acc.covariance().to_numpy(),
+                               np.cov(holes.dropna().to_numpy(), rowvar=False), rtol=1e-9)
+
+
+def test_files_with_columns_in_other_orders(df, tmp_path):
+    df.iloc[:400].to_csv(tmp_path / "a.csv", index=False)
+    df.iloc[400:][["C", "A", "D", "B"]].to_csv(tmp_path / "b.csv", index=False)
+
+    acc = st.covariance_from_files([tmp_path / "a.csv", tmp_path / "b.csv"], chunksize=128)
+
+    assert acc.columns == ["A", "B", "C", "D"]
+    np.testing.assert_allclose(acc.covariance().to_numpy(), np.cov(df.to_numpy(), rowvar=False),
+                               rtol=1e-6)
+
+
+def test_chunks_must_have_the_columns(df):
+    acc = st.CovarianceAccumulator(["A", "B", "E"])
+    with pytest.raises(ValueError):
+        acc.update(df)
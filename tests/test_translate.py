@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import pytetrad.tools.translate as tr
+
+
+@pytest.fixture
+def mixed_df():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({"X1": rng.normal(size=50),
+                         "X2": rng.choice(["a", "b", "c"], size=50),
+                         "X3": rng.normal(size=50)})
+
+
+@pytest.mark.parametrize("bulk", [True, False])
+def test_data_round_trip(tetrad, mixed_df, bulk):
+    data = tr.pandas_data_to_tetrad(mixed_df, bulk=bulk)
+    df = tr.tetrad_data_to_pandas(data, typed=True, bulk=bulk)
+
+    assert list(df.columns) == list(mixed_df.columns)
+    np.testing.assert_array_equal(df["X1"].to_numpy(), mixed_df["X1"].to_numpy())
+    np.testing.assert_array_equal(df["X3"].to_numpy(), mixed_df["X3"].to_numpy())
+    assert df["X2"].astype(str).tolist() == mixed_df["X2"].tolist()
+
+
+def test_bulk_and_cell_reads_agree(tetrad, mixed_df):
+    data = tr.pandas_data_to_tetrad(mixed_df)
+    pd.testing.assert_frame_equal(tr.tetrad_data_to_pandas(data),
+                                  tr.tetrad_data_to_pandas(data, bulk=False))
+
+
+def test_endpoints_round_trip(tetrad):
+    names = ["X1", "node two", "X;3", "X4"]
+    i, j = np.array([0, 1, 2]), np.array([1, 2, 3])
+    e1, e2 = np.array([3, 1, 2], np.int8), np.array([2, 1, 2], np.int8)
+
+    got = tr.graph_to_endpoints(tr.endpoints_to_graph(names, i, j, e1, e2))
+
+    assert got[0] == names
+    assert (sorted(zip(*[a.tolist() for a in got[1:]]))
+            == sorted(zip(i.tolist(), j.tolist(), e1.tolist(), e2.tolist())))
+
+
+def test_adjacency_matrix_round_trip(tetrad):
+    adjacency = np.array([[0, 1, 0], [0, 0, 1], [0, 0, 0]])
+    A = tr.graph_to_numpy(tr.adj_matrix_to_graph(adjacency))
+
+    # i -> j: an arrow (2) at j in A[i, j] and a tail (3) at i in A[j, i]; 0 for no edge.
+    np.testing.assert_array_equal(A, [[0, 2, 0], [3, 0, 2], [0, 3, 0]])
+
+
+def test_covariance_round_trip(tetrad):
+    rng = np.random.default_rng(0)
+    cov = pd.DataFrame(np.cov(rng.normal(size=(100, 3)), rowvar=False),
+                       columns=["A", "B", "C"])
+
+    matrix = tr.pandas_covariance_to_tetrad(cov, 100)
+
+    assert matrix.getSampleSize() == 100
+    assert [str(v.getName()) for v in matrix.getVariables()] == ["A", "B", "C"]
+    np.testing.assert_allclose(tr.tetrad_matrix_to_numpy(matrix.getMatrix()), cov.to_numpy())
+
+
+def test_covariance_must_be_symmetric():
+    with pytest.raises(ValueError):
+        tr.pandas_covariance_to_tetrad(pd.DataFrame([[1.0, 0.5], [0.4, 1.0]]), 100)
+
+
+def test_graph_file_and_edge_by_edge_paths_agree(tetrad):
+    import scipy.sparse as sp
+
+    # An uncoalesced sparse matrix with the edge 0 -> 1 entered twice.
+    adjacency = sp.coo_matrix(([1, 1, 1, 1], ([0, 0, 1, 2], [1, 1, 2, 3])), shape=(4, 4))
+
+    plain = tr.adj_matrix_to_graph(adjacency)
+    spaced = tr.adj_matrix_to_graph(adjacency, node_names=["a 1", "a 2", "a 3", "a 4"])
+
+    assert plain.getNumEdges() == spaced.getNumEdges() == 3
+    np.testing.assert_array_equal(tr.graph_to_numpy(plain), tr.graph_to_numpy(spaced))
+
+
+def test_self_loops_are_rejected():
+    with pytest.raises(ValueError, match="Self-loops"):
+        tr.edge_list_to_graph([[0, 1], [2, 2]], num_nodes=3)